@@ -0,0 +1,65 @@
+"""
+Compare the wire size of MQTT v5 PUBLISH packets with and without topic aliases.
+
+Usage: python benchmarks/topic_alias_bytes.py [--topic TOPIC] [--payload-size N] [--messages N]
+"""
+import argparse
+
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from fp_mqtt_broker.topics import TopicAliasTable
+
+
+def _variable_byte_integer_size(value: int) -> int:
+    size = 1
+    while value > 127:
+        value //= 128
+        size += 1
+    return size
+
+
+def publish_packet_size(topic: str, payload: bytes, qos: int, properties: Properties) -> int:
+    """Size in bytes of an MQTT v5 PUBLISH packet as it goes on the wire."""
+    remaining_length = 2 + len(topic.encode("utf-8")) + len(properties.pack()) + len(payload)
+    if qos > 0:
+        remaining_length += 2
+    return 1 + _variable_byte_integer_size(remaining_length) + remaining_length
+
+
+def measure(topic: str, payload: bytes, messages: int, alias_maximum: int) -> int:
+    """Total bytes needed to publish the same topic repeatedly with QoS 0."""
+    aliases = TopicAliasTable(alias_maximum)
+    total = 0
+    for _ in range(messages):
+        properties = Properties(PacketTypes.PUBLISH)
+        publish_topic = topic
+        alias, known = aliases.resolve(topic)
+        if alias is not None:
+            properties.TopicAlias = alias
+            if known:
+                publish_topic = ""
+        total += publish_packet_size(publish_topic, payload, 0, properties)
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--topic", default="plant/line-3/cell-12/device-0042/sensors/temperature")
+    parser.add_argument("--payload-size", type=int, default=24)
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+
+    payload = b"x" * args.payload_size
+    without_aliases = measure(args.topic, payload, args.messages, alias_maximum=0)
+    with_aliases = measure(args.topic, payload, args.messages, alias_maximum=10)
+
+    print(f"topic length:      {len(args.topic)} bytes")
+    print(f"payload length:    {args.payload_size} bytes")
+    print(f"without aliases:   {without_aliases / args.messages:.1f} bytes/message")
+    print(f"with aliases:      {with_aliases / args.messages:.1f} bytes/message")
+    print(f"reduction:         {100 * (1 - with_aliases / without_aliases):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
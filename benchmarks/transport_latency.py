@@ -0,0 +1,50 @@
+"""
+Compare end-to-end latency over the transports to a broker on the same host.
+
+Runs the fp-mqtt-bench load against the broker once per transport: TCP with Nagle's
+algorithm, TCP with TCP_NODELAY and, when their endpoints are given, a Unix domain
+socket and WebSockets.
+
+Usage: python benchmarks/transport_latency.py [--port N] [--unix-socket PATH] [--websocket-port N]
+                                              [--devices N] [--rate N] [--duration SECONDS] [--qos N]
+"""
+import argparse
+
+from fp_mqtt_broker.bench import build_parser, run_benchmark
+
+
+def variants(args: argparse.Namespace):
+    """Name and fp-mqtt-bench arguments of every transport to measure."""
+    yield "tcp (nagle)", ["--port", str(args.port), "--no-tcp-nodelay"]
+    yield "tcp (nodelay)", ["--port", str(args.port)]
+    if args.unix_socket:
+        yield "unix socket", ["--transport", "unix", "--unix-socket", args.unix_socket]
+    if args.websocket_port:
+        yield "websockets", ["--transport", "websockets", "--port", str(args.websocket_port)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--unix-socket", help="socket path the broker listens on")
+    parser.add_argument("--websocket-port", type=int, help="port of the broker's WebSocket listener")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--payload-size", type=int, default=128)
+    parser.add_argument("--qos", type=int, choices=[0, 1, 2], default=0)
+    args = parser.parse_args()
+
+    common = ["--host", args.host, "--devices", str(args.devices), "--rate", str(args.rate),
+              "--duration", str(args.duration), "--payload-size", str(args.payload_size), "--qos", str(args.qos)]
+    print(f"{'transport':<16}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'lost':>7}   (latency in ms)")
+    for name, arguments in variants(args):
+        results = run_benchmark(build_parser().parse_args(common + arguments))
+        latency = results['latency_ms']
+        print(f"{name:<16}{latency['mean']:>9.2f}{latency['p50']:>9.2f}{latency['p90']:>9.2f}"
+              f"{latency['p99']:>9.2f}{results['lost']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
-from .broker import MQTTBroker, RecordingState
+from .broker import MQTTBroker, RecordingState, ShutdownReport
 from .config import BrokerConfig
 from .abstractions.mqtt_client import MQTTClient
-from .abstractions.message_handler import MessageHandler
+from .abstractions.message_handler import EnvelopeMessageHandler, MessageHandler
+from .message import Message
+from .pipeline import Pipeline
 from .factories.broker_factory import BrokerFactory
 
 __all__ = [
     "MQTTBroker",
     "RecordingState",
+    "ShutdownReport",
     "BrokerConfig",
     "MQTTClient",
     "MessageHandler",
+    "EnvelopeMessageHandler",
+    "Message",
+    "Pipeline",
     "BrokerFactory"
 ]
\ No newline at end of file
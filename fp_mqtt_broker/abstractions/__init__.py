@@ -1,7 +1,8 @@
 from .mqtt_client import MQTTClient
-from .message_handler import MessageHandler
+from .message_handler import EnvelopeMessageHandler, MessageHandler
 
 __all__ = [
     "MQTTClient",
-    "MessageHandler"
+    "MessageHandler",
+    "EnvelopeMessageHandler"
 ]
\ No newline at end of file
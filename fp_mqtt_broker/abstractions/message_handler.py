@@ -2,10 +2,19 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List
 
+from ..message import Message
+
 class MessageHandler(ABC):
     """
     Abstract base class for handling MQTT messages.
     """
+
+    # Whether the handler may be called from several dispatch workers at once. Messages
+    # on one topic are always handled in order, but with several dispatch workers the
+    # messages of different topics reach the handler concurrently; handlers with shared
+    # state set this to False to be called one message at a time.
+    concurrent: bool = True
+
     @abstractmethod
     def handle_message(self, topic: str, payload: Dict[str, Any]) -> None:
         """
@@ -24,3 +33,77 @@ class MessageHandler(ABC):
         :return: List of subscribed MQTT topics.
         """
         pass
+
+    def get_payload_schemas(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the payload schemas this handler requires, keyed by topic filter.
+
+        The broker validates each message once against the schemas of all handlers
+        before dispatch, so handlers only receive payloads that passed validation.
+
+        :return: Mapping of topic filters to JSON Schema style definitions.
+        """
+        return {}
+
+    def get_delivery_policies(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the delivery policies limiting how many messages this handler receives, keyed by topic filter.
+
+        A policy sets either ``max_rate``, the deliveries per second, or ``keep_every``,
+        to receive one message in N, and a ``mode``: ``last`` delivers the latest message
+        and drops the others before their payload is decoded, ``mean`` delivers the
+        latest payload with its numeric fields averaged over the dropped messages.
+
+        :return: Mapping of topic filters to policy definitions.
+        """
+        return {}
+
+    def flush(self) -> None:
+        """
+        Write out any buffered work.
+
+        Called on graceful shutdown once all queued messages were dispatched, so batching
+        handlers do not lose their last partial batch.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Release the resources of the handler, such as background threads and files.
+
+        Called on graceful shutdown after ``flush``, so threads started by the handler
+        do not outlive the broker.
+        """
+        pass
+
+    def handle(self, message: Message) -> None:
+        """
+        Handle a message envelope.
+
+        The broker dispatches every message through this method, which decodes the
+        payload and passes it to ``handle_message``.
+
+        :param message: The received message.
+        """
+        self.handle_message(message.topic, message.payload)
+
+class EnvelopeMessageHandler(MessageHandler):
+    """
+    Abstract base class for handlers receiving the message envelope.
+
+    The envelope carries the raw bytes, QoS, retain flag and receive time, and only
+    decodes the payload when ``message.payload`` is accessed, so handlers that route
+    on topic or raw bytes avoid the JSON parse.
+    """
+    @abstractmethod
+    def handle(self, message: Message) -> None:
+        """
+        Handle an incoming MQTT message envelope.
+
+        :param message: The received message.
+        """
+        pass
+
+    def handle_message(self, topic: str, payload: Dict[str, Any]) -> None:
+        """Handle an already decoded payload by wrapping it in an envelope."""
+        self.handle(Message.from_payload(topic, payload))
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Callable
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple, Union
 
 class MQTTClient(ABC):
     """Abstract interface for MQTT client operations."""
@@ -24,11 +25,79 @@ class MQTTClient(ABC):
         """Subscribe to a topic."""
         pass
     
+    def unsubscribe(self, topic: str) -> None:
+        """
+        Unsubscribe from a topic.
+
+        Clients without unsubscribe support keep their subscriptions until they disconnect.
+        """
+        pass
+
     @abstractmethod
-    def publish(self, topic: str, payload: str, qos: int = 0) -> bool:
-        """Publish a message to a topic. Returns True if successful, False otherwise."""
+    def publish(self,
+                topic: str,
+                payload: Union[str, bytes],
+                qos: int = 0,
+                content_type: Optional[str] = None,
+                message_expiry_interval: Optional[int] = None) -> bool:
+        """
+        Publish a message to a topic. Returns True if successful, False otherwise.
+
+        The content type and message expiry interval are MQTT v5 publish properties;
+        clients connected with an older protocol version ignore them.
+        """
         pass
     
+    def publish_with_ack(self,
+                         topic: str,
+                         payload: Union[str, bytes],
+                         qos: int = 0,
+                         content_type: Optional[str] = None,
+                         message_expiry_interval: Optional[int] = None,
+                         timeout: Optional[float] = None) -> Future:
+        """
+        Publish a message and get a future completed once the broker acknowledged it.
+
+        The future resolves to True, or raises if the message could not be published.
+        Clients that do not track acknowledgements complete it as soon as the message
+        was handed over. ``timeout`` bounds the wait for a free in-flight slot.
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        kwargs = {}
+        if content_type is not None:
+            kwargs['content_type'] = content_type
+        if message_expiry_interval is not None:
+            kwargs['message_expiry_interval'] = message_expiry_interval
+        try:
+            if self.publish(topic, payload, qos, **kwargs):
+                future.set_result(True)
+            else:
+                future.set_exception(ConnectionError(f"Failed to publish to {topic}"))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def pending_ack_count(self) -> int:
+        """Number of published messages still waiting for their acknowledgement."""
+        return 0
+
+    def fail_pending_acks(self, error: BaseException) -> int:
+        """
+        Fail every future still waiting for its acknowledgement, freeing its in-flight slot.
+
+        :return: The number of futures failed.
+        """
+        return 0
+
+    def unacknowledged_messages(self) -> List[Tuple[str, bytes, int]]:
+        """
+        Get the QoS > 0 messages not yet acknowledged by the broker, as (topic, payload, qos).
+
+        Clients that do not track acknowledgements report none.
+        """
+        return []
+    
     @abstractmethod
     def loop_start(self) -> None:
         """Start the client loop."""
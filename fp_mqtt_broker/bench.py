@@ -0,0 +1,229 @@
+"""
+Load generator for capacity testing, installed as the ``fp-mqtt-bench`` command.
+
+Simulated devices publish through brokers created by BrokerFactory, against a real
+MQTT broker or an in-process hub (``--embedded``), while consumers measure end-to-end
+latency percentiles, throughput and message loss.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .abstractions.message_handler import MessageHandler
+from .broker import MQTTBroker
+from .factories.broker_factory import BrokerFactory
+from .implementations.in_memory_mqtt_client import InMemoryMQTTHub
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted values, 0 for no values."""
+    if not sorted_values:
+        return 0.0
+    rank = int(round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+class LatencyRecorder(MessageHandler):
+    """Consumer side handler recording latency and sequence numbers of benchmark messages."""
+
+    def __init__(self, topics: List[str]):
+        self.topics = topics
+        self.latencies: List[float] = []
+        self.received = 0
+        self.sequences: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def get_subscribed_topics(self) -> List[str]:
+        return self.topics
+
+    def handle_message(self, topic: str, payload: Dict[str, Any]) -> None:
+        latency = time.time() - payload['sent']
+        with self._lock:
+            self.received += 1
+            self.latencies.append(latency)
+            self.sequences.setdefault(payload['device'], set()).add(payload['seq'])
+
+class SimulatedDevice(threading.Thread):
+    """Publishes benchmark messages at a fixed rate through its own broker connection."""
+
+    def __init__(self, name: str, broker: MQTTBroker, topic: str, rate: float,
+                 payload_size: int, qos: int, duration: float):
+        super().__init__(name=f"bench-{name}", daemon=True)
+        self.device = name
+        self.broker = broker
+        self.topic = topic
+        self.interval = 1.0 / rate
+        self.qos = qos
+        self.duration = duration
+        overhead = len(json.dumps({'device': name, 'seq': 0, 'sent': time.time(), 'pad': ''}))
+        self.padding = "x" * max(0, payload_size - overhead)
+        self.sent = 0
+        self.failed = 0
+
+    def run(self) -> None:
+        start = time.monotonic()
+        seq = 0
+        while True:
+            offset = seq * self.interval
+            if offset >= self.duration:
+                return
+            scheduled = start + offset
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            payload = {'device': self.device, 'seq': seq, 'sent': time.time(), 'pad': self.padding}
+            if self.broker.publish_message(self.topic, payload, self.qos):
+                self.sent += 1
+            else:
+                self.failed += 1
+            seq += 1
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="fp-mqtt-bench", description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--host", default="localhost", help="MQTT broker host")
+    target.add_argument("--embedded", action="store_true", help="use an in-process hub instead of a broker")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument("--transport", choices=["tcp", "websockets", "unix"], default="tcp",
+                        help="transport to the MQTT broker")
+    parser.add_argument("--unix-socket", help="socket path of the broker for the unix transport")
+    parser.add_argument("--websocket-path", default="/mqtt", help="request path for the websockets transport")
+    parser.add_argument("--no-tcp-nodelay", dest="tcp_nodelay", action="store_false",
+                        help="keep Nagle's algorithm enabled on TCP connections")
+    parser.add_argument("--devices", type=int, default=10, help="number of simulated devices")
+    parser.add_argument("--topic-template", default="bench/{device}/data",
+                        help="topic of each device, {device} is replaced by the device name")
+    parser.add_argument("--payload-size", type=int, default=256, help="approximate payload size in bytes")
+    parser.add_argument("--rate", type=float, default=10.0, help="messages per second per device")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to publish for")
+    parser.add_argument("--qos", type=int, choices=[0, 1, 2], default=0)
+    parser.add_argument("--protocol-version", type=int, choices=[4, 5], default=4)
+    parser.add_argument("--consumers", type=int, default=1,
+                        help="consumers sharing the load through a shared subscription")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for in-flight messages")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser
+
+def _broker_config(options: argparse.Namespace, client_id: str, share_group: Optional[str] = None) -> Dict[str, Any]:
+    mqtt_config = {
+        'broker_host': options.host,
+        'broker_port': options.port,
+        'client_id': client_id,
+        'protocol_version': options.protocol_version,
+        'transport': options.transport,
+        'unix_socket_path': options.unix_socket,
+        'tcp_nodelay': options.tcp_nodelay,
+        'websocket_path': options.websocket_path,
+    }
+    if share_group:
+        mqtt_config['shared_subscription_group'] = share_group
+    return {'mqtt': mqtt_config}
+
+def run_benchmark(options: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run a benchmark and collect its results.
+
+    :param options: Parsed command line options.
+    :return: Dictionary of throughput, loss and latency results.
+    """
+    hub = InMemoryMQTTHub() if options.embedded else None
+
+    def create(config, handlers=None) -> MQTTBroker:
+        if hub is not None:
+            return BrokerFactory.create_in_memory_broker(config, handlers, hub)
+        return BrokerFactory.create_broker(config, handlers)
+
+    share_group = "fp-mqtt-bench" if options.consumers > 1 else None
+    recorder = LatencyRecorder([options.topic_template.format(device="+")])
+    consumers = [
+        create(_broker_config(options, f"fp-mqtt-bench-consumer-{index}", share_group), [recorder])
+        for index in range(options.consumers)
+    ]
+    devices = []
+    brokers = list(consumers)
+    try:
+        for consumer in consumers:
+            if not consumer.connect():
+                raise ConnectionError("Consumer could not connect to the MQTT broker")
+        for index in range(options.devices):
+            name = f"device-{index}"
+            broker = create(_broker_config(options, f"fp-mqtt-bench-{name}"))
+            brokers.append(broker)
+            if not broker.connect():
+                raise ConnectionError(f"Device {name} could not connect to the MQTT broker")
+            devices.append(SimulatedDevice(name, broker, options.topic_template.format(device=name),
+                                           options.rate, options.payload_size, options.qos, options.duration))
+
+        started = time.monotonic()
+        for device in devices:
+            device.start()
+        for device in devices:
+            device.join()
+        publish_seconds = time.monotonic() - started
+
+        sent = sum(device.sent for device in devices)
+        drain_deadline = time.monotonic() + options.drain
+        while recorder.received < sent and time.monotonic() < drain_deadline:
+            time.sleep(0.01)
+        elapsed = time.monotonic() - started
+    finally:
+        for broker in brokers:
+            broker.disconnect()
+
+    latencies = sorted(recorder.latencies)
+    unique = sum(len(sequences) for sequences in recorder.sequences.values())
+    lost = max(0, sent - unique)
+    return {
+        'transport': options.transport,
+        'devices': options.devices,
+        'consumers': options.consumers,
+        'qos': options.qos,
+        'payload_size': options.payload_size,
+        'sent': sent,
+        'publish_failures': sum(device.failed for device in devices),
+        'received': recorder.received,
+        'duplicates': recorder.received - unique,
+        'lost': lost,
+        'loss_percent': 100.0 * lost / sent if sent else 0.0,
+        'publish_rate': sent / publish_seconds if publish_seconds else 0.0,
+        'throughput': recorder.received / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            'p50': 1000 * percentile(latencies, 50),
+            'p90': 1000 * percentile(latencies, 90),
+            'p99': 1000 * percentile(latencies, 99),
+            'max': 1000 * latencies[-1] if latencies else 0.0,
+        },
+    }
+
+def format_report(results: Dict[str, Any]) -> str:
+    latency = results['latency_ms']
+    return "\n".join([
+        f"transport:     {results['transport']}",
+        f"devices:       {results['devices']} (qos {results['qos']}, {results['payload_size']} byte payloads)",
+        f"consumers:     {results['consumers']}",
+        f"sent:          {results['sent']} ({results['publish_rate']:.1f} msg/s, {results['publish_failures']} failed)",
+        f"received:      {results['received']} ({results['throughput']:.1f} msg/s, {results['duplicates']} duplicates)",
+        f"lost:          {results['lost']} ({results['loss_percent']:.2f}%)",
+        f"latency (ms):  mean {latency['mean']:.2f}  p50 {latency['p50']:.2f}  p90 {latency['p90']:.2f}  "
+        f"p99 {latency['p99']:.2f}  max {latency['max']:.2f}",
+    ])
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    options = parser.parse_args(argv)
+    if options.transport == "unix" and not options.unix_socket and not options.embedded:
+        parser.error("--transport unix needs --unix-socket")
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        results = run_benchmark(options)
+    except ConnectionError as e:
+        print(f"fp-mqtt-bench: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(results, indent=2) if options.json else format_report(results))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
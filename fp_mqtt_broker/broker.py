@@ -4,13 +4,33 @@ import logging
 import sys
 import socket
 import threading
+from concurrent.futures import Future, wait
 from datetime import datetime
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterable, Tuple, FrozenSet
 
 from .abstractions.mqtt_client import MQTTClient
 from .abstractions.message_handler import MessageHandler
+from .catch_up import CatchUpController
+from .compression import PayloadCompressor
+from .concurrency import AdaptiveLimit
+from .buffers import NumericRingBuffer
 from .config import BrokerConfig
+from .dead_letter import DeadLetterQueue, dead_letter_for
+from .dispatch import Dispatcher
+from .downsampling import Downsampler
+from .health import HealthMonitor
+from .handlers.shared_value_publisher import SharedValuePublisher
+from .history import HistorySpec, HistoryStore
+from .latency import DEFAULT_BOUNDS, LatencyTracker
+from .message import Message, PayloadDecodeError
+from .registry import HandlerRegistry
+from .rpc import PendingRequests, build_request
+from .session_store import SessionStore
+from .shared_values import SharedValueWriter
+from .topics import shared_subscription
+from .validation import SchemaRegistry
 
 class RecordingState(Enum):
     """Enumeration for the different states of recording."""
@@ -18,10 +38,30 @@ class RecordingState(Enum):
     RECORDING = "recording"
     PAUSED = "paused"
 
+@dataclass
+class ShutdownReport:
+    """What a graceful shutdown completed, and what it had to drop."""
+
+    duration: float = 0.0
+    drained: bool = True
+    dropped_messages: int = 0
+    refused_messages: int = 0
+    unacknowledged_publishes: int = 0
+    failed_requests: int = 0
+    failed_flushes: List[str] = field(default_factory=list)
+
+    @property
+    def clean(self) -> bool:
+        """Whether nothing was lost during the shutdown."""
+        return (self.drained and not self.dropped_messages and not self.refused_messages
+                and not self.unacknowledged_publishes and not self.failed_flushes)
+
 class MQTTBroker:
     """
     A flexible MQTT broker client that can work with optional message handlers.
     """
+
+    MAX_INTERNED_TOPICS = 10000
     
     def __init__(self, 
                  config: BrokerConfig,
@@ -36,7 +76,15 @@ class MQTTBroker:
         """
         self.config = config
         self.client = mqtt_client
-        self.message_handlers = message_handlers or []
+        # Handlers and topics, published as immutable snapshots read by dispatch without locking
+        self._registry = HandlerRegistry(message_handlers or [], (config.topics or {}).values())
+        self._registration_lock = threading.Lock()
+        self.compressor = PayloadCompressor(
+            codec=config.compression_codec,
+            threshold=config.compression_threshold,
+            level=config.compression_level,
+            cache_size=config.compression_cache_size
+        )
         
         # Set up MQTT client callbacks
         self.client.set_on_connect_callback(self.on_connect)
@@ -48,18 +96,136 @@ class MQTTBroker:
         self.current_recording_state = RecordingState.IDLE
         self.service_running = False
 
+        # Payload validation
+        self.schema_registry = SchemaRegistry()
+        self.rejected_message_count = 0
+        self._rebuild_schema_registry(self.message_handlers)
+
+        # Per-handler delivery downsampling, keyed by handler identity
+        self._downsamplers: Dict[int, Downsampler] = {}
+        self._rebuild_downsamplers(self.message_handlers)
+
+        # Opt-in send stamps on published payloads and latency measurement of received ones
+        self.latency: Optional[LatencyTracker] = None
+        if self.config.latency_tracking is not None:
+            self.enable_latency_tracking(**self.config.latency_tracking)
+
+        # Opt-in adaptive per-handler concurrency limits, keyed by handler
+        self._concurrency_options: Optional[Dict[str, Any]] = None
+        self._concurrency_limits: Dict[MessageHandler, AdaptiveLimit] = {}
+        # Locks serialising the handlers that are not concurrent
+        self._handler_locks: Dict[MessageHandler, threading.Lock] = {}
+        if self.config.adaptive_concurrency is not None:
+            self.enable_adaptive_concurrency(**self.config.adaptive_concurrency)
+
+        # Opt-in catch-up mode dropping stale and superseded messages while dispatch is behind
+        self.catch_up: Optional[CatchUpController] = None
+        if self.config.catch_up is not None:
+            self.enable_catch_up(**self.config.catch_up)
+
+        # Opt-in capture of messages that failed processing
+        self.dead_letters: Optional[DeadLetterQueue] = None
+        if self.config.dead_letter_queue is not None:
+            self.enable_dead_letter_queue(**self.config.dead_letter_queue)
+
+        # Opt-in per-topic sample history
+        self.history: Optional[HistoryStore] = None
+        for topic_filter, history_config in (self.config.history or {}).items():
+            self._enable_history_spec(HistorySpec.from_dict(topic_filter, history_config))
+
+        # Request/response state, the reply topic is subscribed on the first request
+        self.pending_requests = PendingRequests()
+        self.reply_topic = (self.config.topics or {}).get('reply', f"{self.config.client_id}/reply")
+        self._reply_subscribed = False
+
         # Connection event thread
         self._connection_result = None
         self._connection_event = threading.Event()
         
-        # Collect all topics from handlers
-        self.subscribed_topics = set()
-        for handler in self.message_handlers:
-            self.subscribed_topics.update(handler.get_subscribed_topics())
-        
-        # Add default topics from config if available
-        if self.config.topics:
-            self.subscribed_topics.update(self.config.topics.values())
+        # Received topics are interned so messages on the same topic share one string
+        self._interned_topics: Dict[str, str] = {}
+
+        # Optional dispatch worker threads, messages are handled on the network thread otherwise
+        self._accepting_messages = True
+        self._refused_message_count = 0
+        self.dispatch_overflow_count = 0
+        self._dispatcher: Optional[Dispatcher] = None
+        self._start_dispatcher()
+
+        # Subscriptions the server holds for this session, restored from the session store if any
+        self.session_store = SessionStore(config.session_store_path) if config.session_store_path else None
+        self._session_subscriptions: Dict[str, int] = dict(self.session_store.subscriptions) if self.session_store else {}
+        self._session_checkpoint_stop = threading.Event()
+        self._session_checkpoint_thread: Optional[threading.Thread] = None
+
+        # Opt-in network loop and dispatch health monitoring
+        self.health: Optional[HealthMonitor] = None
+        if self.config.health is not None:
+            self.enable_health_monitor(**self.config.health)
+
+        # Opt-in latest values shared with local processes through shared memory
+        self.shared_values: Optional[SharedValuePublisher] = None
+        if self.config.shared_values is not None:
+            self.enable_shared_values(**self.config.shared_values)
+
+    @property
+    def message_handlers(self) -> Tuple[MessageHandler, ...]:
+        """The registered message handlers, as an immutable snapshot."""
+        return self._registry.snapshot.handlers
+
+    @message_handlers.setter
+    def message_handlers(self, handlers: Iterable[MessageHandler]) -> None:
+        handlers = tuple(handlers)
+        with self._registration_lock:
+            # Built before the snapshot is published, so dispatch never sees handlers without them
+            self._rebuild_schema_registry(handlers)
+            self._rebuild_downsamplers(handlers)
+            new_topics = self._registry.replace(handlers)
+            self._prune_handler_state()
+        self._subscribe_new_topics(new_topics)
+
+    @property
+    def subscribed_topics(self) -> FrozenSet[str]:
+        """All topics subscribed by the handlers and the configuration, as an immutable snapshot."""
+        return self._registry.snapshot.topics
+
+    @property
+    def accepting_messages(self) -> bool:
+        """Whether received messages are dispatched, False once a shutdown started."""
+        return self._accepting_messages
+
+    def dispatch_backlog(self) -> Tuple[int, float]:
+        """
+        Get the number of queued messages and the age in seconds of the oldest one.
+
+        Both are 0 when messages are dispatched on the network thread.
+        """
+        dispatcher = self._dispatcher
+        if dispatcher is None:
+            return 0, 0.0
+        return len(dispatcher), dispatcher.oldest_age()
+
+    def enable_health_monitor(self, **options) -> HealthMonitor:
+        """
+        Monitor the network loop lag, dispatch queue age and per-topic message gaps.
+
+        The monitor runs while the broker is connected. The alert topic defaults to
+        the 'health' topic of the config.
+
+        :param options: HealthMonitor options, such as max_loop_lag or http_port.
+        :return: The health monitor.
+        """
+        if self.health is not None:
+            self.health.stop()
+        topics = self.config.topics or {}
+        options.setdefault('alert_topic', topics.get('health'))
+        probe_topic = topics.get('health_probe', f"{self.config.client_id}/health/probe")
+        self.health = HealthMonitor(self, probe_topic, **options)
+        if self._registry.add_topic(probe_topic) and self.client.is_connected():
+            self._subscribe(probe_topic)
+        if self.service_running:
+            self.health.start()
+        return self.health
 
     def connect(self, timeout: int = 10) -> bool:
         """Connect to the MQTT broker."""
@@ -69,6 +235,8 @@ class MQTTBroker:
             # Set up connection event
             self._connection_result = None
             self._connection_event.clear()
+            self._accepting_messages = True
+            self._start_dispatcher()
 
             self.client.connect(self.config.broker_host, self.config.broker_port, self.config.keepalive)
             self.client.loop_start()
@@ -78,6 +246,9 @@ class MQTTBroker:
                 if self._connection_result == 0:
                     logging.info("Connected to MQTT broker successfully")
                     self.service_running = True
+                    if self.health is not None:
+                        self.health.start()
+                    self._start_session_checkpoints()
                     return True
                 else:
                     logging.error(f"Failed to connect to MQTT broker with code {self._connection_result}")
@@ -97,38 +268,374 @@ class MQTTBroker:
     def disconnect(self) -> None:
         """Disconnect from the MQTT broker."""
         self.service_running = False
+        if self.health is not None:
+            self.health.stop()
+        self._session_checkpoint_stop.set()
+        self._save_session()
         if self.client and self.client.is_connected():
             self.client.loop_stop()
             self.client.disconnect()
+        if self.client:
+            self.client.fail_pending_acks(ConnectionError("Disconnected from MQTT broker"))
         logging.info("Disconnected from MQTT broker")
 
+    def shutdown(self, timeout: Optional[float] = None) -> ShutdownReport:
+        """
+        Gracefully shut down, finishing in-flight work before disconnecting.
+
+        New messages are refused and the subscriptions are dropped, then queued messages
+        are dispatched, handlers are flushed and closed and pending QoS > 0 publishes are given time
+        to be acknowledged. Everything shares one deadline; whatever is left when it
+        passes is dropped and counted in the report. With a persistent session the
+        subscriptions are kept, so the server queues messages for the next run, and
+        unacknowledged publishes are saved to the session store.
+
+        :param timeout: Seconds the shutdown may take, the configured shutdown_timeout by default.
+        :return: A report of what was completed and dropped.
+        """
+        timeout = self.config.shutdown_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        report = ShutdownReport()
+
+        self._accepting_messages = False
+        connected = self.client.is_connected()
+        if connected and not self.config.persistent_session:
+            for topic in self.subscribed_topics:
+                try:
+                    self._unsubscribe(topic)
+                except Exception as e:
+                    logging.warning(f"Failed to unsubscribe from {topic}: {str(e)}")
+
+        dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher is not None:
+            report.drained = dispatcher.drain(max(0.0, deadline - time.monotonic()))
+            report.dropped_messages = dispatcher.stop(max(0.0, deadline - time.monotonic()))
+
+        for handler in self.message_handlers:
+            # A failed flush still closes the handler, so its resources are released
+            failed = False
+            try:
+                handler.flush()
+            except Exception as e:
+                failed = True
+                logging.error(f"Error flushing message handler {handler.__class__.__name__}: {str(e)}")
+            try:
+                handler.close()
+            except Exception as e:
+                failed = True
+                logging.error(f"Error closing message handler {handler.__class__.__name__}: {str(e)}")
+            if failed:
+                report.failed_flushes.append(handler.__class__.__name__)
+
+        if self.dead_letters is not None:
+            self.dead_letters.persist()
+            self.dead_letters.close()
+
+        if connected:
+            while self.client.pending_ack_count() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            report.unacknowledged_publishes = self.client.pending_ack_count()
+
+        self.client.fail_pending_acks(ConnectionError("MQTT broker shut down"))
+        report.failed_requests = self.pending_requests.fail_all(ConnectionError("MQTT broker shut down"))
+        report.refused_messages = self._refused_message_count
+        self.disconnect()
+        report.duration = time.monotonic() - started
+
+        if report.clean:
+            logging.info(f"Shut down cleanly in {report.duration:.2f}s")
+        else:
+            logging.warning(f"Shut down in {report.duration:.2f}s with losses: {report}")
+        return report
+
+    def _start_dispatcher(self) -> None:
+        if self.config.dispatch_workers > 0 and self._dispatcher is None:
+            self._dispatcher = Dispatcher(self._process_message, self.config.dispatch_workers,
+                                          self.config.dispatch_queue_size)
+
     def add_message_handler(self, handler: MessageHandler) -> None:
         """Add a message handler and subscribe to its topics."""
-        self.message_handlers.append(handler)
-        new_topics = handler.get_subscribed_topics()
-        
-        for topic in new_topics:
-            if topic not in self.subscribed_topics:
-                self.subscribed_topics.add(topic)
-                if self.client.is_connected():
-                    self.client.subscribe(topic)
+        with self._registration_lock:
+            handlers = self.message_handlers + (handler,)
+            if handler.get_payload_schemas():
+                self._rebuild_schema_registry(handlers)
+            if handler.get_delivery_policies():
+                self._rebuild_downsamplers(handlers)
+            new_topics = self._registry.add(handler)
+        self._subscribe_new_topics(new_topics)
 
     def remove_message_handler(self, handler: MessageHandler) -> None:
         """Remove a message handler."""
-        if handler in self.message_handlers:
-            self.message_handlers.remove(handler)
+        with self._registration_lock:
+            if handler not in self.message_handlers:
+                return
+            handlers = tuple(registered for registered in self.message_handlers if registered is not handler)
+            if handler.get_payload_schemas():
+                self._rebuild_schema_registry(handlers)
+            if id(handler) in self._downsamplers:
+                self._rebuild_downsamplers(handlers)
+            self._registry.remove(handler)
+            self._concurrency_limits.pop(handler, None)
+            self._handler_locks.pop(handler, None)
+
+    def _prune_handler_state(self) -> None:
+        """Drop the concurrency limits and locks of handlers no longer registered."""
+        handlers = set(self.message_handlers)
+        self._concurrency_limits = {handler: limit for handler, limit in self._concurrency_limits.items()
+                                    if handler in handlers}
+        self._handler_locks = {handler: lock for handler, lock in self._handler_locks.items()
+                               if handler in handlers}
+
+    def _subscribe_new_topics(self, topics: List[str]) -> None:
+        if self.client.is_connected():
+            for topic in topics:
+                self._subscribe(topic)
+            self._save_session()
+
+    def _subscribe(self, topic: str) -> None:
+        subscription = self._subscription_for(topic)
+        qos = self._subscription_qos(topic)
+        self.client.subscribe(subscription, qos)
+        self._session_subscriptions[subscription] = qos
+
+    def _unsubscribe(self, topic: str) -> None:
+        subscription = self._subscription_for(topic)
+        self.client.unsubscribe(subscription)
+        self._session_subscriptions.pop(subscription, None)
+
+    def _subscription_qos(self, topic: str) -> int:
+        # Replies are always subscribed with QoS 1 so a request never silently loses its response
+        return max(1, self.config.subscription_qos) if topic == self.reply_topic else self.config.subscription_qos
+
+    def enable_latency_tracking(self, field: str = "_sent", bounds: Optional[List[float]] = None) -> LatencyTracker:
+        """
+        Stamp published payloads and measure the latency and loss of received ones.
+
+        Publishers and subscribers both need it enabled. Stamped messages are decoded
+        on receipt, even when no handler reads them, to read and remove the stamp.
+
+        :param field: Payload field carrying the stamp.
+        :param bounds: Upper bounds in seconds of the histogram buckets.
+        :return: The tracker, also available as ``broker.latency``.
+        """
+        self.latency = LatencyTracker(self.config.client_id, field, bounds or DEFAULT_BOUNDS)
+        return self.latency
+
+    def enable_adaptive_concurrency(self,
+                                    min_limit: int = 1,
+                                    max_limit: Optional[int] = None,
+                                    target_latency: Optional[float] = None,
+                                    tolerance: float = 2.0,
+                                    backoff: float = 0.75) -> None:
+        """
+        Limit the concurrent calls into each handler with a limit adapting to its latency.
+
+        Every handler gets its own AIMD limit on the dispatch workers, which grows while
+        messages wait for the handler and its latency stays low, and shrinks when its
+        latency rises or it raises, so slow downstream systems are not overloaded.
+        Handlers that are not ``concurrent`` keep a limit of 1.
+
+        :param min_limit: Lowest limit per handler.
+        :param max_limit: Highest limit per handler, the number of dispatch workers by default.
+        :param target_latency: Handler latency in seconds above which the limit shrinks, relative
+            to the handler's best latency if None.
+        :param tolerance: Factor over the best latency tolerated when no target is set.
+        :param backoff: Factor applied to the limit when shrinking.
+        """
+        if self.config.dispatch_workers < 1:
+            raise ValueError("Adaptive concurrency needs dispatch_workers")
+        options = {
+            'min_limit': min_limit,
+            'max_limit': self.config.dispatch_workers if max_limit is None else max_limit,
+            'target_latency': target_latency,
+            'tolerance': tolerance,
+            'backoff': backoff,
+        }
+        # Validate the options now rather than on the first message
+        AdaptiveLimit(**options)
+        self._concurrency_limits = {}
+        self._concurrency_options = options
+
+    def concurrency_limits(self) -> Dict[str, Dict[str, Any]]:
+        """Current concurrency limit, in-flight and waiting calls and latency of every handler, by class name."""
+        limits = {}
+        seen: Dict[str, int] = {}
+        for handler in self.message_handlers:
+            name = handler.__class__.__name__
+            seen[name] = seen.get(name, 0) + 1
+            limit = self._concurrency_limits.get(handler)
+            if limit is not None:
+                limits[name if seen[name] == 1 else f"{name}#{seen[name]}"] = limit.to_dict()
+        return limits
+
+    def enable_catch_up(self, **options) -> CatchUpController:
+        """
+        Drop stale and superseded messages while dispatch is behind, until it catches up.
+
+        Backlog is detected from the time messages spent queued for the dispatch
+        workers or, with a ``timestamp_field``, from the send time in their payload,
+        which also catches floods of old messages delivered on reconnect. Collapsing to
+        the latest message per topic needs ``dispatch_workers``, as only queued messages
+        can be superseded.
+
+        :param options: CatchUpController options: enter_age, exit_age, ttl, topic_ttls,
+            collapse and timestamp_field.
+        :return: The controller, also available as ``broker.catch_up``.
+        """
+        self.catch_up = CatchUpController(**options)
+        return self.catch_up
+
+    def enable_dead_letter_queue(self,
+                                 capacity: int = 1000,
+                                 spill_path: Optional[str] = None,
+                                 max_spill_bytes: int = 64 * 1024 * 1024) -> DeadLetterQueue:
+        """
+        Capture messages with invalid payloads, failing validation or raising in a handler.
+
+        :param capacity: Number of failed messages kept in memory.
+        :param spill_path: File older failed messages are moved to, they are dropped if None.
+        :param max_spill_bytes: Maximum size of the spill file.
+        :return: The dead letter queue, also available as ``broker.dead_letters``.
+        """
+        self.dead_letters = DeadLetterQueue(capacity, spill_path, max_spill_bytes)
+        return self.dead_letters
+
+    def redrive_dead_letters(self, batch_size: int = 100) -> int:
+        """
+        Dispatch the oldest dead letters again.
+
+        Letters of a failed handler are only delivered to the registered handlers of the
+        same class, the others go through the whole dispatch again. Letters failing again
+        go back to the queue with their attempt count increased, and letters whose
+        handler is no longer registered are kept.
+
+        :param batch_size: Maximum number of letters re-driven.
+        :return: The number of letters re-driven.
+        """
+        if self.dead_letters is None:
+            return 0
+        redriven = 0
+        for letter in self.dead_letters.take(batch_size):
+            message = letter.message(self._decode_payload)
+            if letter.handler is None:
+                self._process_message(message, letter.attempts + 1)
+                redriven += 1
+                continue
+            handlers = [handler for handler in self._registry.snapshot.handlers_for(letter.topic)
+                        if handler.__class__.__name__ == letter.handler]
+            if not handlers:
+                logging.warning(f"Keeping dead letter on {letter.topic}, handler {letter.handler} is not registered")
+                self.dead_letters.put(letter)
+                continue
+            for handler in handlers:
+                try:
+                    self._call_handler(handler, message)
+                except Exception as e:
+                    logging.error(f"Error re-driving MQTT message to {letter.handler}: {str(e)}")
+                    reason = "invalid_payload" if isinstance(e, PayloadDecodeError) else "handler_error"
+                    self._dead_letter(message, reason, e, letter.handler, letter.attempts + 1)
+            redriven += 1
+        return redriven
+
+    def enable_shared_values(self,
+                             name: str,
+                             topics: List[str],
+                             slots: int = 1024,
+                             max_payload: int = 4096,
+                             replace_existing: bool = False) -> SharedValuePublisher:
+        """
+        Act as ingest leader, sharing the latest payload of topics with local processes.
+
+        Other processes read the values with ``SharedValueReader(name)`` instead of
+        subscribing themselves, so each message is received once per host.
+
+        :param name: Name of the shared memory region.
+        :param topics: Topic filters whose latest values are shared.
+        :param slots: Maximum number of topics shared.
+        :param max_payload: Maximum payload size in bytes, larger payloads are not shared.
+        :param replace_existing: Whether an existing region with the name, e.g. left by a crash, is replaced.
+        :return: The handler writing the values, also available as ``broker.shared_values``.
+        :raises FileExistsError: If the region exists and is not replaced.
+        """
+        writer = SharedValueWriter(name, slots, max_payload, replace_existing=replace_existing)
+        self.shared_values = SharedValuePublisher(list(topics), writer, self.compressor.decompress)
+        self.add_message_handler(self.shared_values)
+        return self.shared_values
+
+    def enable_history(self,
+                       topic_filter: str,
+                       fields: List[str],
+                       capacity: int = 1000,
+                       dtype: str = "float32",
+                       timestamp_field: Optional[str] = "timestamp") -> None:
+        """
+        Keep the latest samples of numeric payload fields for topics matching a filter.
+
+        :param topic_filter: Topic filter whose messages are recorded.
+        :param fields: Numeric payload fields to store; dotted paths reach nested fields.
+        :param capacity: Number of samples kept per topic.
+        :param dtype: NumPy dtype used to store the field values.
+        :param timestamp_field: Payload field holding the sample time, the receive time is used otherwise.
+        """
+        self._enable_history_spec(HistorySpec(topic_filter, list(fields), capacity, dtype, timestamp_field))
+
+    def _enable_history_spec(self, spec: HistorySpec) -> None:
+        if self.history is None:
+            self.history = HistoryStore()
+        self.history.add_spec(spec)
+
+    def get_history(self, topic: str) -> Optional[NumericRingBuffer]:
+        """
+        Get the recorded sample history of a topic.
+
+        :return: A buffer exposing zero-copy NumPy views of the samples, or None.
+        """
+        return self.history.get(topic) if self.history else None
+
+    def _rebuild_schema_registry(self, handlers: Iterable[MessageHandler]) -> None:
+        """Compile the payload schemas from the config and the given handlers."""
+        registry = SchemaRegistry()
+        registry.add_schemas(self.config.payload_schemas)
+        for handler in handlers:
+            registry.add_schemas(handler.get_payload_schemas())
+        self.schema_registry = registry
+
+    def _rebuild_downsamplers(self, handlers: Iterable[MessageHandler]) -> None:
+        """Create the downsamplers of new handlers with delivery policies, keeping the windows of the others."""
+        downsamplers = {}
+        for handler in handlers:
+            key = id(handler)
+            if key in self._downsamplers:
+                downsamplers[key] = self._downsamplers[key]
+            else:
+                policies = handler.get_delivery_policies()
+                if policies:
+                    downsamplers[key] = Downsampler.from_dict(policies)
+        self._downsamplers = downsamplers
+
+    def get_downsampler(self, handler: MessageHandler) -> Optional[Downsampler]:
+        """Get the downsampler applying the delivery policies of a handler, None if it has none."""
+        return self._downsamplers.get(id(handler))
+
+    def _subscription_for(self, topic: str) -> str:
+        """Get the subscription string for a topic, applying the configured share group."""
+        if topic == self.reply_topic or (self.health is not None and topic == self.health.probe_topic):
+            # Replies and probes must reach this instance, never another member of the share group
+            return topic
+        return shared_subscription(self.config.shared_subscription_group, topic)
 
     # MQTT Event Handlers
-    def on_connect(self, client, userdata, flags, rc):
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         """Callback for when the MQTT client connects to the broker"""
         self._connection_result = rc
         self._connection_event.set()
+        if self.health is not None:
+            self.health.reset_probe()
         
         if rc == 0:            
-            # Subscribe to all collected topics
-            for topic in self.subscribed_topics:
-                self.client.subscribe(topic)
-                logging.info(f"Subscribed to topic: {topic}")
+            self._restore_subscriptions(flags)
+            self._republish_unacknowledged()
             
             # Publish initial status if status topic is configured
             if self.config.topics and 'status' in self.config.topics:
@@ -137,28 +644,223 @@ class MQTTBroker:
         else:
             logging.error(f"Failed to connect to MQTT broker with code {rc}")
 
+    def _restore_subscriptions(self, flags) -> None:
+        """
+        Subscribe to all collected topics.
+
+        When the server resumed a persistent session it still holds the previous
+        subscriptions, so only the difference is subscribed and unsubscribed.
+        """
+        desired = {self._subscription_for(topic): self._subscription_qos(topic) for topic in self.subscribed_topics}
+        session_present = isinstance(flags, dict) and bool(flags.get('session present'))
+        if self.config.persistent_session and session_present:
+            for subscription in self._session_subscriptions.keys() - desired.keys():
+                self.client.unsubscribe(subscription)
+            missing = {
+                subscription: qos for subscription, qos in desired.items()
+                if self._session_subscriptions.get(subscription) != qos
+            }
+            logging.info(f"Resumed MQTT session with {len(desired) - len(missing)} subscriptions in place")
+        else:
+            missing = desired
+        for subscription, qos in missing.items():
+            self.client.subscribe(subscription, qos)
+            logging.info(f"Subscribed to topic: {subscription}")
+        self._session_subscriptions = desired
+        self._save_session()
+
+    def _republish_unacknowledged(self) -> None:
+        """Publish again the messages a previous run left unacknowledged."""
+        if self.session_store is None:
+            return
+        messages = self.session_store.take_unacknowledged()
+        for topic, payload, qos in messages:
+            self.client.publish(topic, payload, qos)
+        if messages:
+            logging.info(f"Republished {len(messages)} unacknowledged messages from the previous session")
+            self._save_session()
+
+    def _save_session(self) -> None:
+        """Persist the subscriptions and unacknowledged publishes to the session store."""
+        if self.session_store is None:
+            return
+        try:
+            self.session_store.save(self._session_subscriptions, self.client.unacknowledged_messages())
+        except Exception as e:
+            logging.error(f"Failed to save MQTT session to {self.session_store.path}: {str(e)}")
+
+    def _start_session_checkpoints(self) -> None:
+        if self.session_store is None:
+            return
+        thread = self._session_checkpoint_thread
+        if thread is not None and thread.is_alive():
+            return
+        self._session_checkpoint_stop = threading.Event()
+        self._session_checkpoint_thread = threading.Thread(
+            target=self._checkpoint_session, args=(self._session_checkpoint_stop,),
+            name="mqtt-session-checkpoint", daemon=True)
+        self._session_checkpoint_thread.start()
+
+    def _checkpoint_session(self, stop: threading.Event) -> None:
+        while not stop.wait(self.config.session_checkpoint_interval):
+            self._save_session()
+
     def on_message(self, client, userdata, msg):
         """Callback for when a message is received on a subscribed topic"""
+        health = self.health
+        if health is not None:
+            if msg.topic == health.probe_topic:
+                health.probe_received(msg.payload)
+                return
+            health.record_message(msg.topic)
+        if not self._accepting_messages:
+            self._refused_message_count += 1
+            return
         try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode())
-            logging.info(f"Received MQTT message on topic {topic}")
-            
-            # Pass message to all handlers
-            for handler in self.message_handlers:
-                if topic in handler.get_subscribed_topics():
-                    try:
-                        handler.handle_message(topic, payload)
-                    except Exception as e:
-                        logging.error(f"Error in message handler {handler.__class__.__name__}: {str(e)}")
-                        
-        except json.JSONDecodeError:
-            logging.error(f"Invalid JSON in MQTT message: {msg.payload}")
+            message = Message(self._intern_topic(msg.topic), msg.payload, self._decode_payload, msg.qos, msg.retain)
+            logging.info("Received MQTT message on topic %s", message.topic)
+        except Exception as e:
+            logging.error(f"Error processing MQTT message: {str(e)}")
+            return
+        dispatcher = self._dispatcher
+        if dispatcher is not None:
+            if self.catch_up is not None:
+                self.catch_up.queued(message)
+            if not dispatcher.submit(message):
+                self._dispatch_overflow(message)
+        else:
+            self._process_message(message)
+
+    def _dispatch_overflow(self, message: Message) -> None:
+        """Account for a message refused by the full dispatch queue, without blocking the network thread."""
+        self.dispatch_overflow_count += 1
+        if self.catch_up is not None:
+            self.catch_up.discard(message)
+        logging.warning(f"Dispatch queue full, dropping MQTT message on topic {message.topic}")
+        self._dead_letter(message, "overflow", OverflowError("Dispatch queue full"))
+
+    def _process_message(self, message: Message, attempts: int = 1) -> None:
+        try:
+            self._dispatch(message, attempts)
+        except PayloadDecodeError as e:
+            logging.error(f"Invalid JSON in MQTT message: {message.raw}")
+            self._dead_letter(message, "invalid_payload", e, attempts=attempts)
         except Exception as e:
             logging.error(f"Error processing MQTT message: {str(e)}")
 
-    def on_disconnect(self, client, userdata, rc):
+    def _dispatch(self, message: Message, attempts: int = 1) -> None:
+        """Validate, record and pass a message to all matching handlers."""
+        topic = message.topic
+        # Observed before catch-up so deliberately dropped messages are not counted as lost
+        if self.latency is not None:
+            self.latency.observe(message)
+
+        if topic == self.reply_topic and self._reply_subscribed:
+            if not self.pending_requests.resolve(message.payload):
+                logging.debug(f"Discarding reply without pending request on {topic}")
+            return
+
+        # Replies always resolve their request, and re-driven dead letters are old by nature
+        if self.catch_up is not None and attempts == 1 and not self.catch_up.admit(message):
+            return
+
+        if self.schema_registry.has_schemas(topic):
+            validation_error = self.schema_registry.validate(topic, message.payload)
+            if validation_error:
+                self._reject_message(topic, message.payload, validation_error)
+                self._dead_letter(message, "validation", ValueError(validation_error), attempts=attempts)
+                return
+
+        if self.history is not None and self.history.tracks(topic):
+            self.history.record(topic, message.payload)
+
+        # Pass message to all handlers, downsampled ones may drop it before it is decoded
+        downsamplers = self._downsamplers
+        for handler in self._registry.snapshot.handlers_for(topic):
+            try:
+                downsampler = downsamplers.get(id(handler)) if downsamplers else None
+                delivered = message if downsampler is None else downsampler.offer(message)
+                if delivered is not None:
+                    self._call_handler(handler, delivered)
+            except PayloadDecodeError:
+                raise
+            except Exception as e:
+                logging.error(f"Error in message handler {handler.__class__.__name__}: {str(e)}")
+                self._dead_letter(message, "handler_error", e, handler.__class__.__name__, attempts)
+
+    def _call_handler(self, handler: MessageHandler, message: Message) -> None:
+        """
+        Pass a message to a handler, within its concurrency limit when adaptive concurrency is on.
+
+        Handlers that are not concurrent are called one message at a time.
+        """
+        if self._concurrency_options is None:
+            if handler.concurrent:
+                handler.handle(message)
+                return
+            # Also taken without dispatch workers, as dead letters are redriven on the caller's thread
+            lock = self._handler_locks.get(handler)
+            if lock is None:
+                with self._registration_lock:
+                    lock = self._handler_locks.setdefault(handler, threading.Lock())
+            with lock:
+                handler.handle(message)
+            return
+        limit = self._concurrency_limits.get(handler)
+        if limit is None:
+            options = self._concurrency_options
+            if not handler.concurrent:
+                options = {**options, 'min_limit': 1, 'max_limit': 1}
+            with self._registration_lock:
+                limit = self._concurrency_limits.setdefault(handler, AdaptiveLimit(**options))
+        limit.acquire()
+        started = time.perf_counter()
+        failed = True
+        try:
+            handler.handle(message)
+            failed = False
+        finally:
+            limit.release(time.perf_counter() - started, failed)
+
+    def _dead_letter(self,
+                     message: Message,
+                     reason: str,
+                     error: BaseException,
+                     handler: Optional[str] = None,
+                     attempts: int = 1) -> None:
+        if self.dead_letters is not None:
+            self.dead_letters.put(dead_letter_for(message, reason, error, handler, attempts))
+
+    def _decode_payload(self, raw: bytes) -> Any:
+        """Decompress and parse a received JSON payload."""
+        return json.loads(self.compressor.decompress(raw).decode())
+
+    def _intern_topic(self, topic: str) -> str:
+        """Map a received topic to one shared string instance per distinct topic."""
+        interned = self._interned_topics.get(topic)
+        if interned is None:
+            if len(self._interned_topics) >= self.MAX_INTERNED_TOPICS:
+                self._interned_topics.clear()
+            interned = self._interned_topics[topic] = sys.intern(topic)
+        return interned
+
+    def _reject_message(self, topic: str, payload: Any, error: str) -> None:
+        """Count a message that failed validation and forward it to the dead letter topic."""
+        self.rejected_message_count += 1
+        logging.warning(f"Rejected MQTT message on topic {topic}: {error}")
+        if self.config.topics and 'dead_letter' in self.config.topics:
+            self.publish_message(self.config.topics['dead_letter'], {
+                'topic': topic,
+                'error': error,
+                'payload': payload,
+                'timestamp': datetime.now().isoformat(),
+            })
+
+    def on_disconnect(self, client, userdata, rc, properties=None):
         """Callback for when the MQTT client disconnects"""
+        if not self.config.persistent_session:
+            # Without a persistent session nothing outstanding is acknowledged after a reconnect
+            self.client.fail_pending_acks(ConnectionError(f"Disconnected from MQTT broker with code {rc}"))
         if rc != 0:
             logging.warning(f"Unexpected MQTT disconnection with code {rc}")
             self._attempt_reconnection()
@@ -174,11 +876,25 @@ class MQTTBroker:
             except Exception as e:
                 logging.error(f"Failed to reconnect to MQTT broker: {str(e)}")
 
-    def publish_message(self, topic: str, payload: Dict[str, Any], qos: int = 0) -> bool:
-        """Publish a message to a topic."""
+    def publish_message(self,
+                        topic: str,
+                        payload: Dict[str, Any],
+                        qos: int = 0,
+                        content_type: Optional[str] = None,
+                        message_expiry_interval: Optional[int] = None) -> bool:
+        """
+        Publish a message to a topic.
+
+        :param topic: The MQTT topic to publish on.
+        :param payload: The payload, serialized as JSON and compressed above the configured threshold.
+        :param qos: The quality of service level.
+        :param content_type: Optional MQTT v5 content type, so consumers can pick a decoder.
+        :param message_expiry_interval: Optional MQTT v5 lifetime of the message in seconds.
+        """
         if self.client and self.client.is_connected():
             try:
-                success = self.client.publish(topic, json.dumps(payload), qos)
+                properties = self._publish_properties(content_type, message_expiry_interval)
+                success = self.client.publish(topic, self._encode_payload(payload, topic), qos, **properties)
                 if success:
                     logging.debug(f"Published message to topic {topic}")
                 else:
@@ -191,6 +907,164 @@ class MQTTBroker:
             logging.debug("Skipping message publish - MQTT client not properly connected")
             return False
 
+    def publish_message_with_ack(self,
+                                 topic: str,
+                                 payload: Dict[str, Any],
+                                 qos: int = 1,
+                                 content_type: Optional[str] = None,
+                                 message_expiry_interval: Optional[int] = None,
+                                 timeout: Optional[float] = None) -> Future:
+        """
+        Publish a message and get a future completed when the broker acknowledges it.
+
+        At most ``max_inflight_messages`` messages are awaiting acknowledgement at once;
+        this call blocks for up to ``timeout`` seconds while the in-flight window is full.
+
+        :return: A future resolving to True on PUBACK/PUBCOMP (on queueing for QoS 0),
+            or raising ConnectionError/TimeoutError.
+        """
+        if not (self.client and self.client.is_connected()):
+            return self._failed_future(ConnectionError("MQTT client not connected"))
+        try:
+            data = self._encode_payload(payload, topic)
+        except Exception as e:
+            logging.error(f"Error publishing message to {topic}: {str(e)}")
+            return self._failed_future(e)
+        properties = self._publish_properties(content_type, message_expiry_interval)
+        return self._publish_encoded(topic, data, qos, properties, timeout)
+
+    def _publish_encoded(self,
+                         topic: str,
+                         data: Any,
+                         qos: int,
+                         properties: Dict[str, Any],
+                         timeout: Optional[float]) -> Future:
+        """Publish an already encoded payload through the in-flight window."""
+        try:
+            return self.client.publish_with_ack(topic, data, qos, timeout=timeout, **properties)
+        except Exception as e:
+            logging.error(f"Error publishing message to {topic}: {str(e)}")
+            return self._failed_future(e)
+
+    @staticmethod
+    def _failed_future(error: BaseException) -> Future:
+        future = Future()
+        future.set_exception(error)
+        return future
+
+    def publish_many(self,
+                     messages: Iterable[Tuple[str, Dict[str, Any]]],
+                     qos: int = 1,
+                     timeout: Optional[float] = None) -> List[bool]:
+        """
+        Publish a batch of messages pipelined within the in-flight window and wait for all acks.
+
+        :param messages: Iterable of (topic, payload) tuples.
+        :param qos: The quality of service level of every message.
+        :param timeout: Overall seconds to wait for the batch, None waits indefinitely.
+        :return: Whether each message was acknowledged within the timeout, in order.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = []
+        for topic, payload in messages:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            futures.append(self.publish_message_with_ack(topic, payload, qos, timeout=remaining))
+        return self._await_batch(futures, deadline)
+
+    def publish_fanout(self,
+                       topics: Iterable[str],
+                       payload: Dict[str, Any],
+                       qos: int = 1,
+                       content_type: Optional[str] = None,
+                       message_expiry_interval: Optional[int] = None,
+                       timeout: Optional[float] = None) -> Dict[str, bool]:
+        """
+        Publish one payload to many topics, serializing and compressing it only once.
+
+        The encoded bytes are reused for every topic and the publishes are pipelined
+        within the in-flight window, like ``publish_many``.
+
+        :param topics: The topics to publish on, duplicates are published once.
+        :param payload: The payload sent to every topic.
+        :param qos: The quality of service level of every message.
+        :param content_type: Optional MQTT v5 content type.
+        :param message_expiry_interval: Optional MQTT v5 lifetime of the messages in seconds.
+        :param timeout: Overall seconds to wait for the acknowledgements, None waits indefinitely.
+        :return: Whether the message was acknowledged within the timeout, per topic.
+        """
+        topics = list(dict.fromkeys(topics))
+        if not (self.client and self.client.is_connected()):
+            logging.debug("Skipping fan-out publish - MQTT client not properly connected")
+            return {topic: False for topic in topics}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            data = self._encode_payload(payload)
+        except Exception as e:
+            logging.error(f"Error encoding fan-out payload: {str(e)}")
+            return {topic: False for topic in topics}
+        properties = self._publish_properties(content_type, message_expiry_interval)
+        futures = []
+        for topic in topics:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            futures.append(self._publish_encoded(topic, data, qos, properties, remaining))
+        return dict(zip(topics, self._await_batch(futures, deadline)))
+
+    @staticmethod
+    def _await_batch(futures: List[Future], deadline: Optional[float]) -> List[bool]:
+        """Wait for a batch of publish futures until the deadline and report which succeeded."""
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        wait(futures, timeout=remaining)
+        results = [future.done() and future.exception() is None for future in futures]
+        if not all(results):
+            logging.warning(f"{results.count(False)} of {len(results)} messages were not acknowledged")
+        return results
+
+    def _encode_payload(self, payload: Any, topic: Optional[str] = None) -> Any:
+        """
+        Serialize a payload to JSON, compressed above the configured threshold.
+
+        With latency tracking, objects are stamped first; without a topic the stamp has
+        no sequence number, as the payload is sent to several topics.
+        """
+        if self.latency is not None and isinstance(payload, dict):
+            payload = self.latency.stamp(payload, topic)
+        return self.compressor.compress(json.dumps(payload))
+
+    @staticmethod
+    def _publish_properties(content_type: Optional[str], message_expiry_interval: Optional[int]) -> Dict[str, Any]:
+        """Keyword arguments for the optional MQTT v5 publish properties that are set."""
+        properties = {}
+        if content_type is not None:
+            properties['content_type'] = content_type
+        if message_expiry_interval is not None:
+            properties['message_expiry_interval'] = message_expiry_interval
+        return properties
+
+    def request(self, topic: str, payload: Any, timeout: float = 10.0, qos: int = 1) -> Future:
+        """
+        Send a request and get a future completed by the reply.
+
+        The request carries a correlation ID and this broker's reply topic; responders
+        such as ``handlers.RequestResponder`` publish the reply there.
+
+        :param topic: The topic the responder listens on.
+        :param payload: The request payload.
+        :param timeout: Seconds to wait for the reply before the future fails with TimeoutError.
+        :param qos: The quality of service level of the request.
+        :return: A future resolving to the reply payload, or raising RequestError or TimeoutError.
+        """
+        if not self._reply_subscribed:
+            self._reply_subscribed = True
+            if self._registry.add_topic(self.reply_topic) and self.client.is_connected():
+                self._subscribe(self.reply_topic)
+                self._save_session()
+
+        correlation_id = self.pending_requests.new_correlation_id()
+        future = self.pending_requests.add(correlation_id, timeout)
+        if not self.publish_message(topic, build_request(correlation_id, self.reply_topic, payload), qos):
+            self.pending_requests.fail(correlation_id, ConnectionError(f"Failed to publish request to {topic}"))
+        return future
+
     def publish_status_update(self):
         """Publish current server status"""
         if not self.config.topics or 'status' not in self.config.topics:
@@ -206,10 +1080,24 @@ class MQTTBroker:
         
         self.publish_message(self.config.topics['status'], status)
 
-    def publish_recording_command(self, command: Dict[str, Any]):
-        """Publish recording command to devices"""
+    def publish_recording_command(self,
+                                  command: Dict[str, Any],
+                                  topics: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """
+        Publish recording command to devices
+
+        :param command: The recording command.
+        :param topics: Per-device control topics to fan the command out to, the configured
+            recording_control topic by default.
+        :return: Per topic, whether the command was acknowledged when fanned out, or queued
+            on the recording_control topic. Empty without topics or a recording_control topic.
+        """
+        if topics is not None:
+            return self.publish_fanout(topics, command, qos=1)
         if self.config.topics and 'recording_control' in self.config.topics:
-            self.publish_message(self.config.topics['recording_control'], command, qos=1)
+            topic = self.config.topics['recording_control']
+            return {topic: self.publish_message(topic, command, qos=1)}
+        return {}
 
     def get_ip_address(self) -> str:
         """Get the IP address of the device"""
@@ -227,5 +1115,5 @@ class MQTTBroker:
     def signal_handler(self, signum, frame):
         """Handle termination signals to gracefully shut down the service"""
         logging.info(f"Received signal {signum}. Shutting down...")
-        self.disconnect()
+        self.shutdown()
         sys.exit(0)
\ No newline at end of file
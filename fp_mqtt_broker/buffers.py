@@ -0,0 +1,103 @@
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+def require_numpy() -> None:
+    """Raise a helpful error when NumPy is not installed."""
+    if np is None:
+        raise ImportError("NumPy is required for this feature: pip install fp-mqtt-broker[numpy]")
+
+def field_paths(fields: Sequence[str]) -> List[List[str]]:
+    """Split dotted field names into the key paths used by ``extract_numeric``."""
+    return [field.split(".") for field in fields]
+
+def extract_numeric(payload: Dict[str, Any], path: Sequence[str]) -> float:
+    """Get a numeric payload field by key path, NaN if it is missing or not a number."""
+    value = payload
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return float("nan")
+        value = value[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return float("nan")
+    return value
+
+def sample_timestamp(payload: Dict[str, Any], timestamp_field: Optional[str]) -> float:
+    """Get the sample time from a payload field, falling back to the current time."""
+    timestamp = payload.get(timestamp_field) if timestamp_field and isinstance(payload, dict) else None
+    if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+        return time.time()
+    return timestamp
+
+class NumericRingBuffer:
+    """
+    Fixed-size ring buffer of timestamped numeric samples backed by NumPy arrays.
+
+    Every sample is written twice, at its slot and one capacity further, so the most
+    recent samples are always contiguous in memory and can be read as zero-copy views
+    without reordering. Memory is allocated once and never grows.
+    """
+
+    def __init__(self, capacity: int, fields: Sequence[str], dtype: str = "float64"):
+        """
+        :param capacity: Maximum number of samples kept.
+        :param fields: Names of the numeric fields stored for each sample.
+        :param dtype: NumPy dtype of the field values.
+        """
+        require_numpy()
+        if capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive")
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self._field_index = {field: index for index, field in enumerate(self.fields)}
+        self._timestamps = np.full(2 * capacity, np.nan, dtype="float64")
+        self._values = np.full((2 * capacity, len(self.fields)), np.nan, dtype=dtype)
+        self._next = 0
+        self._size = 0
+        self.total_samples = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the sample arrays."""
+        return self._timestamps.nbytes + self._values.nbytes
+
+    def append(self, timestamp: float, values: Sequence[float]) -> None:
+        """Store a sample, overwriting the oldest one when the buffer is full."""
+        index = self._next
+        mirror = index + self.capacity
+        self._timestamps[index] = self._timestamps[mirror] = timestamp
+        self._values[index] = self._values[mirror] = values
+        self._next = (index + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+        self.total_samples += 1
+
+    def _window(self, count: Optional[int]) -> slice:
+        count = self._size if count is None else min(count, self._size)
+        end = self._next + self.capacity
+        return slice(end - count, end)
+
+    @staticmethod
+    def _read_only(array):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def timestamps(self, count: Optional[int] = None):
+        """Read-only view of the timestamps of the latest samples, oldest first."""
+        return self._read_only(self._timestamps[self._window(count)])
+
+    def values(self, count: Optional[int] = None):
+        """Read-only 2D view (samples x fields) of the latest samples, oldest first."""
+        return self._read_only(self._values[self._window(count)])
+
+    def column(self, field: str, count: Optional[int] = None):
+        """Read-only view of one field of the latest samples, oldest first."""
+        return self._read_only(self._values[self._window(count), self._field_index[field]])
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from .message import Message
+from .topics import topic_matches
+
+class CatchUpController:
+    """
+    Switches dispatch into a catch-up mode while the broker is behind.
+
+    The age of each dispatched message is the time since it was received or, with a
+    timestamp field, since the timestamp embedded in its payload, whichever is
+    larger. Catch-up starts when an age exceeds ``enter_age`` and ends when a message
+    is again at most ``exit_age`` old. While catching up, messages older than the
+    TTL of their topic are dropped and, when collapsing, a queued message is skipped
+    if a newer one on the same topic is already queued, so handlers jump straight to
+    fresh data.
+    """
+
+    MAX_TOPICS = 10000
+
+    def __init__(self,
+                 enter_age: float = 5.0,
+                 exit_age: float = 1.0,
+                 ttl: Optional[float] = None,
+                 topic_ttls: Optional[Dict[str, float]] = None,
+                 collapse: bool = True,
+                 timestamp_field: Optional[str] = None):
+        """
+        :param enter_age: Message age in seconds starting catch-up.
+        :param exit_age: Message age in seconds ending catch-up.
+        :param ttl: Age in seconds above which messages are dropped while catching up, never if None.
+        :param topic_ttls: TTLs of the topics matching filters, overriding ``ttl``.
+        :param collapse: Whether only the latest queued message per topic is dispatched while catching up.
+        :param timestamp_field: Payload field holding the send time in epoch seconds; reading it decodes every message.
+        """
+        if exit_age > enter_age:
+            raise ValueError("The catch-up exit age cannot exceed the enter age")
+        self.enter_age = enter_age
+        self.exit_age = exit_age
+        self.ttl = ttl
+        self.topic_ttls = dict(topic_ttls or {})
+        self.collapse = collapse
+        self.timestamp_field = timestamp_field
+        self.active = False
+        self.activations = 0
+        self.dropped_stale = 0
+        self.collapsed = 0
+        self._started: Optional[float] = None
+        self._latest: Dict[str, Message] = {}
+        self._ttls: Dict[str, Optional[float]] = {}
+        self._lock = threading.Lock()
+
+    def queued(self, message: Message) -> None:
+        """Note a message queued for dispatch, called on the network thread."""
+        self._latest[message.topic] = message
+
+    def discard(self, message: Message) -> None:
+        """Forget a message noted as queued that was not queued after all."""
+        if self._latest.get(message.topic) is message:
+            self._latest.pop(message.topic, None)
+
+    def ttl_for(self, topic: str) -> Optional[float]:
+        """Get the TTL applying to a topic while catching up."""
+        try:
+            return self._ttls[topic]
+        except KeyError:
+            pass
+        ttl = next((ttl for topic_filter, ttl in self.topic_ttls.items() if topic_matches(topic_filter, topic)), self.ttl)
+        if len(self._ttls) >= self.MAX_TOPICS:
+            self._ttls.clear()
+        self._ttls[topic] = ttl
+        return ttl
+
+    def age(self, message: Message) -> float:
+        """Seconds since a message was received, or sent when its payload says so."""
+        now = time.time()
+        age = now - message.received_at
+        if self.timestamp_field is not None:
+            payload = message.payload
+            sent_at = payload.get(self.timestamp_field) if isinstance(payload, dict) else None
+            if isinstance(sent_at, (int, float)) and not isinstance(sent_at, bool):
+                age = max(age, now - sent_at)
+        return age
+
+    def admit(self, message: Message) -> bool:
+        """
+        Decide whether a message is dispatched, updating the mode from its age.
+
+        :return: False if the message is dropped as stale or superseded.
+        """
+        topic = message.topic
+        latest = self._latest.get(topic)
+        superseded = latest is not None and latest is not message
+        if latest is message:
+            self._latest.pop(topic, None)
+
+        age = self.age(message)
+        self._update_mode(age)
+        if not self.active:
+            return True
+        ttl = self.ttl_for(topic)
+        if ttl is not None and age > ttl:
+            with self._lock:
+                self.dropped_stale += 1
+            return False
+        if self.collapse and superseded:
+            with self._lock:
+                self.collapsed += 1
+            return False
+        return True
+
+    def _update_mode(self, age: float) -> None:
+        # Cheap check first, the mode rarely changes
+        if (age <= self.enter_age) if not self.active else (age > self.exit_age):
+            return
+        with self._lock:
+            if not self.active and age > self.enter_age:
+                self.active = True
+                self.activations += 1
+                self._started = time.monotonic()
+                logging.warning(f"MQTT dispatch is {age:.1f}s behind, catching up")
+            elif self.active and age <= self.exit_age:
+                self.active = False
+                logging.info(f"MQTT dispatch caught up in {time.monotonic() - self._started:.1f}s "
+                             f"({self.dropped_stale} stale and {self.collapsed} superseded messages dropped so far)")
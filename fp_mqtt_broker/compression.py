@@ -0,0 +1,262 @@
+import struct
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Union
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - depends on the environment
+    lz4_frame = None
+
+# Compressed payloads start with a NUL byte, which can never start a JSON document.
+FRAME_MAGIC = b"\x00FZ"
+_FRAME_HEADER = struct.Struct("!3sBI")
+
+class Codec(ABC):
+    """Base class for payload compression codecs."""
+
+    codec_id = 0
+    name = ""
+    supports_dictionary = False
+
+    def __init__(self, level: Optional[int] = None):
+        self.level = level
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Whether the libraries needed by this codec are installed."""
+        return True
+
+    @abstractmethod
+    def compress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        """Compress data, with a preset dictionary when the codec supports them."""
+        pass
+
+    @abstractmethod
+    def decompress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        """Decompress data compressed with the same dictionary."""
+        pass
+
+    def train_dictionary(self, samples: Iterable[bytes], size: int) -> bytes:
+        """Build a compression dictionary from sample payloads, for codecs that support dictionaries."""
+        raise ValueError(f"Codec {self.name} does not support dictionaries")
+
+class ZlibCodec(Codec):
+    """zlib (deflate) codec, always available."""
+
+    codec_id = 1
+    name = "zlib"
+    supports_dictionary = True
+    # Deflate can only refer back 32 KiB, so a larger preset dictionary is wasted.
+    MAX_DICTIONARY_SIZE = 32 * 1024
+
+    def compress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        level = -1 if self.level is None else self.level
+        if dictionary:
+            compressor = zlib.compressobj(level, zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        if dictionary:
+            decompressor = zlib.decompressobj(zdict=dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def train_dictionary(self, samples: Iterable[bytes], size: int) -> bytes:
+        # Deflate matches best against the end of the dictionary, so the most recent
+        # samples are kept and placed last.
+        size = min(size, self.MAX_DICTIONARY_SIZE)
+        dictionary = b""
+        for sample in reversed(list(samples)):
+            if len(dictionary) >= size:
+                break
+            dictionary = sample + dictionary
+        return dictionary[-size:]
+
+class ZstdCodec(Codec):
+    """Zstandard codec, requires the ``zstandard`` package."""
+
+    codec_id = 2
+    name = "zstd"
+    supports_dictionary = True
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return zstandard is not None
+
+    def compress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        kwargs = {"level": 3 if self.level is None else self.level}
+        if dictionary:
+            kwargs["dict_data"] = zstandard.ZstdCompressionDict(dictionary)
+        return zstandard.ZstdCompressor(**kwargs).compress(data)
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        if dictionary:
+            decompressor = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary))
+        else:
+            decompressor = zstandard.ZstdDecompressor()
+        return decompressor.decompress(data)
+
+    def train_dictionary(self, samples: Iterable[bytes], size: int) -> bytes:
+        return zstandard.train_dictionary(size, list(samples)).as_bytes()
+
+class Lz4Codec(Codec):
+    """LZ4 frame codec, requires the ``lz4`` package."""
+
+    codec_id = 3
+    name = "lz4"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return lz4_frame is not None
+
+    def compress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        if self.level is None:
+            return lz4_frame.compress(data)
+        return lz4_frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        return lz4_frame.decompress(data)
+
+CODECS = {codec.name: codec for codec in (ZlibCodec, ZstdCodec, Lz4Codec)}
+_CODECS_BY_ID = {codec.codec_id: codec for codec in CODECS.values()}
+
+def is_compressed(payload: Union[str, bytes]) -> bool:
+    """Check whether a payload is a compressed frame."""
+    return isinstance(payload, (bytes, bytearray)) and payload[:len(FRAME_MAGIC)] == FRAME_MAGIC
+
+def dictionary_id(dictionary: bytes) -> int:
+    """Stable identifier of a dictionary, shared by publishers and consumers."""
+    return zlib.crc32(dictionary) or 1
+
+class PayloadCompressor:
+    """
+    Compresses outgoing payloads above a size threshold and decompresses incoming ones.
+
+    Compressed payloads are framed with a magic prefix, the codec and the dictionary
+    used, so receivers decompress automatically and uncompressed JSON passes through.
+    Receivers must have every dictionary publishers use registered.
+
+    With a cache size, the frames of recently compressed payloads are memoised, so
+    publishing the same payload repeatedly compresses it once. The cache is keyed by
+    the whole payload and only pays off for identical republished payloads, so it is
+    off by default.
+    """
+
+    def __init__(self,
+                 codec: Optional[str] = None,
+                 threshold: int = 1024,
+                 level: Optional[int] = None,
+                 cache_size: int = 0):
+        """
+        :param codec: Name of the codec used for publishing ("zlib", "zstd", "lz4"),
+            or None to only decompress incoming payloads.
+        :param threshold: Minimum payload size in bytes to compress.
+        :param level: Optional codec specific compression level.
+        :param cache_size: Number of compressed frames memoised, 0 to disable.
+        """
+        if codec is not None:
+            if codec not in CODECS:
+                raise ValueError(f"Unknown compression codec: {codec}")
+            if not CODECS[codec].is_available():
+                raise ValueError(f"Compression codec {codec} is not installed")
+        self.codec = CODECS[codec](level) if codec else None
+        self.threshold = threshold
+        self.level = level
+        self._dictionaries: Dict[int, bytes] = {}
+        self._active_dictionary_id = 0
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Union[str, bytes], Union[str, bytes]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether outgoing payloads are compressed."""
+        return self.codec is not None
+
+    def register_dictionary(self, dictionary: bytes, activate: bool = False) -> int:
+        """
+        Register a dictionary for decompression, and optionally use it to compress.
+
+        :return: The dictionary identifier carried in compressed frames.
+        """
+        dict_id = dictionary_id(dictionary)
+        self._dictionaries[dict_id] = dictionary
+        if activate:
+            if not self.enabled or not self.codec.supports_dictionary:
+                raise ValueError("The configured codec does not support dictionaries")
+            self._active_dictionary_id = dict_id
+            with self._cache_lock:
+                self._cache.clear()
+        return dict_id
+
+    def train_dictionary(self, samples: Iterable[Union[str, bytes]], size: int = 16 * 1024) -> bytes:
+        """
+        Train a dictionary from sample payloads and start compressing with it.
+
+        Dictionaries make small, similar messages compressible. The returned bytes
+        must be registered on every consumer with ``register_dictionary``.
+        """
+        if not self.enabled:
+            raise ValueError("No compression codec configured")
+        if not self.codec.supports_dictionary:
+            raise ValueError(f"Compression codec {self.codec.name} does not support dictionaries")
+        encoded = [sample.encode() if isinstance(sample, str) else sample for sample in samples]
+        dictionary = self.codec.train_dictionary(encoded, size)
+        self.register_dictionary(dictionary, activate=True)
+        return dictionary
+
+    def compress(self, payload: Union[str, bytes]) -> Union[str, bytes]:
+        """
+        Compress a payload if it is large enough and compression makes it smaller.
+
+        :return: A compressed frame, or the payload unchanged.
+        """
+        if not self.enabled or len(payload) < self.threshold:
+            return payload
+        if self.cache_size:
+            with self._cache_lock:
+                cached = self._cache.get(payload)
+                if cached is not None:
+                    self._cache.move_to_end(payload)
+                    return cached
+        data = payload.encode() if isinstance(payload, str) else payload
+        dictionary = self._dictionaries.get(self._active_dictionary_id)
+        frame = _FRAME_HEADER.pack(FRAME_MAGIC, self.codec.codec_id, self._active_dictionary_id)
+        frame += self.codec.compress(data, dictionary)
+        result = frame if len(frame) < len(data) else payload
+        if self.cache_size:
+            with self._cache_lock:
+                self._cache[payload] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def decompress(self, payload: bytes) -> bytes:
+        """
+        Decompress a payload if it is a compressed frame.
+
+        :return: The original payload bytes.
+        """
+        if not is_compressed(payload):
+            return payload
+        _, codec_id, dict_id = _FRAME_HEADER.unpack_from(payload)
+        codec_class = _CODECS_BY_ID.get(codec_id)
+        if codec_class is None or not codec_class.is_available():
+            raise ValueError(f"Unsupported compression codec id: {codec_id}")
+        dictionary = None
+        if dict_id:
+            dictionary = self._dictionaries.get(dict_id)
+            if dictionary is None:
+                raise ValueError(f"Unknown compression dictionary: {dict_id}")
+        return codec_class(self.level).decompress(payload[_FRAME_HEADER.size:], dictionary)
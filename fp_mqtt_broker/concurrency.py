@@ -0,0 +1,104 @@
+import threading
+from typing import Any, Dict, Optional
+
+class AdaptiveLimit:
+    """
+    Concurrency limit adjusted by additive increase, multiplicative decrease (AIMD).
+
+    Callers acquire a slot before a call and release it with the call's latency.
+    The limit is revisited once per window of about ``limit`` calls: it shrinks by
+    ``backoff`` when a call failed or the smoothed latency exceeds the target, which
+    defaults to ``tolerance`` times the lowest latency seen, and grows by one when
+    the latency is fine and callers had to wait for a slot. It always stays within
+    ``min_limit`` and ``max_limit``.
+    """
+
+    def __init__(self,
+                 min_limit: int = 1,
+                 max_limit: int = 16,
+                 target_latency: Optional[float] = None,
+                 tolerance: float = 2.0,
+                 backoff: float = 0.75,
+                 smoothing: float = 0.2):
+        """
+        :param min_limit: Lowest limit.
+        :param max_limit: Highest limit.
+        :param target_latency: Call latency in seconds above which the limit shrinks, relative to the best latency if None.
+        :param tolerance: Factor over the best latency tolerated when no target is set.
+        :param backoff: Factor applied to the limit when shrinking.
+        :param smoothing: Weight of the latest call in the smoothed latency.
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Concurrency limits need 1 <= min_limit <= max_limit")
+        if not 0 < backoff < 1:
+            raise ValueError("The concurrency backoff must be between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.limit = float(min_limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency: Optional[float] = None
+        self.best_latency: Optional[float] = None
+        self._calls = 0
+        self._saturated = False
+        self._failed = False
+        self._condition = threading.Condition()
+
+    @property
+    def current(self) -> int:
+        """The number of concurrent calls currently allowed."""
+        return int(self.limit)
+
+    def acquire(self) -> None:
+        """Wait for a free slot."""
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                self._saturated = True
+                self.waiting += 1
+                while self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                self.waiting -= 1
+            self.in_flight += 1
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        """Free a slot and adjust the limit from the call's latency and outcome."""
+        with self._condition:
+            self.in_flight -= 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += (latency - self.latency) * self.smoothing
+            if self.best_latency is None or latency < self.best_latency:
+                self.best_latency = latency
+            else:
+                # Let the best latency drift up slowly, so a permanent slowdown becomes the new normal
+                self.best_latency += (latency - self.best_latency) * 0.001
+            self._calls += 1
+            self._failed = self._failed or failed
+            if self._calls >= int(self.limit):
+                threshold = self.target_latency if self.target_latency is not None else self.best_latency * self.tolerance
+                if self._failed or self.latency > threshold:
+                    self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                    self._reset_window()
+                elif self._saturated:
+                    self.limit = min(float(self.max_limit), self.limit + 1)
+                    self._reset_window()
+            self._condition.notify_all()
+
+    def _reset_window(self) -> None:
+        self._calls = 0
+        self._saturated = False
+        self._failed = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'limit': self.current,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'latency': self.latency,
+            'best_latency': self.best_latency,
+        }
@@ -1,6 +1,9 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from dataclasses import dataclass
 
+MQTT_V311 = 4
+MQTT_V5 = 5
+
 @dataclass
 class BrokerConfig:
     """
@@ -12,6 +15,69 @@ class BrokerConfig:
     client_id: str = "mqtt_client"
     keepalive: int = 60
     topics: Optional[Dict[str, str]] = None
+    protocol_version: int = MQTT_V311
+    session_expiry_interval: Optional[int] = None
+    shared_subscription_group: Optional[str] = None
+    compression_codec: Optional[str] = None
+    compression_threshold: int = 1024
+    compression_level: Optional[int] = None
+    compression_cache_size: int = 0
+    payload_schemas: Optional[Dict[str, Dict[str, Any]]] = None
+    history: Optional[Dict[str, Dict[str, Any]]] = None
+    max_inflight_messages: int = 20
+    dispatch_workers: int = 0
+    dispatch_queue_size: int = 10000
+    shutdown_timeout: float = 10.0
+    health: Optional[Dict[str, Any]] = None
+    upstreams: Optional[List[Union[str, Dict[str, Any]]]] = None
+    clean_session: bool = True
+    subscription_qos: int = 0
+    session_store_path: Optional[str] = None
+    session_checkpoint_interval: float = 5.0
+    dead_letter_queue: Optional[Dict[str, Any]] = None
+    shared_values: Optional[Dict[str, Any]] = None
+    latency_tracking: Optional[Dict[str, Any]] = None
+    catch_up: Optional[Dict[str, Any]] = None
+    adaptive_concurrency: Optional[Dict[str, Any]] = None
+    transport: str = "tcp"
+    unix_socket_path: Optional[str] = None
+    tcp_nodelay: bool = True
+    socket_send_buffer: Optional[int] = None
+    socket_receive_buffer: Optional[int] = None
+    websocket_path: str = "/mqtt"
+    websocket_headers: Optional[Dict[str, str]] = None
+
+    @property
+    def is_mqtt_v5(self) -> bool:
+        """Whether the broker connection uses MQTT v5."""
+        return self.protocol_version == MQTT_V5
+
+    @property
+    def persistent_session(self) -> bool:
+        """Whether the server keeps the session, its subscriptions and queued messages, across connections."""
+        return not self.clean_session
+
+    @property
+    def upstream_addresses(self) -> List[Tuple[str, int]]:
+        """
+        The (host, port) of every upstream broker.
+
+        Upstreams are given as "host:port" strings or {"host": ..., "port": ...}
+        dictionaries, the broker port is used when none is given. Without upstreams
+        this is the single configured broker.
+        """
+        if not self.upstreams:
+            return [(self.broker_host, self.broker_port)]
+        addresses = []
+        for upstream in self.upstreams:
+            if isinstance(upstream, dict):
+                addresses.append((upstream["host"], int(upstream.get("port", self.broker_port))))
+            else:
+                host, separator, port = upstream.rpartition(":")
+                if not separator:
+                    host, port = upstream, ""
+                addresses.append((host, int(port) if port else self.broker_port))
+        return addresses
 
     @classmethod
     def from_dict(cls, config: Dict[str, any]) -> 'BrokerConfig':
@@ -24,5 +90,36 @@ class BrokerConfig:
             broker_port=mqtt_config.get("broker_port", 1883),
             client_id=mqtt_config.get("client_id", "mqtt_client"),
             keepalive=mqtt_config.get("keepalive", 60),
-            topics=mqtt_config.get("topics", {})
-        )
\ No newline at end of file
+            topics=mqtt_config.get("topics", {}),
+            protocol_version=mqtt_config.get("protocol_version", MQTT_V311),
+            session_expiry_interval=mqtt_config.get("session_expiry_interval"),
+            shared_subscription_group=mqtt_config.get("shared_subscription_group"),
+            compression_codec=mqtt_config.get("compression_codec"),
+            compression_threshold=mqtt_config.get("compression_threshold", 1024),
+            compression_level=mqtt_config.get("compression_level"),
+            compression_cache_size=mqtt_config.get("compression_cache_size", 0),
+            payload_schemas=mqtt_config.get("payload_schemas"),
+            history=mqtt_config.get("history"),
+            max_inflight_messages=mqtt_config.get("max_inflight_messages", 20),
+            dispatch_workers=mqtt_config.get("dispatch_workers", 0),
+            dispatch_queue_size=mqtt_config.get("dispatch_queue_size", 10000),
+            shutdown_timeout=mqtt_config.get("shutdown_timeout", 10.0),
+            health=mqtt_config.get("health"),
+            upstreams=mqtt_config.get("upstreams"),
+            clean_session=mqtt_config.get("clean_session", True),
+            subscription_qos=mqtt_config.get("subscription_qos", 0),
+            session_store_path=mqtt_config.get("session_store_path"),
+            session_checkpoint_interval=mqtt_config.get("session_checkpoint_interval", 5.0),
+            dead_letter_queue=mqtt_config.get("dead_letter_queue"),
+            shared_values=mqtt_config.get("shared_values"),
+            latency_tracking=mqtt_config.get("latency_tracking"),
+            catch_up=mqtt_config.get("catch_up"),
+            adaptive_concurrency=mqtt_config.get("adaptive_concurrency"),
+            transport=mqtt_config.get("transport", "tcp"),
+            unix_socket_path=mqtt_config.get("unix_socket_path"),
+            tcp_nodelay=mqtt_config.get("tcp_nodelay", True),
+            socket_send_buffer=mqtt_config.get("socket_send_buffer"),
+            socket_receive_buffer=mqtt_config.get("socket_receive_buffer"),
+            websocket_path=mqtt_config.get("websocket_path", "/mqtt"),
+            websocket_headers=mqtt_config.get("websocket_headers")
+        )
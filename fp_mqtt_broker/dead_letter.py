@@ -0,0 +1,305 @@
+import base64
+import collections
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .message import Message
+
+@dataclass
+class DeadLetter:
+    """A message that failed processing, with the context of the failure."""
+
+    topic: str
+    raw: bytes
+    # invalid_payload, validation, handler_error or overflow
+    reason: str
+    error: str
+    handler: Optional[str] = None
+    qos: int = 0
+    received_at: float = 0.0
+    failed_at: float = 0.0
+    attempts: int = 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'topic': self.topic,
+            'payload': base64.b64encode(self.raw).decode(),
+            'reason': self.reason,
+            'error': self.error,
+            'handler': self.handler,
+            'qos': self.qos,
+            'received_at': self.received_at,
+            'failed_at': self.failed_at,
+            'attempts': self.attempts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DeadLetter':
+        """
+        Creates a DeadLetter from a dictionary.
+        """
+        return cls(
+            topic=data["topic"],
+            raw=base64.b64decode(data["payload"]),
+            reason=data["reason"],
+            error=data["error"],
+            handler=data.get("handler"),
+            qos=data.get("qos", 0),
+            received_at=data.get("received_at", 0.0),
+            failed_at=data.get("failed_at", 0.0),
+            attempts=data.get("attempts", 1)
+        )
+
+    def message(self, decoder: Callable[[bytes], Any]) -> Message:
+        """Rebuild the received message, to dispatch it again."""
+        return Message(self.topic, self.raw, decoder, self.qos, received_at=self.received_at)
+
+class DeadLetterQueue:
+    """
+    Bounded queue of messages that failed processing.
+
+    The newest letters are kept in an in-memory ring. When it is full the oldest
+    letter is appended to an on-disk segment of JSON lines, if a spill path is set,
+    and dropped otherwise. The segment is bounded too; letters that do not fit are
+    dropped and counted. Letters are read and taken oldest first, the segment before
+    the ring, and the segment survives restarts.
+
+    Spilling happens on the thread adding letters, often the network thread, so the
+    segment is kept open and spilled letters are appended ``SPILL_BATCH`` at a time;
+    reading, ``flush`` and ``persist`` write out a partial batch first. A crash loses
+    the letters of the unwritten batch.
+
+    Taking letters from the segment only advances a read offset, saved next to it so
+    restarts resume there. The segment is rewritten without its taken letters once
+    they are at least half of it and ``COMPACT_BYTES`` long, and removed once every
+    letter was taken, so draining it costs linear I/O.
+    """
+
+    COMPACT_BYTES = 1024 * 1024
+    SPILL_BATCH = 64
+
+    def __init__(self, capacity: int = 1000, spill_path: Optional[str] = None, max_spill_bytes: int = 64 * 1024 * 1024):
+        """
+        :param capacity: Number of letters kept in memory.
+        :param spill_path: File the letters overflowing the ring are appended to, none if None.
+        :param max_spill_bytes: Maximum size of the spill file.
+        """
+        if capacity < 1:
+            raise ValueError("A dead letter queue needs a capacity of at least 1")
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+        self.dropped = 0
+        self._ring: Deque[DeadLetter] = collections.deque()
+        self._spilled = 0
+        self._spill_bytes = 0
+        # Bytes of taken letters at the start of the segment
+        self._offset = 0
+        # Open segment and the encoded letters not yet appended to it
+        self._segment = None
+        self._unwritten: List[bytes] = []
+        self._lock = threading.Lock()
+        if spill_path and os.path.exists(spill_path):
+            self._offset = self._read_offset()
+            with open(spill_path, "rb") as segment:
+                segment.seek(self._offset)
+                for line in segment:
+                    self._spilled += 1
+                    self._spill_bytes += len(line)
+
+    def __len__(self) -> int:
+        return self._spilled + len(self._ring)
+
+    @property
+    def spilled(self) -> int:
+        """Number of letters in the on-disk segment."""
+        return self._spilled
+
+    def put(self, letter: DeadLetter) -> None:
+        """Add a letter, spilling or dropping the oldest one when the ring is full."""
+        with self._lock:
+            self._ring.append(letter)
+            if len(self._ring) > self.capacity:
+                self._spill([self._ring.popleft()])
+
+    def persist(self) -> int:
+        """
+        Move every letter of the ring to the on-disk segment, so they survive a restart.
+
+        :return: The number of letters written, 0 without a spill path.
+        """
+        if not self.spill_path:
+            return 0
+        with self._lock:
+            letters = list(self._ring)
+            self._ring.clear()
+            spilled = self._spill(letters)
+            return spilled if self._write_spill() else 0
+
+    def flush(self) -> None:
+        """Append the spilled letters not yet written to the on-disk segment."""
+        with self._lock:
+            self._write_spill()
+
+    def close(self) -> None:
+        """Write out the spilled letters and close the on-disk segment."""
+        with self._lock:
+            self._write_spill()
+            self._close_segment()
+
+    def inspect(self, limit: int = 100) -> List[DeadLetter]:
+        """Get the oldest letters without removing them."""
+        with self._lock:
+            letters = self._read_segment(limit)
+            letters.extend(list(self._ring)[:limit - len(letters)])
+            return letters
+
+    def take(self, limit: int = 100) -> List[DeadLetter]:
+        """Remove and return the oldest letters."""
+        with self._lock:
+            letters = self._take_segment(limit)
+            while len(letters) < limit and self._ring:
+                letters.append(self._ring.popleft())
+            return letters
+
+    def clear(self) -> None:
+        """Discard every letter, including the on-disk segment."""
+        with self._lock:
+            self._ring.clear()
+            self._unwritten.clear()
+            if self._spilled:
+                self._remove_segment()
+            self._spilled = 0
+            self._spill_bytes = 0
+
+    def _spill(self, letters: List[DeadLetter]) -> int:
+        if not self.spill_path:
+            self.dropped += len(letters)
+            return 0
+        lines = []
+        size = self._spill_bytes
+        for letter in letters:
+            line = (json.dumps(letter.to_dict()) + "\n").encode()
+            if size + len(line) > self.max_spill_bytes:
+                self.dropped += 1
+                continue
+            lines.append(line)
+            size += len(line)
+        self._unwritten.extend(lines)
+        self._spilled += len(lines)
+        self._spill_bytes = size
+        if len(self._unwritten) >= self.SPILL_BATCH:
+            self._write_spill()
+        return len(lines)
+
+    def _write_spill(self) -> bool:
+        """Append the unwritten letters to the segment, dropping them if that fails."""
+        if not self._unwritten:
+            return True
+        lines, self._unwritten = self._unwritten, []
+        try:
+            if self._segment is None:
+                self._segment = open(self.spill_path, "ab")
+            self._segment.writelines(lines)
+            self._segment.flush()
+        except OSError as e:
+            logging.error(f"Failed to spill dead letters to {self.spill_path}: {str(e)}")
+            self._close_segment()
+            self.dropped += len(lines)
+            self._spilled -= len(lines)
+            self._spill_bytes -= sum(len(line) for line in lines)
+            return False
+        return True
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            try:
+                self._segment.close()
+            except OSError as e:
+                logging.error(f"Failed to close dead letter segment {self.spill_path}: {str(e)}")
+            self._segment = None
+
+    def _read_segment(self, limit: int) -> List[DeadLetter]:
+        return [DeadLetter.from_dict(json.loads(line)) for line in self._read_lines(limit)]
+
+    def _read_lines(self, limit: int) -> List[bytes]:
+        lines = []
+        if not self._spilled or limit <= 0:
+            return lines
+        self._write_spill()
+        with open(self.spill_path, "rb") as segment:
+            segment.seek(self._offset)
+            for line in segment:
+                lines.append(line)
+                if len(lines) >= limit:
+                    break
+        return lines
+
+    def _take_segment(self, limit: int) -> List[DeadLetter]:
+        lines = self._read_lines(limit)
+        if not lines:
+            return []
+        taken_bytes = sum(len(line) for line in lines)
+        self._offset += taken_bytes
+        self._spilled -= len(lines)
+        self._spill_bytes -= taken_bytes
+        if not self._spilled:
+            self._remove_segment()
+        elif self._offset >= max(self._spill_bytes, self.COMPACT_BYTES):
+            self._compact()
+        else:
+            self._write_offset()
+        return [DeadLetter.from_dict(json.loads(line)) for line in lines]
+
+    @property
+    def _offset_path(self) -> str:
+        return f"{self.spill_path}.offset"
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self._offset_path) as offset_file:
+                offset = int(offset_file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+        return offset if 0 <= offset <= os.path.getsize(self.spill_path) else 0
+
+    def _write_offset(self) -> None:
+        temporary_path = f"{self._offset_path}.tmp"
+        with open(temporary_path, "w") as offset_file:
+            offset_file.write(str(self._offset))
+        os.replace(temporary_path, self._offset_path)
+
+    def _compact(self) -> None:
+        """Rewrite the segment without its taken letters."""
+        temporary_path = f"{self.spill_path}.tmp"
+        self._close_segment()
+        with open(self.spill_path, "rb") as source, open(temporary_path, "wb") as target:
+            source.seek(self._offset)
+            shutil.copyfileobj(source, target)
+        # Without the offset a crash re-delivers the taken letters rather than skipping others
+        self._remove_offset()
+        os.replace(temporary_path, self.spill_path)
+        self._offset = 0
+
+    def _remove_segment(self) -> None:
+        self._close_segment()
+        self._remove_offset()
+        if os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+        self._offset = 0
+
+    def _remove_offset(self) -> None:
+        if os.path.exists(self._offset_path):
+            os.remove(self._offset_path)
+
+def dead_letter_for(message: Message, reason: str, error: BaseException, handler: Optional[str] = None,
+                    attempts: int = 1) -> DeadLetter:
+    """Create the dead letter of a message that failed processing."""
+    return DeadLetter(message.topic, message.raw, reason, str(error), handler, message.qos,
+                      message.received_at, time.time(), attempts)
@@ -0,0 +1,128 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from .message import Message
+
+class Dispatcher:
+    """
+    Worker threads running message dispatch off the network thread.
+
+    Every worker has its own queue and the queue of a message is picked by its topic,
+    so messages on one topic are always handled by the same worker, one at a time and
+    in arrival order, while different topics run in parallel. ``submit`` runs on the
+    network thread and never blocks it, so keepalives and acknowledgements carry on
+    while handlers stall: a message whose queue is full is refused and counted.
+    """
+
+    def __init__(self, dispatch: Callable[[Message], None], workers: int, queue_size: int = 10000):
+        """
+        :param dispatch: Function handling one message.
+        :param workers: Number of worker threads.
+        :param queue_size: Maximum number of queued messages, split evenly between the workers, 0 for unbounded.
+        """
+        if workers < 1:
+            raise ValueError("A dispatcher needs at least one worker")
+        self._dispatch = dispatch
+        self.overflowed = 0
+        worker_queue_size = -(-queue_size // workers) if queue_size > 0 else 0
+        self._queues: List["queue.Queue[Optional[Message]]"] = [
+            queue.Queue(maxsize=worker_queue_size) for _ in range(workers)
+        ]
+        self._threads: List[threading.Thread] = []
+        for index, worker_queue in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(worker_queue,), name=f"mqtt-dispatch-{index}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def __len__(self) -> int:
+        """Number of queued messages not yet taken by a worker."""
+        return sum(worker_queue.qsize() for worker_queue in self._queues)
+
+    @property
+    def workers(self) -> int:
+        return len(self._threads)
+
+    def oldest_age(self) -> float:
+        """Seconds since the oldest queued message was received, 0 when the queues are empty."""
+        oldest = None
+        for worker_queue in self._queues:
+            with worker_queue.mutex:
+                head = worker_queue.queue[0] if worker_queue.queue else None
+            if head is not None and (oldest is None or head.received_at < oldest):
+                oldest = head.received_at
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def submit(self, message: Message) -> bool:
+        """
+        Queue a message for dispatch on the worker of its topic.
+
+        :return: False if the message was refused because the queue is full.
+        """
+        try:
+            self._queue_for(message.topic).put_nowait(message)
+        except queue.Full:
+            self.overflowed += 1
+            return False
+        return True
+
+    def _queue_for(self, topic: str) -> "queue.Queue[Optional[Message]]":
+        return self._queues[hash(topic) % len(self._queues)]
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued message was dispatched.
+
+        :param timeout: Maximum number of seconds to wait, unlimited if None.
+        :return: Whether the queue was drained before the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker_queue in self._queues:
+            with worker_queue.all_tasks_done:
+                while worker_queue.unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    worker_queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 1.0) -> int:
+        """
+        Discard the queued messages and stop the workers.
+
+        Messages already taken by a worker are left to finish within the timeout.
+
+        :return: The number of discarded messages.
+        """
+        discarded = 0
+        for worker_queue in self._queues:
+            while True:
+                try:
+                    message = worker_queue.get_nowait()
+                except queue.Empty:
+                    break
+                worker_queue.task_done()
+                if message is not None:
+                    discarded += 1
+        for worker_queue in self._queues:
+            worker_queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(max(0.0, deadline - time.monotonic()))
+        return discarded
+
+    def _run(self, worker_queue: "queue.Queue[Optional[Message]]") -> None:
+        while True:
+            message = worker_queue.get()
+            try:
+                if message is None:
+                    return
+                self._dispatch(message)
+            except Exception as e:
+                logging.error(f"Error dispatching MQTT message on topic {message.topic}: {str(e)}")
+            finally:
+                worker_queue.task_done()
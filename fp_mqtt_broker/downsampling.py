@@ -0,0 +1,151 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .message import Message
+from .topics import topic_matches
+
+# Running (sum, count) of every numeric field, keyed by its path in the payload
+_FieldSums = Dict[Tuple[str, ...], Tuple[float, int]]
+
+@dataclass
+class DeliveryPolicy:
+    """
+    How often a handler receives the messages of the topics matching a filter.
+
+    Exactly one of ``max_rate`` and ``keep_every`` is set. In ``last`` mode the
+    message that closes a window is delivered as is and the others are dropped
+    undecoded. In ``mean`` mode every message is decoded and the delivered payload is
+    the latest one with its numeric fields averaged over the window.
+    """
+
+    topic_filter: str
+    max_rate: Optional[float] = None
+    keep_every: Optional[int] = None
+    mode: str = "last"
+
+    MODES = ("last", "mean")
+
+    def __post_init__(self):
+        if (self.max_rate is None) == (self.keep_every is None):
+            raise ValueError(f"Delivery policy for {self.topic_filter} needs exactly one of max_rate and keep_every")
+        if self.max_rate is not None and self.max_rate <= 0:
+            raise ValueError(f"Delivery policy for {self.topic_filter} needs a positive max_rate")
+        if self.keep_every is not None and self.keep_every < 1:
+            raise ValueError(f"Delivery policy for {self.topic_filter} needs keep_every of at least 1")
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unsupported delivery mode for {self.topic_filter}: {self.mode}")
+
+    @classmethod
+    def from_dict(cls, topic_filter: str, config: Dict[str, Any]) -> 'DeliveryPolicy':
+        """
+        Creates a DeliveryPolicy from a dictionary.
+        """
+        return cls(
+            topic_filter=topic_filter,
+            max_rate=config.get("max_rate"),
+            keep_every=config.get("keep_every"),
+            mode=config.get("mode", "last")
+        )
+
+class _Window:
+    __slots__ = ("count", "last_delivery", "sums")
+
+    def __init__(self):
+        self.count = 0
+        self.last_delivery: Optional[float] = None
+        self.sums: _FieldSums = {}
+
+def _accumulate(value: Any, sums: _FieldSums, path: Tuple[str, ...] = ()) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _accumulate(item, sums, path + (key,))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        total, count = sums.get(path, (0.0, 0))
+        sums[path] = (total + value, count + 1)
+
+def _averaged(value: Any, sums: _FieldSums, path: Tuple[str, ...] = ()) -> Any:
+    if isinstance(value, dict):
+        return {key: _averaged(item, sums, path + (key,)) for key, item in value.items()}
+    if path in sums and isinstance(value, (int, float)) and not isinstance(value, bool):
+        total, count = sums[path]
+        return total / count
+    return value
+
+class Downsampler:
+    """
+    Applies the delivery policies of one handler, keeping a window per topic.
+
+    Rates are measured on the receive time of the messages, so queueing ahead of the
+    handler does not change which messages are delivered. With ``max_rate`` the first
+    message of a topic is always delivered; with ``keep_every=N`` the N-th message of
+    each window is, so the first N - 1 messages of a topic are dropped.
+    """
+
+    MAX_TOPICS = 10000
+
+    def __init__(self, policies: List[DeliveryPolicy]):
+        """
+        :param policies: The policies, the first one matching a topic applies.
+        """
+        self.policies = list(policies)
+        self.dropped = 0
+        self._routes: Dict[str, Optional[DeliveryPolicy]] = {}
+        self._windows: Dict[str, _Window] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, policies: Dict[str, Dict[str, Any]]) -> 'Downsampler':
+        """Create a Downsampler from policy definitions keyed by topic filter."""
+        return cls([DeliveryPolicy.from_dict(topic_filter, config) for topic_filter, config in policies.items()])
+
+    def policy_for(self, topic: str) -> Optional[DeliveryPolicy]:
+        """Get the policy applying to a topic, None if its messages are all delivered."""
+        try:
+            return self._routes[topic]
+        except KeyError:
+            pass
+        policy = next((policy for policy in self.policies if topic_matches(policy.topic_filter, topic)), None)
+        if len(self._routes) >= self.MAX_TOPICS:
+            self._routes.clear()
+        self._routes[topic] = policy
+        return policy
+
+    def offer(self, message: Message) -> Optional[Message]:
+        """
+        Pass a message through the policy of its topic.
+
+        :return: The message to deliver, None if it is dropped.
+        """
+        policy = self.policy_for(message.topic)
+        if policy is None:
+            return message
+        # Decode outside the lock, an invalid payload raises before touching the window
+        averaging = policy.mode == "mean"
+        payload = message.payload if averaging else None
+        with self._lock:
+            window = self._windows.get(message.topic)
+            if window is None:
+                if len(self._windows) >= self.MAX_TOPICS:
+                    self._windows.clear()
+                window = self._windows[message.topic] = _Window()
+            window.count += 1
+            if averaging:
+                _accumulate(payload, window.sums)
+
+            if policy.keep_every is not None:
+                due = window.count >= policy.keep_every
+            else:
+                due = window.last_delivery is None or message.received_at - window.last_delivery >= 1.0 / policy.max_rate
+            if not due:
+                self.dropped += 1
+                return None
+
+            sums, window.sums = window.sums, {}
+            window.count = 0
+            window.last_delivery = message.received_at
+        if not averaging:
+            return message
+        averaged = Message.from_payload(message.topic, _averaged(payload, sums), message.qos, message.retain)
+        averaged.received_at = message.received_at
+        return averaged
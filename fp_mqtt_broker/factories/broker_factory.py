@@ -2,7 +2,8 @@ from typing import Dict, Any, Optional, List
 from ..broker import MQTTBroker
 from ..config import BrokerConfig
 from ..abstractions.message_handler import MessageHandler
-from ..implementations import PahoMQTTClient
+from ..abstractions.mqtt_client import MQTTClient
+from ..implementations import FederatedMQTTClient, InMemoryMQTTClient, InMemoryMQTTHub, PahoMQTTClient
 
 class BrokerFactory:
     """Factory class for creating MQTT brokers."""
@@ -19,7 +20,7 @@ class BrokerFactory:
         :return: An instance of MQTTBroker
         """
         broker_config = BrokerConfig.from_dict(config)
-        mqtt_client = PahoMQTTClient(broker_config.client_id)
+        mqtt_client = BrokerFactory._create_mqtt_client(broker_config)
         return MQTTBroker(config=broker_config, mqtt_client=mqtt_client, message_handlers=message_handlers)
 
     @staticmethod
@@ -34,5 +35,59 @@ class BrokerFactory:
         :param message_handlers: Optional list of message handlers
         :return: An instance of MQTTBroker
         """
-        mqtt_client = PahoMQTTClient(broker_config.client_id)
-        return MQTTBroker(config=broker_config, mqtt_client=mqtt_client, message_handlers=message_handlers)
\ No newline at end of file
+        mqtt_client = BrokerFactory._create_mqtt_client(broker_config)
+        return MQTTBroker(config=broker_config, mqtt_client=mqtt_client, message_handlers=message_handlers)
+
+    @staticmethod
+    def create_in_memory_broker(
+        config: Dict[str, Any],
+        message_handlers: Optional[List[MessageHandler]] = None,
+        hub: Optional[InMemoryMQTTHub] = None
+    ) -> MQTTBroker:
+        """
+        Create an MQTT broker connected to an in-process hub instead of a network broker.
+
+        :param config: Configuration dictionary for the broker
+        :param message_handlers: Optional list of message handlers
+        :param hub: The hub shared by the brokers that talk to each other, a process-wide hub by default
+        :return: An instance of MQTTBroker
+        """
+        broker_config = BrokerConfig.from_dict(config)
+        mqtt_client = InMemoryMQTTClient(broker_config.client_id, hub)
+        return MQTTBroker(config=broker_config, mqtt_client=mqtt_client, message_handlers=message_handlers)
+
+    @staticmethod
+    def _create_mqtt_client(broker_config: BrokerConfig) -> MQTTClient:
+        """
+        Create the paho client adapter described by a BrokerConfig.
+
+        With several upstreams configured, one paho client per upstream is federated.
+
+        :param broker_config: An instance of BrokerConfig
+        :return: A PahoMQTTClient configured with the broker's protocol options, or a FederatedMQTTClient
+        """
+        if not broker_config.upstreams:
+            return BrokerFactory._create_paho_client(broker_config, broker_config.client_id)
+        upstreams = broker_config.upstream_addresses
+        clients = [
+            BrokerFactory._create_paho_client(broker_config, f"{broker_config.client_id}-{index}")
+            for index in range(len(upstreams))
+        ]
+        return FederatedMQTTClient(clients, upstreams)
+
+    @staticmethod
+    def _create_paho_client(broker_config: BrokerConfig, client_id: str) -> PahoMQTTClient:
+        return PahoMQTTClient(
+            client_id,
+            protocol_version=broker_config.protocol_version,
+            session_expiry_interval=broker_config.session_expiry_interval,
+            max_inflight_messages=broker_config.max_inflight_messages,
+            clean_session=broker_config.clean_session,
+            transport=broker_config.transport,
+            unix_socket_path=broker_config.unix_socket_path,
+            tcp_nodelay=broker_config.tcp_nodelay,
+            socket_send_buffer=broker_config.socket_send_buffer,
+            socket_receive_buffer=broker_config.socket_receive_buffer,
+            websocket_path=broker_config.websocket_path,
+            websocket_headers=broker_config.websocket_headers
+        )
\ No newline at end of file
@@ -0,0 +1,11 @@
+from .columnar_sink import ColumnarSink
+from .request_responder import RequestResponder
+from .shared_value_publisher import SharedValuePublisher
+from .windowed_aggregator import WindowedAggregator
+
+__all__ = [
+    "ColumnarSink",
+    "RequestResponder",
+    "SharedValuePublisher",
+    "WindowedAggregator"
+]
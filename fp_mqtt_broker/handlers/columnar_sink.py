@@ -0,0 +1,252 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..abstractions.message_handler import EnvelopeMessageHandler
+from ..buffers import np
+from ..message import Message
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - depends on the environment
+    pyarrow = None
+
+FORMATS = ("parquet", "npz", "csv")
+_EXTENSIONS = {"parquet": ".parquet", "npz": ".npz", "csv": ".csv.gz"}
+
+def default_format() -> str:
+    """The best columnar format available: Parquet with pyarrow, NumPy .npz, or gzipped CSV."""
+    if pyarrow is not None:
+        return "parquet"
+    return "npz" if np is not None else "csv"
+
+def flatten_payload(payload: Any, prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested objects into dotted column names, lists are kept as JSON strings."""
+    if not isinstance(payload, dict):
+        return {prefix or "value": payload if not isinstance(payload, list) else json.dumps(payload)}
+    columns = {}
+    for key, value in payload.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            columns.update(flatten_payload(value, name))
+        elif isinstance(value, list):
+            columns[name] = json.dumps(value)
+        else:
+            columns[name] = value
+    return columns
+
+def _column_type(values: List[Any]) -> str:
+    """Get the common type of a column: bool, int, float, str, or null when all values are missing."""
+    types = {type(value) for value in values if value is not None}
+    if not types:
+        return "null"
+    if types == {bool}:
+        return "bool"
+    if types == {int}:
+        return "int"
+    if types <= {int, float}:
+        return "float"
+    return "str"
+
+def _typed_column(values: List[Any]) -> Tuple[str, List[Any]]:
+    """Convert a column to one type, mixed columns become strings."""
+    column_type = _column_type(values)
+    if column_type == "float":
+        return column_type, [None if value is None else float(value) for value in values]
+    if column_type == "str":
+        return column_type, [None if value is None else str(value) for value in values]
+    return column_type, values
+
+class _Batch:
+    __slots__ = ("topic", "columns", "rows", "started")
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.columns: Dict[str, List[Any]] = {}
+        self.rows = 0
+        self.started = time.monotonic()
+
+    def append(self, row: Dict[str, Any]) -> None:
+        for name, values in self.columns.items():
+            values.append(row.pop(name, None))
+        for name, value in row.items():
+            self.columns[name] = [None] * self.rows + [value]
+        self.rows += 1
+
+class ColumnarSink(EnvelopeMessageHandler):
+    """
+    Message handler archiving payloads as compressed columnar files.
+
+    Payloads are flattened into columns and buffered per topic; a batch is written to
+    one file when it reaches ``max_rows`` or is ``max_age`` seconds old, on a
+    background thread so dispatch only pays for appending a row. The thread starts
+    with the first message and stops on ``close``, which the broker calls on shutdown. Files are written
+    to ``directory/<topic>/<timestamp>-<sequence><extension>`` with a ``received_at``
+    column, as Parquet when pyarrow is installed, NumPy .npz otherwise and gzipped
+    CSV without NumPy.
+    """
+
+    # Rows are added to the batches one message at a time
+    concurrent = False
+
+    def __init__(self,
+                 topics: List[str],
+                 directory: str,
+                 max_rows: int = 10000,
+                 max_age: float = 60.0,
+                 fields: Optional[List[str]] = None,
+                 file_format: Optional[str] = None,
+                 compression: str = "zstd"):
+        """
+        :param topics: Topic filters to archive.
+        :param directory: Directory the files are written to.
+        :param max_rows: Number of rows after which a batch is written.
+        :param max_age: Seconds after which a batch is written even if not full.
+        :param fields: Dotted payload fields to keep, every field if None.
+        :param file_format: parquet, npz or csv, the best available by default.
+        :param compression: Parquet compression codec.
+        """
+        file_format = file_format or default_format()
+        if file_format not in FORMATS:
+            raise ValueError(f"Unsupported columnar format: {file_format}")
+        if file_format == "parquet" and pyarrow is None:
+            raise ImportError("pyarrow is required to write Parquet files: pip install pyarrow")
+        if file_format == "npz" and np is None:
+            raise ImportError("NumPy is required for this feature: pip install fp-mqtt-broker[numpy]")
+        if max_rows < 1 or max_age <= 0:
+            raise ValueError("max_rows and max_age must be positive")
+        self.topics = topics
+        self.directory = directory
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.fields = list(fields) if fields is not None else None
+        self.file_format = file_format
+        self.compression = compression
+        self.files_written = 0
+        self.rows_written = 0
+        self.failed_batches = 0
+
+        self._batches: Dict[str, _Batch] = {}
+        self._ready: List[_Batch] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._sequence = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get_subscribed_topics(self) -> List[str]:
+        return self.topics
+
+    def handle(self, message: Message) -> None:
+        columns = flatten_payload(message.payload)
+        if self.fields is not None:
+            columns = {name: columns.get(name) for name in self.fields}
+        columns["received_at"] = message.received_at
+        with self._lock:
+            batch = self._batches.get(message.topic)
+            if batch is None:
+                batch = self._batches[message.topic] = _Batch(message.topic)
+            batch.append(columns)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name="mqtt-columnar-sink",
+                                                daemon=True)
+                self._thread.start()
+            if batch.rows >= self.max_rows:
+                self._ready.append(self._batches.pop(message.topic))
+                self._wake.set()
+
+    def pending_rows(self) -> int:
+        """Rows buffered and not written yet."""
+        with self._lock:
+            return sum(batch.rows for batch in self._batches.values()) + sum(batch.rows for batch in self._ready)
+
+    def flush(self) -> None:
+        """Write every buffered batch now."""
+        with self._lock:
+            batches = self._ready + list(self._batches.values())
+            self._ready = []
+            self._batches = {}
+        self._write_batches(batches)
+
+    def close(self) -> None:
+        """Stop the background writer and write the remaining batches."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            stop, self._stop = self._stop, threading.Event()
+        stop.set()
+        self._wake.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def _run(self, stop: threading.Event) -> None:
+        interval = min(1.0, self.max_age / 2)
+        while not stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                expired = [topic for topic, batch in self._batches.items() if now - batch.started >= self.max_age]
+                for topic in expired:
+                    self._ready.append(self._batches.pop(topic))
+                batches, self._ready = self._ready, []
+            self._write_batches(batches)
+
+    def _write_batches(self, batches: List[_Batch]) -> None:
+        with self._write_lock:
+            for batch in batches:
+                try:
+                    path = self._write(batch)
+                except Exception as e:
+                    self.failed_batches += 1
+                    logging.error(f"Failed to write {batch.rows} archived rows of {batch.topic}: {str(e)}")
+                    continue
+                self.files_written += 1
+                self.rows_written += batch.rows
+                logging.debug(f"Archived {batch.rows} rows of {batch.topic} to {path}")
+
+    def _path_for(self, batch: _Batch) -> str:
+        segments = [segment if segment not in ("", ".", "..") else "_" for segment in batch.topic.split("/")]
+        directory = os.path.join(self.directory, *segments)
+        os.makedirs(directory, exist_ok=True)
+        self._sequence += 1
+        name = f"{int(time.time() * 1000)}-{self._sequence:06d}{_EXTENSIONS[self.file_format]}"
+        return os.path.join(directory, name)
+
+    def _write(self, batch: _Batch) -> str:
+        path = self._path_for(batch)
+        columns = {name: _typed_column(values) for name, values in batch.columns.items()}
+        temporary_path = f"{path}.tmp"
+        if self.file_format == "parquet":
+            table = pyarrow.table({name: values for name, (_, values) in columns.items()})
+            pyarrow.parquet.write_table(table, temporary_path, compression=self.compression)
+        elif self.file_format == "npz":
+            with open(temporary_path, "wb") as output:
+                np.savez_compressed(output, **{name: self._array(column_type, values)
+                                               for name, (column_type, values) in columns.items()})
+        else:
+            with gzip.open(temporary_path, "wt", newline="") as output:
+                writer = csv.writer(output)
+                writer.writerow(columns)
+                writer.writerows(zip(*(["" if value is None else value for value in values]
+                                       for _, values in columns.values())))
+        os.replace(temporary_path, path)
+        return path
+
+    @staticmethod
+    def _array(column_type: str, values: List[Any]):
+        # Missing numbers are NaN, missing strings are empty; object arrays are never written
+        if column_type == "int" and None not in values:
+            return np.array(values, dtype=np.int64)
+        if column_type == "bool" and None not in values:
+            return np.array(values, dtype=bool)
+        if column_type in ("int", "float", "bool", "null"):
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        return np.array(["" if value is None else value for value in values], dtype=str)
@@ -0,0 +1,46 @@
+import logging
+from typing import Any, Callable, Dict, List
+
+from ..abstractions.message_handler import MessageHandler
+from ..rpc import build_response
+
+class RequestResponder(MessageHandler):
+    """
+    Message handler answering requests sent with ``MQTTBroker.request``.
+
+    The request payload is passed to ``respond`` and its return value is published
+    to the requester's reply topic with the request's correlation ID. Exceptions are
+    sent back as errors and raised from the requester's future as RequestError.
+    """
+
+    def __init__(self,
+                 topics: List[str],
+                 respond: Callable[[str, Any], Any],
+                 publish: Callable[..., bool],
+                 qos: int = 1):
+        """
+        :param topics: Topic filters the requests are sent to.
+        :param respond: Function computing the reply from the topic and the request payload.
+        :param publish: Publish function used for replies, e.g. ``broker.publish_message``.
+        :param qos: Quality of service level of the replies.
+        """
+        self.topics = topics
+        self.respond = respond
+        self.publish = publish
+        self.qos = qos
+
+    def get_subscribed_topics(self) -> List[str]:
+        return self.topics
+
+    def handle_message(self, topic: str, payload: Dict[str, Any]) -> None:
+        correlation_id = payload.get('correlation_id') if isinstance(payload, dict) else None
+        reply_to = payload.get('reply_to') if isinstance(payload, dict) else None
+        if not correlation_id or not reply_to:
+            logging.warning(f"Ignoring request without correlation ID or reply topic on {topic}")
+            return
+        try:
+            response = build_response(correlation_id, self.respond(topic, payload.get('payload')))
+        except Exception as e:
+            logging.error(f"Error responding to request {correlation_id} on {topic}: {str(e)}")
+            response = build_response(correlation_id, error=str(e))
+        self.publish(reply_to, response, self.qos)
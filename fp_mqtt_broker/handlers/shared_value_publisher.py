@@ -0,0 +1,40 @@
+from typing import Callable, List, Optional
+
+from ..abstractions.message_handler import EnvelopeMessageHandler
+from ..message import Message
+from ..shared_values import SharedValueWriter
+
+class SharedValuePublisher(EnvelopeMessageHandler):
+    """
+    Message handler writing the latest payload of each topic to shared memory.
+
+    Payloads are stored without being parsed, so the ingest leader only pays for the
+    copy; local consumers read and decode them with SharedValueReader.
+    """
+
+    # The shared value region has a single writer
+    concurrent = False
+
+    def __init__(self,
+                 topics: List[str],
+                 writer: SharedValueWriter,
+                 decompress: Optional[Callable[[bytes], bytes]] = None):
+        """
+        :param topics: Topic filters whose latest values are shared.
+        :param writer: Writer of the shared value region.
+        :param decompress: Optional function restoring compressed payloads, e.g. ``broker.compressor.decompress``.
+        """
+        self.topics = topics
+        self.writer = writer
+        self.decompress = decompress
+
+    def get_subscribed_topics(self) -> List[str]:
+        return self.topics
+
+    def handle(self, message: Message) -> None:
+        payload = self.decompress(message.raw) if self.decompress else message.raw
+        self.writer.write(message.topic, payload, message.received_at)
+
+    def close(self) -> None:
+        """Remove the shared value region."""
+        self.writer.close()
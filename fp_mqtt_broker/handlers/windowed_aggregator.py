@@ -0,0 +1,133 @@
+import warnings
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ..abstractions.message_handler import MessageHandler
+from ..buffers import NumericRingBuffer, extract_numeric, field_paths, np, require_numpy, sample_timestamp
+
+DEFAULT_STATISTICS = ("mean", "min", "max", "p50", "p95")
+
+def _compile_statistic(name: str) -> Callable:
+    """Get the vectorised function computing a statistic over each column of a window."""
+    if name == "mean":
+        return lambda window: np.nanmean(window, axis=0)
+    if name == "min":
+        return lambda window: np.nanmin(window, axis=0)
+    if name == "max":
+        return lambda window: np.nanmax(window, axis=0)
+    if name == "std":
+        return lambda window: np.nanstd(window, axis=0)
+    if name == "sum":
+        return lambda window: np.nansum(window, axis=0)
+    if name.startswith("p") and name[1:].replace(".", "", 1).isdigit():
+        percentile = float(name[1:])
+        if not 0 <= percentile <= 100:
+            raise ValueError(f"Invalid percentile statistic: {name}")
+        return lambda window: np.nanpercentile(window, percentile, axis=0)
+    raise ValueError(f"Unknown statistic: {name}")
+
+def _to_json_number(value) -> Optional[float]:
+    """Convert a NumPy scalar to a float, mapping NaN (no samples) to None."""
+    value = float(value)
+    return None if value != value else value
+
+class WindowedAggregator(MessageHandler):
+    """
+    Message handler computing windowed statistics over numeric payload fields.
+
+    Field values are appended per topic into array-backed ring buffers, and every
+    ``step`` samples the statistics of the last ``window_size`` samples are computed
+    for all fields at once with NumPy. ``step == window_size`` gives tumbling windows,
+    a smaller step gives sliding windows. Results are passed to downstream handlers,
+    a callback, and/or published to ``output_topic`` (formatted with the source topic).
+    """
+
+    # The ring buffers and window counters are not locked
+    concurrent = False
+
+    def __init__(self,
+                 topics: List[str],
+                 fields: List[str],
+                 window_size: int,
+                 step: Optional[int] = None,
+                 statistics: Sequence[str] = DEFAULT_STATISTICS,
+                 handlers: Optional[List[MessageHandler]] = None,
+                 on_window: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 publish: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+                 output_topic: str = "{topic}/stats",
+                 timestamp_field: Optional[str] = "timestamp"):
+        """
+        :param topics: Topic filters to aggregate.
+        :param fields: Numeric payload fields to aggregate; dotted paths reach nested fields.
+        :param window_size: Number of samples in each window.
+        :param step: Number of new samples between windows, defaults to window_size.
+        :param statistics: Statistics to compute: mean, min, max, std, sum or pNN percentiles.
+        :param handlers: Optional handlers receiving each window result.
+        :param on_window: Optional callback receiving the output topic and each window result.
+        :param publish: Optional publish function, e.g. ``broker.publish_message``.
+        :param output_topic: Topic template for window results.
+        :param timestamp_field: Payload field holding the sample time, the receive time is used otherwise.
+        """
+        require_numpy()
+        step = window_size if step is None else step
+        if window_size <= 0 or step <= 0:
+            raise ValueError("Window size and step must be positive")
+        self.topics = topics
+        self.fields = list(fields)
+        self.window_size = window_size
+        self.step = step
+        self.statistics = [(name, _compile_statistic(name)) for name in statistics]
+        self.handlers = handlers or []
+        self.on_window = on_window
+        self.publish = publish
+        self.output_topic = output_topic
+        self.timestamp_field = timestamp_field
+        self._paths = field_paths(self.fields)
+        self._buffers: Dict[str, NumericRingBuffer] = {}
+        self._pending: Dict[str, int] = {}
+
+    def get_subscribed_topics(self) -> List[str]:
+        return self.topics
+
+    def handle_message(self, topic: str, payload: Dict[str, Any]) -> None:
+        buffer = self._buffers.get(topic)
+        if buffer is None:
+            buffer = NumericRingBuffer(self.window_size, self.fields)
+            self._buffers[topic] = buffer
+            self._pending[topic] = 0
+
+        timestamp = sample_timestamp(payload, self.timestamp_field)
+        buffer.append(timestamp, [extract_numeric(payload, path) for path in self._paths])
+
+        self._pending[topic] += 1
+        if len(buffer) == self.window_size and self._pending[topic] >= self.step:
+            self._pending[topic] = 0
+            self._emit(topic, self.compute_window(topic))
+
+    def compute_window(self, topic: str) -> Dict[str, Any]:
+        """Compute the statistics of the current window of a topic."""
+        buffer = self._buffers[topic]
+        window = buffer.values()
+        timestamps = buffer.timestamps()
+        with warnings.catch_warnings():
+            # Fields missing from every sample of the window yield NaN, reported as None.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            results = {name: statistic(window) for name, statistic in self.statistics}
+        fields = {}
+        for index, field in enumerate(self.fields):
+            fields[field] = {name: _to_json_number(values[index]) for name, values in results.items()}
+        return {
+            'topic': topic,
+            'window_start': float(timestamps[0]),
+            'window_end': float(timestamps[-1]),
+            'count': len(buffer),
+            'fields': fields,
+        }
+
+    def _emit(self, topic: str, result: Dict[str, Any]) -> None:
+        output_topic = self.output_topic.format(topic=topic)
+        for handler in self.handlers:
+            handler.handle_message(output_topic, result)
+        if self.on_window:
+            self.on_window(output_topic, result)
+        if self.publish:
+            self.publish(output_topic, result)
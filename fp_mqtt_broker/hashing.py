@@ -0,0 +1,53 @@
+import bisect
+import hashlib
+from typing import Generic, Hashable, List, Sequence, Tuple, TypeVar
+
+Node = TypeVar("Node", bound=Hashable)
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class ConsistentHashRing(Generic[Node]):
+    """
+    Consistent hash ring mapping keys to nodes.
+
+    Every node is placed on the ring many times (virtual nodes) so keys spread
+    evenly, and adding or removing a node only moves the keys of that node.
+    """
+
+    def __init__(self, nodes: Sequence[Node], replicas: int = 100):
+        """
+        :param nodes: The nodes, identified by their string representation.
+        :param replicas: Number of virtual nodes per node.
+        """
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        if len(set(nodes)) != len(nodes):
+            raise ValueError("Hash ring nodes must be unique")
+        self.nodes = list(nodes)
+        points: List[Tuple[int, int]] = sorted(
+            (_hash(f"{node}#{replica}"), index)
+            for index, node in enumerate(self.nodes)
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [index for _, index in points]
+
+    def get(self, key: str) -> Node:
+        """Get the node owning a key."""
+        return self.nodes[self._owners[self._position(key)]]
+
+    def preference_list(self, key: str) -> List[Node]:
+        """Get every node in the order a key fails over to them, the owner first."""
+        position = self._position(key)
+        order: List[int] = []
+        for offset in range(len(self._owners)):
+            index = self._owners[(position + offset) % len(self._owners)]
+            if index not in order:
+                order.append(index)
+                if len(order) == len(self.nodes):
+                    break
+        return [self.nodes[index] for index in order]
+
+    def _position(self, key: str) -> int:
+        return bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
@@ -0,0 +1,243 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .broker import MQTTBroker
+
+@dataclass
+class HealthStatus:
+    """Point-in-time health of a broker connection."""
+
+    live: bool
+    ready: bool
+    connected: bool
+    loop_lag: Optional[float]
+    queued_messages: int
+    queue_age: float
+    topic_ages: Dict[str, float] = field(default_factory=dict)
+    stale_topics: List[str] = field(default_factory=list)
+    # Degradation reasons: disconnected, loop_lag, queue_age or stale_topics
+    reasons: List[str] = field(default_factory=list)
+    # Adaptive concurrency limits per handler, empty unless enabled
+    concurrency: Dict[str, Dict] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+class HealthMonitor:
+    """
+    Watches the network loop and dispatch queue of an MQTTBroker.
+
+    Loop lag is measured by a probe message the client publishes to itself and that
+    is answered on the network thread, so a loop blocked by slow callbacks or a
+    saturated connection shows up long before keepalive timeouts disconnect it.
+    While a probe is unanswered its age counts as the lag. Degradation changes are
+    logged and, when an alert topic is set, published to it. Message gaps are tracked
+    for the ``MAX_TOPICS`` most recently active topics.
+    """
+
+    MAX_TOPICS = 10000
+
+    def __init__(self,
+                 broker: 'MQTTBroker',
+                 probe_topic: str,
+                 interval: float = 1.0,
+                 max_loop_lag: float = 2.0,
+                 max_queue_age: float = 5.0,
+                 liveness_timeout: float = 30.0,
+                 stale_after: Optional[float] = None,
+                 alert_topic: Optional[str] = None,
+                 http_port: Optional[int] = None,
+                 http_host: str = "127.0.0.1"):
+        """
+        :param broker: The monitored broker.
+        :param probe_topic: Topic of the loop lag probes, subscribed by the broker itself.
+        :param interval: Seconds between checks.
+        :param max_loop_lag: Loop lag in seconds above which the broker is not ready.
+        :param max_queue_age: Age in seconds of the oldest queued message above which the broker is not ready.
+        :param liveness_timeout: Loop lag in seconds above which the broker is no longer live.
+        :param stale_after: Seconds without messages after which a topic is reported stale, never if None.
+        :param alert_topic: Topic degradation alerts are published to.
+        :param http_port: Port of an HTTP endpoint serving /healthz, /readyz and /health, none if None.
+        :param http_host: Interface the HTTP endpoint binds to, "0.0.0.0" to expose it on every interface.
+        """
+        self.broker = broker
+        self.probe_topic = probe_topic
+        self.interval = interval
+        self.max_loop_lag = max_loop_lag
+        self.max_queue_age = max_queue_age
+        self.liveness_timeout = liveness_timeout
+        self.stale_after = stale_after
+        self.alert_topic = alert_topic
+        self.http_port = http_port
+        self.http_host = http_host
+
+        self._last_seen: Dict[str, float] = {}
+        self._probe_ids = itertools.count(1)
+        self._probe: Optional[Tuple[int, float]] = None
+        self._loop_lag: Optional[float] = None
+        self._alerted_reasons: List[str] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._http_server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        """Start the periodic checks and the HTTP endpoint, if configured."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mqtt-health-monitor", daemon=True)
+        self._thread.start()
+        if self.http_port is not None and self._http_server is None:
+            self._http_server = ThreadingHTTPServer((self.http_host, self.http_port), self._request_handler())
+            threading.Thread(target=self._http_server.serve_forever, name="mqtt-health-http", daemon=True).start()
+            logging.info(f"Health endpoint listening on {self.http_host}:{self._http_server.server_port}")
+
+    def stop(self) -> None:
+        """Stop the checks and the HTTP endpoint."""
+        thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        server, self._http_server = self._http_server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        self.reset_probe()
+
+    def reset_probe(self) -> None:
+        """Forget the unanswered probe, which is lost when the connection drops."""
+        self._probe = None
+
+    def record_message(self, topic: str) -> None:
+        """Note that a message arrived on a topic, called on the network thread."""
+        last_seen = self._last_seen
+        # Re-inserting keeps the topics ordered from least to most recently seen
+        if last_seen.pop(topic, None) is None and len(last_seen) >= self.MAX_TOPICS:
+            del last_seen[next(iter(last_seen))]
+        last_seen[topic] = time.monotonic()
+
+    def probe_received(self, payload: bytes) -> None:
+        """Complete a loop lag probe, called on the network thread."""
+        probe = self._probe
+        try:
+            probe_id = int(payload)
+        except (TypeError, ValueError):
+            return
+        if probe is not None and probe[0] == probe_id:
+            self._loop_lag = time.monotonic() - probe[1]
+            self._probe = None
+
+    def loop_lag(self) -> Optional[float]:
+        """Latest probe round trip in seconds, or the age of the unanswered probe if larger."""
+        probe = self._probe
+        if probe is not None:
+            pending = time.monotonic() - probe[1]
+            if self._loop_lag is None or pending > self._loop_lag:
+                return pending
+        return self._loop_lag
+
+    def status(self) -> HealthStatus:
+        """Evaluate the current health."""
+        now = time.monotonic()
+        connected = self.broker.client.is_connected()
+        loop_lag = self.loop_lag() if connected else None
+        queued, queue_age = self.broker.dispatch_backlog()
+        topic_ages = {topic: now - seen for topic, seen in dict(self._last_seen).items()}
+
+        stale_topics = []
+        if self.stale_after is not None:
+            stale_topics = sorted(topic for topic, age in topic_ages.items() if age > self.stale_after)
+
+        reasons = []
+        if not connected:
+            reasons.append("disconnected")
+        if loop_lag is not None and loop_lag > self.max_loop_lag:
+            reasons.append("loop_lag")
+        if queue_age > self.max_queue_age:
+            reasons.append("queue_age")
+        if stale_topics:
+            reasons.append("stale_topics")
+
+        live = loop_lag is None or loop_lag <= self.liveness_timeout
+        ready = live and connected and self.broker.accepting_messages and not reasons
+        return HealthStatus(live, ready, connected, loop_lag, queued, queue_age, topic_ages, stale_topics, reasons,
+                            self.broker.concurrency_limits())
+
+    def check(self) -> HealthStatus:
+        """Send the next probe, evaluate the health and report degradation changes."""
+        if not self.broker.client.is_connected():
+            self.reset_probe()
+        elif self._probe is None:
+            probe_id = next(self._probe_ids)
+            self._probe = (probe_id, time.monotonic())
+            if not self.broker.client.publish(self.probe_topic, str(probe_id).encode(), 0):
+                self._probe = None
+        status = self.status()
+        self._report(status)
+        return status
+
+    def _report(self, status: HealthStatus) -> None:
+        # Alerts cannot be delivered while disconnected, reconnection is logged by the broker
+        if not status.connected:
+            return
+        if status.reasons == self._alerted_reasons:
+            return
+        if status.reasons:
+            logging.warning(f"MQTT broker degraded: {', '.join(status.reasons)} "
+                            f"(loop lag {status.loop_lag}, queue age {status.queue_age:.2f}s)")
+        else:
+            logging.info("MQTT broker recovered")
+        if self.alert_topic:
+            alert = {
+                'client_id': self.broker.config.client_id,
+                'status': 'degraded' if status.reasons else 'healthy',
+                'reasons': status.reasons,
+                'loop_lag': status.loop_lag,
+                'queue_age': status.queue_age,
+                'stale_topics': status.stale_topics,
+                'timestamp': datetime.now().isoformat(),
+            }
+            if not self.broker.publish_message(self.alert_topic, alert, qos=1):
+                return
+        self._alerted_reasons = status.reasons
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Error checking MQTT broker health: {str(e)}")
+
+    def _request_handler(self):
+        monitor = self
+
+        class HealthRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status = monitor.status()
+                routes = {'/healthz': status.live, '/readyz': status.ready, '/health': status.ready}
+                if self.path not in routes:
+                    self.send_error(404)
+                    return
+                body = json.dumps(status.to_dict()).encode()
+                self.send_response(200 if routes[self.path] else 503)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return HealthRequestHandler
@@ -0,0 +1,109 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .buffers import NumericRingBuffer, extract_numeric, field_paths, require_numpy, sample_timestamp
+from .topics import topic_matches
+
+@dataclass
+class HistorySpec:
+    """Which fields of the topics matching a filter are kept, and how many samples."""
+
+    topic_filter: str
+    fields: List[str]
+    capacity: int = 1000
+    dtype: str = "float32"
+    timestamp_field: Optional[str] = "timestamp"
+
+    @classmethod
+    def from_dict(cls, topic_filter: str, config: Dict[str, Any]) -> 'HistorySpec':
+        """
+        Creates a HistorySpec from a dictionary.
+        """
+        return cls(
+            topic_filter=topic_filter,
+            fields=list(config.get("fields", [])),
+            capacity=config.get("capacity", 1000),
+            dtype=config.get("dtype", "float32"),
+            timestamp_field=config.get("timestamp_field", "timestamp")
+        )
+
+class HistoryStore:
+    """
+    Per-topic sample history in preallocated typed arrays.
+
+    Each topic matching a spec gets a NumericRingBuffer sized on first sample, so the
+    memory per topic is fixed. Readers get zero-copy NumPy views that keep changing as
+    new samples arrive; copy them when a stable snapshot is needed.
+    """
+
+    def __init__(self, max_topics: int = 10000):
+        """
+        :param max_topics: Maximum number of topics tracked, new topics are ignored beyond it.
+        """
+        require_numpy()
+        self.max_topics = max_topics
+        self._specs: List[Tuple[HistorySpec, List[List[str]]]] = []
+        self._buffers: Dict[str, Tuple[NumericRingBuffer, HistorySpec, List[List[str]]]] = {}
+        self._unmatched = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def add_spec(self, spec: HistorySpec) -> None:
+        """Start recording the topics matching a spec."""
+        if not spec.fields:
+            raise ValueError(f"History for {spec.topic_filter} needs at least one field")
+        with self._lock:
+            self._specs.append((spec, field_paths(spec.fields)))
+            self._unmatched = set()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by all history buffers."""
+        return sum(buffer.nbytes for buffer, _, _ in self._buffers.values())
+
+    def _buffer_for(self, topic: str):
+        entry = self._buffers.get(topic)
+        if entry is not None or topic in self._unmatched:
+            return entry
+        with self._lock:
+            for spec, paths in self._specs:
+                if topic_matches(spec.topic_filter, topic):
+                    if len(self._buffers) >= self.max_topics:
+                        return None
+                    entry = (NumericRingBuffer(spec.capacity, spec.fields, spec.dtype), spec, paths)
+                    self._buffers[topic] = entry
+                    return entry
+            if len(self._unmatched) >= self.max_topics:
+                self._unmatched = set()
+            self._unmatched.add(topic)
+        return None
+
+    def tracks(self, topic: str) -> bool:
+        """Whether messages on the topic are recorded."""
+        return self._buffer_for(topic) is not None
+
+    def record(self, topic: str, payload: Dict[str, Any]) -> bool:
+        """
+        Record a message if its topic has a history.
+
+        :return: True if the sample was stored.
+        """
+        entry = self._buffer_for(topic)
+        if entry is None:
+            return False
+        buffer, spec, paths = entry
+        buffer.append(sample_timestamp(payload, spec.timestamp_field),
+                      [extract_numeric(payload, path) for path in paths])
+        return True
+
+    def get(self, topic: str) -> Optional[NumericRingBuffer]:
+        """Get the history buffer of a topic, or None if it has no samples."""
+        entry = self._buffers.get(topic)
+        return entry[0] if entry else None
+
+    def topics(self) -> List[str]:
+        """Topics with recorded history."""
+        return list(self._buffers)
@@ -1,3 +1,5 @@
 from .paho_mqtt_client import PahoMQTTClient
+from .in_memory_mqtt_client import InMemoryMQTTClient, InMemoryMQTTHub
+from .federated_mqtt_client import FederatedMQTTClient
 
-__all__ = ["PahoMQTTClient"]
\ No newline at end of file
+__all__ = ["PahoMQTTClient", "InMemoryMQTTClient", "InMemoryMQTTHub", "FederatedMQTTClient"]
\ No newline at end of file
@@ -0,0 +1,225 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from ..abstractions import MQTTClient
+from ..hashing import ConsistentHashRing
+
+class FederatedMQTTClient(MQTTClient):
+    """
+    MQTTClient spreading publishes over several upstream brokers.
+
+    Every publish goes to one upstream chosen by consistent hashing of its topic, so
+    a topic keeps its ordering on one broker and publish throughput scales with the
+    number of upstreams. When that upstream is down the publish fails over to the
+    next one on the ring. Subscriptions are made on every upstream, so messages are
+    received whichever broker they were published to.
+
+    The federation counts as connected while at least one upstream is. The broker
+    callbacks only see the first upstream connecting, or every upstream refusing,
+    and the last one disconnecting; each upstream restores the subscriptions itself
+    when it reconnects.
+    """
+
+    def __init__(self, clients: Sequence[MQTTClient], upstreams: Sequence[Tuple[str, int]], replicas: int = 100):
+        """
+        :param clients: One client per upstream.
+        :param upstreams: The (host, port) of each upstream, in the order of the clients.
+        :param replicas: Virtual nodes per upstream on the hash ring.
+        """
+        if len(clients) != len(upstreams) or not clients:
+            raise ValueError("A federated client needs one client per upstream")
+        self.clients = list(clients)
+        self.upstreams = [(host, int(port)) for host, port in upstreams]
+        names = [f"{host}:{port}" for host, port in self.upstreams]
+        self._clients_by_name = dict(zip(names, self.clients))
+        self._ring = ConsistentHashRing(names, replicas)
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, int] = {}
+        self._connected = [False] * len(self.clients)
+        # Upstreams that refused or failed the current connection attempt
+        self._refused = [False] * len(self.clients)
+        self._on_connect: Optional[Callable] = None
+        self._on_disconnect: Optional[Callable] = None
+        # The upstream whose disconnect callback is running on this thread
+        self._callback_upstream = threading.local()
+        for index, client in enumerate(self.clients):
+            client.set_on_connect_callback(self._connect_handler(index))
+            client.set_on_disconnect_callback(self._disconnect_handler(index))
+
+    def connect(self, host: str, port: int, keepalive: int) -> None:
+        """Connect to every upstream, the host and port arguments are ignored."""
+        errors = []
+        with self._lock:
+            self._refused = [False] * len(self.clients)
+        for index, (client, (upstream_host, upstream_port)) in enumerate(zip(self.clients, self.upstreams)):
+            try:
+                client.connect(upstream_host, upstream_port, keepalive)
+            except Exception as e:
+                logging.warning(f"Failed to connect to upstream {upstream_host}:{upstream_port}: {str(e)}")
+                errors.append(e)
+                with self._lock:
+                    self._refused[index] = True
+        if len(errors) == len(self.clients):
+            raise ConnectionError(f"Failed to connect to any of {len(self.clients)} upstream brokers")
+
+    def disconnect(self) -> None:
+        for client in self.clients:
+            client.disconnect()
+
+    def reconnect(self) -> None:
+        """
+        Reconnect the disconnected upstreams.
+
+        Called from the disconnect callback, only the upstream whose callback fired is
+        reconnected, on its own loop thread, so the other loops are not raced.
+        """
+        index = getattr(self._callback_upstream, 'index', None)
+        indexes = [index] if index is not None else range(len(self.clients))
+        for index in indexes:
+            if not self._connected[index]:
+                try:
+                    self.clients[index].reconnect()
+                except Exception as e:
+                    host, port = self.upstreams[index]
+                    logging.warning(f"Failed to reconnect to upstream {host}:{port}: {str(e)}")
+
+    def subscribe(self, topic: str, qos: int = 0) -> None:
+        with self._lock:
+            if self._subscriptions.get(topic) == qos:
+                return
+            self._subscriptions[topic] = qos
+        for index, client in enumerate(self.clients):
+            if self._connected[index]:
+                client.subscribe(topic, qos)
+
+    def unsubscribe(self, topic: str) -> None:
+        with self._lock:
+            self._subscriptions.pop(topic, None)
+        for index, client in enumerate(self.clients):
+            if self._connected[index]:
+                client.unsubscribe(topic)
+
+    def route(self, topic: str) -> Optional[MQTTClient]:
+        """Get the client a topic is published through, None if every upstream is down."""
+        owner = self._clients_by_name[self._ring.get(topic)]
+        if owner.is_connected():
+            return owner
+        for name in self._ring.preference_list(topic)[1:]:
+            client = self._clients_by_name[name]
+            if client.is_connected():
+                return client
+        return None
+
+    def publish(self,
+                topic: str,
+                payload: Union[str, bytes],
+                qos: int = 0,
+                content_type: Optional[str] = None,
+                message_expiry_interval: Optional[int] = None) -> bool:
+        client = self.route(topic)
+        if client is None:
+            return False
+        return client.publish(topic, payload, qos, **self._properties(content_type, message_expiry_interval))
+
+    def publish_with_ack(self,
+                         topic: str,
+                         payload: Union[str, bytes],
+                         qos: int = 0,
+                         content_type: Optional[str] = None,
+                         message_expiry_interval: Optional[int] = None,
+                         timeout: Optional[float] = None) -> Future:
+        client = self.route(topic)
+        if client is None:
+            future = Future()
+            future.set_exception(ConnectionError("No upstream MQTT broker connected"))
+            return future
+        return client.publish_with_ack(topic, payload, qos, timeout=timeout,
+                                       **self._properties(content_type, message_expiry_interval))
+
+    def pending_ack_count(self) -> int:
+        return sum(client.pending_ack_count() for client in self.clients)
+
+    def fail_pending_acks(self, error: BaseException) -> int:
+        return sum(client.fail_pending_acks(error) for client in self.clients)
+
+    def unacknowledged_messages(self) -> List[Tuple[str, bytes, int]]:
+        return [message for client in self.clients for message in client.unacknowledged_messages()]
+
+    def loop_start(self) -> None:
+        for client in self.clients:
+            client.loop_start()
+
+    def loop_stop(self) -> None:
+        for client in self.clients:
+            client.loop_stop()
+
+    def is_connected(self) -> bool:
+        return any(client.is_connected() for client in self.clients)
+
+    def connected_upstreams(self) -> List[Tuple[str, int]]:
+        """The upstreams currently connected."""
+        return [upstream for upstream, client in zip(self.upstreams, self.clients) if client.is_connected()]
+
+    def set_on_connect_callback(self, callback: Callable) -> None:
+        self._on_connect = callback
+
+    def set_on_message_callback(self, callback: Callable) -> None:
+        for client in self.clients:
+            client.set_on_message_callback(callback)
+
+    def set_on_disconnect_callback(self, callback: Callable) -> None:
+        self._on_disconnect = callback
+
+    @staticmethod
+    def _properties(content_type: Optional[str], message_expiry_interval: Optional[int]) -> Dict[str, object]:
+        properties = {}
+        if content_type is not None:
+            properties['content_type'] = content_type
+        if message_expiry_interval is not None:
+            properties['message_expiry_interval'] = message_expiry_interval
+        return properties
+
+    def _connect_handler(self, index: int) -> Callable:
+        def handle_connect(client, userdata, flags, rc, *args):
+            host, port = self.upstreams[index]
+            if rc != 0:
+                logging.warning(f"Upstream {host}:{port} refused the connection with code {rc}")
+                with self._lock:
+                    self._refused[index] = True
+                    # A refusal only fails the federation once no upstream is left to accept
+                    refused = all(self._refused) and not any(self._connected)
+                    if refused:
+                        self._refused = [False] * len(self.clients)
+                if refused and self._on_connect:
+                    self._on_connect(self, userdata, flags, rc, *args)
+                return
+            with self._lock:
+                first = not any(self._connected)
+                self._connected[index] = True
+                self._refused[index] = False
+                subscriptions = list(self._subscriptions.items())
+            logging.info(f"Connected to upstream {host}:{port}")
+            for topic, qos in subscriptions:
+                self.clients[index].subscribe(topic, qos)
+            if first and self._on_connect:
+                self._on_connect(self, userdata, flags, rc, *args)
+        return handle_connect
+
+    def _disconnect_handler(self, index: int) -> Callable:
+        def handle_disconnect(client, userdata, rc, *args):
+            with self._lock:
+                was_connected = self._connected[index]
+                self._connected[index] = False
+                last = was_connected and not any(self._connected)
+            host, port = self.upstreams[index]
+            if rc != 0:
+                logging.warning(f"Lost upstream {host}:{port} with code {rc}, publishes fail over")
+            if last and self._on_disconnect:
+                self._callback_upstream.index = index
+                try:
+                    self._on_disconnect(self, userdata, rc, *args)
+                finally:
+                    self._callback_upstream.index = None
+        return handle_disconnect
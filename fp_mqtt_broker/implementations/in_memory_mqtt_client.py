@@ -0,0 +1,181 @@
+import itertools
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from ..abstractions import MQTTClient
+from ..topics import is_shared_subscription, strip_shared_prefix, topic_matches
+
+class InMemoryMessage:
+    """Message delivered by the in-memory hub, with the attributes of a paho message."""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "properties", "timestamp")
+
+    def __init__(self, topic: str, payload: bytes, qos: int, retain: bool, mid: int):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+        self.properties = None
+        self.timestamp = time.monotonic()
+
+class InMemoryMQTTHub:
+    """
+    In-process stand-in for an MQTT broker routing messages between InMemoryMQTTClients.
+
+    Supports wildcard subscriptions and ``$share/<group>/`` subscriptions, which are
+    load-balanced round-robin across the group members. Used for local benchmarks and
+    tests without a network broker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, Dict['InMemoryMQTTClient', int]] = {}
+        self._shared: Dict[Tuple[str, str], List['InMemoryMQTTClient']] = {}
+        self._round_robin: Dict[Tuple[str, str], int] = {}
+        self._mids = itertools.count(1)
+
+    def subscribe(self, client: 'InMemoryMQTTClient', subscription: str, qos: int) -> None:
+        with self._lock:
+            if is_shared_subscription(subscription):
+                group = subscription.split("/", 2)[1]
+                members = self._shared.setdefault((group, strip_shared_prefix(subscription)), [])
+                if client not in members:
+                    members.append(client)
+            else:
+                self._subscriptions.setdefault(subscription, {})[client] = qos
+
+    def unsubscribe(self, client: 'InMemoryMQTTClient', subscription: str) -> None:
+        with self._lock:
+            if is_shared_subscription(subscription):
+                group = subscription.split("/", 2)[1]
+                members = self._shared.get((group, strip_shared_prefix(subscription)), [])
+                if client in members:
+                    members.remove(client)
+            else:
+                self._subscriptions.get(subscription, {}).pop(client, None)
+
+    def disconnect(self, client: 'InMemoryMQTTClient') -> None:
+        """Drop every subscription of a client."""
+        with self._lock:
+            for subscribers in self._subscriptions.values():
+                subscribers.pop(client, None)
+            for members in self._shared.values():
+                if client in members:
+                    members.remove(client)
+
+    def publish(self, topic: str, payload: bytes, qos: int, retain: bool) -> int:
+        """
+        Route a message to every matching subscriber.
+
+        :return: The number of clients the message was delivered to.
+        """
+        recipients = {}
+        with self._lock:
+            for topic_filter, subscribers in self._subscriptions.items():
+                if subscribers and topic_matches(topic_filter, topic):
+                    for client, subscribed_qos in subscribers.items():
+                        recipients[client] = max(recipients.get(client, 0), min(qos, subscribed_qos))
+            for key, members in self._shared.items():
+                if members and topic_matches(key[1], topic):
+                    index = self._round_robin.get(key, 0) % len(members)
+                    self._round_robin[key] = index + 1
+                    recipients.setdefault(members[index], qos)
+            mid = next(self._mids)
+        for client, delivered_qos in recipients.items():
+            client._deliver(InMemoryMessage(topic, payload, delivered_qos, retain, mid))
+        return len(recipients)
+
+_default_hub = InMemoryMQTTHub()
+
+class InMemoryMQTTClient(MQTTClient):
+    """
+    MQTTClient connected to an in-process InMemoryMQTTHub instead of a network broker.
+
+    Callbacks run on a loop thread started by ``loop_start``, like paho's network loop.
+    """
+
+    def __init__(self, client_id: str, hub: Optional[InMemoryMQTTHub] = None):
+        self.client_id = client_id
+        self.hub = hub or _default_hub
+        self._connected = False
+        self._subscriptions: Dict[str, int] = {}
+        self._events: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._on_connect: Optional[Callable] = None
+        self._on_message: Optional[Callable] = None
+        self._on_disconnect: Optional[Callable] = None
+
+    def connect(self, host: str, port: int, keepalive: int) -> None:
+        self._connected = True
+        self._events.put(("connect", 0))
+
+    def disconnect(self) -> None:
+        self.hub.disconnect(self)
+        self._subscriptions.clear()
+        self._connected = False
+        self._events.put(("disconnect", 0))
+
+    def reconnect(self) -> None:
+        self.connect("", 0, 0)
+
+    def subscribe(self, topic: str, qos: int = 0) -> None:
+        self._subscriptions[topic] = qos
+        self.hub.subscribe(self, topic, qos)
+
+    def unsubscribe(self, topic: str) -> None:
+        self._subscriptions.pop(topic, None)
+        self.hub.unsubscribe(self, topic)
+
+    def publish(self,
+                topic: str,
+                payload: Union[str, bytes],
+                qos: int = 0,
+                content_type: Optional[str] = None,
+                message_expiry_interval: Optional[int] = None) -> bool:
+        if not self._connected:
+            return False
+        data = payload.encode() if isinstance(payload, str) else bytes(payload)
+        self.hub.publish(topic, data, qos, False)
+        return True
+
+    def loop_start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"in-memory-mqtt-{self.client_id}", daemon=True)
+            self._thread.start()
+
+    def loop_stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._events.put(("stop", None))
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def set_on_connect_callback(self, callback: Callable) -> None:
+        self._on_connect = callback
+
+    def set_on_message_callback(self, callback: Callable) -> None:
+        self._on_message = callback
+
+    def set_on_disconnect_callback(self, callback: Callable) -> None:
+        self._on_disconnect = callback
+
+    def _deliver(self, message: InMemoryMessage) -> None:
+        self._events.put(("message", message))
+
+    def _loop(self) -> None:
+        while True:
+            event, value = self._events.get()
+            if event == "stop":
+                return
+            if event == "message" and self._on_message:
+                self._on_message(self, None, value)
+            elif event == "connect" and self._on_connect:
+                self._on_connect(self, None, {"session present": 0}, value)
+            elif event == "disconnect" and self._on_disconnect:
+                self._on_disconnect(self, None, value)
@@ -1,15 +1,124 @@
+import socket
+import threading
+from concurrent.futures import Future
 from paho.mqtt import client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 from ..abstractions import MQTTClient
-from typing import Callable
+from ..topics import TopicAliasTable
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+TRANSPORTS = ("tcp", "websockets", "unix")
 
 class PahoMQTTClient(MQTTClient):
-    """Adapter for paho-mqtt client."""
+    """
+    Adapter for paho-mqtt client.
+
+    The connection runs over TCP, WebSockets or, for a broker on the same host, a
+    Unix domain socket, in which case the host and port given to ``connect`` are
+    ignored. Socket options are applied when paho opens the socket, so they hold
+    across reconnects.
+    """
     
-    def __init__(self, client_id: str):
-        self._client = mqtt.Client(client_id)
+    def __init__(self,
+                 client_id: str,
+                 protocol_version: int = mqtt.MQTTv311,
+                 session_expiry_interval: Optional[int] = None,
+                 max_inflight_messages: int = 20,
+                 clean_session: bool = True,
+                 transport: str = "tcp",
+                 unix_socket_path: Optional[str] = None,
+                 tcp_nodelay: bool = True,
+                 socket_send_buffer: Optional[int] = None,
+                 socket_receive_buffer: Optional[int] = None,
+                 websocket_path: str = "/mqtt",
+                 websocket_headers: Optional[Dict[str, str]] = None):
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unsupported MQTT transport: {transport}")
+        if transport == "unix" and not unix_socket_path:
+            raise ValueError("The unix transport needs a unix_socket_path")
+        if transport == "unix" and not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix domain sockets are not supported on this platform")
+        self._protocol_version = protocol_version
+        self._session_expiry_interval = session_expiry_interval
+        self._clean_session = clean_session
+        options = {'protocol': protocol_version}
+        if transport == "websockets":
+            options['transport'] = "websockets"
+        if clean_session or self.is_mqtt_v5:
+            if not clean_session and not session_expiry_interval:
+                raise ValueError("Persistent MQTT v5 sessions need a session expiry interval")
+            self._client = mqtt.Client(client_id, **options)
+        else:
+            self._client = mqtt.Client(client_id, clean_session=False, **options)
+        if transport == "websockets":
+            self._client.ws_set_options(path=websocket_path, headers=websocket_headers)
+
+        self._transport = transport
+        self._unix_socket_path = unix_socket_path
+        self._tcp_nodelay = tcp_nodelay
+        self._socket_send_buffer = socket_send_buffer
+        self._socket_receive_buffer = socket_receive_buffer
+        # paho has no hook for creating the socket, so its factory method is replaced on the instance
+        self._open_tcp_socket = self._client._create_socket_connection
+        self._client._create_socket_connection = self._create_socket_connection
+
+        self._topic_aliases = TopicAliasTable()
+        self._publish_lock = threading.Lock()
+        self._on_connect_callback = None
+        self._on_disconnect_callback = None
+        if self.is_mqtt_v5:
+            self._client.on_disconnect = self._handle_v5_disconnect
+
+        # Acknowledgement tracking for publish_with_ack, bounded by the in-flight window
+        self._client.max_inflight_messages_set(max_inflight_messages)
+        self._client.on_publish = self._handle_publish
+        self._inflight_window = threading.BoundedSemaphore(max_inflight_messages)
+        self._pending_acks: Dict[int, Future] = {}
+
+    @property
+    def is_mqtt_v5(self) -> bool:
+        return self._protocol_version == mqtt.MQTTv5
 
     def connect(self, host: str, port: int, keepalive: int) -> None:
-        self._client.connect(host, port, keepalive)
+        if self.is_mqtt_v5 and not self._clean_session:
+            self._client.connect(host, port, keepalive, clean_start=False, properties=self._connect_properties())
+        elif self.is_mqtt_v5:
+            self._client.connect(host, port, keepalive, properties=self._connect_properties())
+        else:
+            self._client.connect(host, port, keepalive)
+
+    def _create_socket_connection(self) -> socket.socket:
+        """Open the connection socket for paho, with the configured transport and options."""
+        if self._transport == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self._set_buffer_sizes(sock)
+                sock.settimeout(self._client._connect_timeout)
+                sock.connect(self._unix_socket_path)
+            except OSError:
+                sock.close()
+                raise
+            return sock
+        sock = self._open_tcp_socket()
+        if self._tcp_nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._set_buffer_sizes(sock)
+        return sock
+
+    def _set_buffer_sizes(self, sock: socket.socket) -> None:
+        if self._socket_send_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self._socket_send_buffer)
+        if self._socket_receive_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._socket_receive_buffer)
+
+    def _connect_properties(self) -> Optional[Properties]:
+        """Build the MQTT v5 CONNECT properties, or None when there are none to send."""
+        if self._session_expiry_interval is None:
+            return None
+        properties = Properties(PacketTypes.CONNECT)
+        properties.SessionExpiryInterval = self._session_expiry_interval
+        return properties
     
     def disconnect(self) -> None:
         self._client.disconnect()
@@ -19,10 +128,107 @@ class PahoMQTTClient(MQTTClient):
     
     def subscribe(self, topic: str, qos: int = 0) -> None:
         self._client.subscribe(topic, qos)
+
+    def unsubscribe(self, topic: str) -> None:
+        self._client.unsubscribe(topic)
     
-    def publish(self, topic: str, payload: str, qos: int = 0) -> bool:
-        result = self._client.publish(topic, payload, qos)
+    def publish(self,
+                topic: str,
+                payload: Union[str, bytes],
+                qos: int = 0,
+                content_type: Optional[str] = None,
+                message_expiry_interval: Optional[int] = None) -> bool:
+        result = self._publish(topic, payload, qos, content_type, message_expiry_interval)
         return result.rc == mqtt.MQTT_ERR_SUCCESS
+
+    def publish_with_ack(self,
+                         topic: str,
+                         payload: Union[str, bytes],
+                         qos: int = 0,
+                         content_type: Optional[str] = None,
+                         message_expiry_interval: Optional[int] = None,
+                         timeout: Optional[float] = None) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        if qos == 0:
+            # QoS 0 has no acknowledgement, the message is done once it is queued
+            if self.publish(topic, payload, qos, content_type, message_expiry_interval):
+                future.set_result(True)
+            else:
+                future.set_exception(ConnectionError(f"Failed to publish to {topic}"))
+            return future
+
+        if not self._inflight_window.acquire(timeout=timeout):
+            future.set_exception(TimeoutError(f"In-flight window full, could not publish to {topic}"))
+            return future
+        try:
+            # paho acknowledges messages while holding its out message lock, so holding it
+            # here guarantees the future is registered before its PUBACK/PUBCOMP is handled.
+            # Without a connection paho keeps QoS > 0 messages and sends them on reconnect,
+            # so only a refused message, such as a full queue, fails the future.
+            with self._client._out_message_mutex:
+                result = self._publish(topic, payload, qos, content_type, message_expiry_interval)
+                if result.rc in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+                    self._pending_acks[result.mid] = future
+                    return future
+            error = ConnectionError(f"Failed to publish to {topic}: {mqtt.error_string(result.rc)}")
+        except Exception as e:
+            error = e
+        self._inflight_window.release()
+        future.set_exception(error)
+        return future
+
+    def pending_ack_count(self) -> int:
+        return len(self._pending_acks)
+
+    def fail_pending_acks(self, error: BaseException) -> int:
+        with self._client._out_message_mutex:
+            futures = list(self._pending_acks.values())
+            self._pending_acks.clear()
+        for future in futures:
+            self._inflight_window.release()
+            future.set_exception(error)
+        return len(futures)
+
+    def unacknowledged_messages(self) -> List[Tuple[str, bytes, int]]:
+        with self._client._out_message_mutex:
+            messages = list(self._client._out_messages.values())
+        return [(message.topic, message.payload, message.qos) for message in messages if message.qos > 0]
+
+    def _handle_publish(self, client, userdata, mid):
+        """Complete the future of an acknowledged message."""
+        future = self._pending_acks.pop(mid, None)
+        if future is not None:
+            self._inflight_window.release()
+            future.set_result(True)
+
+    def _publish(self,
+                 topic: str,
+                 payload: Union[str, bytes],
+                 qos: int,
+                 content_type: Optional[str],
+                 message_expiry_interval: Optional[int]) -> mqtt.MQTTMessageInfo:
+        if not self.is_mqtt_v5:
+            return self._client.publish(topic, payload, qos)
+
+        properties = Properties(PacketTypes.PUBLISH)
+        if content_type is not None:
+            properties.ContentType = content_type
+        if message_expiry_interval is not None:
+            properties.MessageExpiryInterval = message_expiry_interval
+
+        # QoS > 0 messages may be resent on a later connection where the alias is
+        # unknown, so only QoS 0 publishes use aliases, and only while connected.
+        if qos > 0 or not self._client.is_connected():
+            return self._client.publish(topic, payload, qos, properties=properties)
+        with self._publish_lock:
+            publish_topic = topic
+            alias, known = self._topic_aliases.resolve(topic)
+            if alias is not None:
+                properties.TopicAlias = alias
+                if known:
+                    publish_topic = ""
+            return self._client.publish(publish_topic, payload, qos, properties=properties)
     
     def loop_start(self) -> None:
         self._client.loop_start()
@@ -34,10 +240,34 @@ class PahoMQTTClient(MQTTClient):
         return self._client.is_connected()
     
     def set_on_connect_callback(self, callback: Callable) -> None:
-        self._client.on_connect = callback
+        if self.is_mqtt_v5:
+            self._on_connect_callback = callback
+            self._client.on_connect = self._handle_v5_connect
+        else:
+            self._client.on_connect = callback
+
+    def _handle_v5_connect(self, client, userdata, flags, rc, properties=None):
+        """Negotiate the topic alias limit from CONNACK before running the connect callback."""
+        alias_maximum = 0
+        if properties is not None and hasattr(properties, "TopicAliasMaximum"):
+            alias_maximum = properties.TopicAliasMaximum
+        with self._publish_lock:
+            self._topic_aliases.reset(alias_maximum)
+        if self._on_connect_callback:
+            self._on_connect_callback(client, userdata, flags, rc, properties)
     
     def set_on_message_callback(self, callback: Callable) -> None:
         self._client.on_message = callback
     
     def set_on_disconnect_callback(self, callback: Callable) -> None:
-        self._client.on_disconnect = callback
+        if self.is_mqtt_v5:
+            self._on_disconnect_callback = callback
+        else:
+            self._client.on_disconnect = callback
+
+    def _handle_v5_disconnect(self, client, userdata, rc, *args):
+        """Forget the topic aliases of the lost connection before running the disconnect callback."""
+        with self._publish_lock:
+            self._topic_aliases.reset(0)
+        if self._on_disconnect_callback:
+            self._on_disconnect_callback(client, userdata, rc, *args)
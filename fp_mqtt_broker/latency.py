@@ -0,0 +1,173 @@
+import bisect
+import itertools
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .message import Message
+
+# Upper bounds in seconds of the histogram buckets, a last bucket holds everything above
+DEFAULT_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BOUNDS):
+        """
+        :param bounds: Increasing upper bounds of the buckets.
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Upper bound of the bucket holding a percentile, the max for the last bucket, None when empty."""
+        if not self.count:
+            return None
+        rank = percentile / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': {str(bound): count for bound, count in zip(self.bounds + (float("inf"),), self.counts)},
+        }
+
+class LatencyTracker:
+    """
+    Stamps outgoing payloads and measures the latency and loss of incoming ones.
+
+    Published JSON objects get a field holding the publisher id, the send time and a
+    sequence number per topic. On receipt the field is removed before validation
+    and handlers, and three things are recorded: transit latency (send to receive,
+    which relies on synchronised clocks across hosts), queueing latency (receive to
+    dispatch) and sequence gaps per publisher and topic. Gaps are counted from
+    sequence numbers only, so clock jumps never show up as loss; a negative transit
+    time is counted as clock skew and recorded as 0. Every run of a publisher has
+    its own sequences, so restarts are not mistaken for loss.
+    """
+
+    MAX_STREAMS = 10000
+
+    def __init__(self, client_id: str, field: str = "_sent", bounds: Sequence[float] = DEFAULT_BOUNDS):
+        """
+        :param client_id: Publisher id written into stamps.
+        :param field: Payload field carrying the stamp.
+        :param bounds: Upper bounds in seconds of the histogram buckets.
+        """
+        self.client_id = client_id
+        self.field = field
+        self.run_id = uuid.uuid4().hex[:8]
+        self.transit = LatencyHistogram(bounds)
+        self.queueing = LatencyHistogram(bounds)
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.clock_skew = 0
+        self._sequences: Dict[str, "itertools.count"] = {}
+        # Last sequence number per (publisher, run, topic)
+        self._streams: Dict[Tuple[str, str, str], int] = {}
+        self._publishers: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def stamp(self, payload: Dict[str, Any], topic: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a copy of a payload with the stamp added.
+
+        :param topic: Topic the payload is published to, payloads sent to several topics
+            at once are stamped without a sequence number.
+        """
+        stamp = {'src': self.client_id, 'run': self.run_id, 'ts': time.time()}
+        if topic is not None:
+            with self._lock:
+                sequence = self._sequences.get(topic)
+                if sequence is None:
+                    if len(self._sequences) >= self.MAX_STREAMS:
+                        self._sequences.clear()
+                    sequence = self._sequences[topic] = itertools.count(1)
+                stamp['seq'] = next(sequence)
+        return {**payload, self.field: stamp}
+
+    def observe(self, message: Message) -> None:
+        """Remove the stamp of a received message and record its latency, called on dispatch."""
+        payload = message.payload
+        if not isinstance(payload, dict):
+            return
+        stamp = payload.pop(self.field, None)
+        if not isinstance(stamp, dict):
+            return
+        now = time.time()
+        with self._lock:
+            self.received += 1
+            self.queueing.record(max(0.0, now - message.received_at))
+            sent_at = stamp.get('ts')
+            if isinstance(sent_at, (int, float)):
+                transit = message.received_at - sent_at
+                if transit < 0:
+                    self.clock_skew += 1
+                    transit = 0.0
+                self.transit.record(transit)
+            publisher = str(stamp.get('src'))
+            counters = self._publishers.get(publisher)
+            if counters is None:
+                if len(self._publishers) >= self.MAX_STREAMS:
+                    self._publishers.clear()
+                counters = self._publishers[publisher] = [0, 0, 0]
+            counters[0] += 1
+            sequence = stamp.get('seq')
+            if isinstance(sequence, int):
+                self._track_sequence(publisher, str(stamp.get('run')), message.topic, sequence, counters)
+
+    def _track_sequence(self, publisher: str, run: str, topic: str, sequence: int, counters: List[int]) -> None:
+        key = (publisher, run, topic)
+        last_sequence = self._streams.get(key)
+        if last_sequence is None:
+            # The first message seen sets the baseline, earlier ones were sent before we subscribed
+            if len(self._streams) >= self.MAX_STREAMS:
+                self._streams.clear()
+            self._streams[key] = sequence
+            return
+        if sequence <= last_sequence:
+            self.duplicates += 1
+            counters[2] += 1
+            return
+        gap = sequence - last_sequence - 1
+        self.lost += gap
+        counters[1] += gap
+        self._streams[key] = sequence
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the latency histograms and the loss counters, overall and per publisher."""
+        with self._lock:
+            return {
+                'received': self.received,
+                'lost': self.lost,
+                'duplicates': self.duplicates,
+                'clock_skew': self.clock_skew,
+                'transit': self.transit.to_dict(),
+                'queueing': self.queueing.to_dict(),
+                'publishers': {
+                    publisher: {'received': received, 'lost': lost, 'duplicates': duplicates}
+                    for publisher, (received, lost, duplicates) in self._publishers.items()
+                },
+            }
@@ -0,0 +1,69 @@
+import time
+from typing import Any, Callable, Optional
+
+class PayloadDecodeError(ValueError):
+    """Raised when a message payload cannot be decoded."""
+
+_NOT_DECODED = object()
+
+class Message:
+    """
+    Envelope of a received MQTT message.
+
+    The payload is decoded on first access and cached, so messages nobody reads the
+    payload of are never parsed. Slots keep the per-message allocation small.
+    """
+
+    __slots__ = ("topic", "raw", "qos", "retain", "received_at", "_decoder", "_payload", "_error")
+
+    def __init__(self,
+                 topic: str,
+                 raw: bytes,
+                 decoder: Callable[[bytes], Any],
+                 qos: int = 0,
+                 retain: bool = False,
+                 received_at: Optional[float] = None):
+        """
+        :param topic: The topic the message was received on.
+        :param raw: The payload bytes as received.
+        :param decoder: Function decoding the raw payload.
+        :param qos: The quality of service level of the message.
+        :param retain: Whether the message is a retained message.
+        :param received_at: Receive time as a ``time.time()`` timestamp, now by default.
+        """
+        self.topic = topic
+        self.raw = raw
+        self.qos = qos
+        self.retain = retain
+        self.received_at = time.time() if received_at is None else received_at
+        self._decoder = decoder
+        self._payload = _NOT_DECODED
+        self._error = None
+
+    @classmethod
+    def from_payload(cls, topic: str, payload: Any, qos: int = 0, retain: bool = False) -> 'Message':
+        """Create an envelope around an already decoded payload, without raw bytes."""
+        message = cls(topic, b"", decoder=None, qos=qos, retain=retain)
+        message._payload = payload
+        return message
+
+    @property
+    def payload(self) -> Any:
+        """The decoded payload, raises PayloadDecodeError if it cannot be decoded."""
+        if self._payload is _NOT_DECODED:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._payload = self._decoder(self.raw)
+            except Exception as e:
+                self._error = PayloadDecodeError(str(e))
+                raise self._error from e
+        return self._payload
+
+    @property
+    def is_decoded(self) -> bool:
+        """Whether the payload was already decoded."""
+        return self._payload is not _NOT_DECODED
+
+    def __repr__(self) -> str:
+        return f"Message(topic={self.topic!r}, qos={self.qos}, retain={self.retain}, size={len(self.raw)})"
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .abstractions.message_handler import EnvelopeMessageHandler, MessageHandler
+from .message import Message
+from .topics import topic_matches
+
+@dataclass(frozen=True)
+class PipelineStage:
+    """A transform computing its output from the outputs of its input stages."""
+
+    name: str
+    function: Callable[..., Any]
+    inputs: Tuple[str, ...]
+
+class Pipeline(EnvelopeMessageHandler):
+    """
+    Message handler running shared transform stages for several downstream handlers.
+
+    Stages form a DAG rooted at the built-in ``message`` (the envelope) and ``payload``
+    (the decoded payload) stages. For each message only the stages needed by the
+    downstream handlers matching its topic run, each at most once, and all of them
+    run before any handler receives its input, so a failing stage fails the whole
+    message. A stage returning None filters the message out for everything
+    depending on it. Downstream handlers receive the output of their stage through
+    ``handle_message``; their errors are logged without affecting the others.
+    """
+
+    MAX_CACHED_ROUTES = 10000
+
+    def __init__(self):
+        self._stages: Dict[str, Optional[PipelineStage]] = {
+            "message": None,
+            "payload": PipelineStage("payload", lambda message: message.payload, ("message",)),
+        }
+        self._handlers: List[Tuple[MessageHandler, str, Tuple[str, ...]]] = []
+        self._routes: Dict[str, Tuple[Tuple[Tuple[MessageHandler, str], ...], Tuple[PipelineStage, ...]]] = {}
+        self._timings: Dict[str, List[float]] = {}
+        self._timings_lock = threading.Lock()
+
+    def stage(self, name: str, function: Callable[..., Any], inputs: Sequence[str] = ("payload",)) -> 'Pipeline':
+        """
+        Declare a stage.
+
+        :param name: Unique name of the stage.
+        :param function: Function called with the outputs of the input stages, in order.
+        :param inputs: Names of already declared stages the function takes.
+        :return: The pipeline, so declarations can be chained.
+        """
+        if name in self._stages:
+            raise ValueError(f"Pipeline stage {name} is already declared")
+        unknown = [stage for stage in inputs if stage not in self._stages]
+        if unknown:
+            raise ValueError(f"Pipeline stage {name} depends on undeclared stages: {unknown}")
+        if not inputs:
+            raise ValueError(f"Pipeline stage {name} needs at least one input")
+        self._stages[name] = PipelineStage(name, function, tuple(inputs))
+        self._routes = {}
+        return self
+
+    def add_handler(self, handler: MessageHandler, stage: str = "payload") -> 'Pipeline':
+        """
+        Deliver the output of a stage to a handler, for the topics the handler subscribes to.
+
+        Add handlers before registering the pipeline with the broker, which subscribes
+        the pipeline's topics at registration.
+
+        :return: The pipeline, so declarations can be chained.
+        """
+        if stage not in self._stages or stage == "message":
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        self._handlers.append((handler, stage, tuple(handler.get_subscribed_topics())))
+        self._routes = {}
+        return self
+
+    @property
+    def concurrent(self) -> bool:
+        """Whether every downstream handler may be called concurrently, stages must then be thread-safe too."""
+        return all(handler.concurrent for handler, _, _ in self._handlers)
+
+    def get_subscribed_topics(self) -> List[str]:
+        return list(dict.fromkeys(topic for _, _, topics in self._handlers for topic in topics))
+
+    def handle(self, message: Message) -> None:
+        handlers, stages = self._route(message.topic)
+        if not handlers:
+            return
+        outputs: Dict[str, Any] = {"message": message}
+        for stage in stages:
+            arguments = [outputs[name] for name in stage.inputs]
+            if any(argument is None for argument in arguments):
+                outputs[stage.name] = None
+                continue
+            started = time.perf_counter()
+            outputs[stage.name] = stage.function(*arguments)
+            self._record(stage.name, time.perf_counter() - started)
+
+        for handler, stage_name in handlers:
+            output = outputs[stage_name]
+            if output is None:
+                continue
+            try:
+                handler.handle_message(message.topic, output)
+            except Exception as e:
+                logging.error(f"Error in pipeline handler {handler.__class__.__name__}: {str(e)}")
+
+    def flush(self) -> None:
+        for handler in dict.fromkeys(handler for handler, _, _ in self._handlers):
+            handler.flush()
+
+    def close(self) -> None:
+        for handler in dict.fromkeys(handler for handler, _, _ in self._handlers):
+            handler.close()
+
+    def stage_timings(self) -> Dict[str, Dict[str, float]]:
+        """Get the number of runs and the total, mean and max duration in seconds of every stage that ran."""
+        with self._timings_lock:
+            return {
+                name: {'count': count, 'total': total, 'mean': total / count, 'max': maximum}
+                for name, (count, total, maximum) in self._timings.items()
+            }
+
+    def _record(self, name: str, duration: float) -> None:
+        with self._timings_lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                self._timings[name] = [1, duration, duration]
+            else:
+                timing[0] += 1
+                timing[1] += duration
+                if duration > timing[2]:
+                    timing[2] = duration
+
+    def _route(self, topic: str):
+        route = self._routes.get(topic)
+        if route is None:
+            handlers = tuple(
+                (handler, stage) for handler, stage, topics in self._handlers
+                if any(topic_matches(topic_filter, topic) for topic_filter in topics)
+            )
+            needed = set()
+            pending = [stage for _, stage in handlers]
+            while pending:
+                name = pending.pop()
+                stage = self._stages[name]
+                if stage is not None and name not in needed:
+                    needed.add(name)
+                    pending.extend(stage.inputs)
+            # Declaration order is a topological order, inputs are always declared first
+            stages = tuple(stage for name, stage in self._stages.items() if name in needed)
+            if len(self._routes) >= self.MAX_CACHED_ROUTES:
+                self._routes.clear()
+            route = self._routes[topic] = (handlers, stages)
+        return route
@@ -0,0 +1,120 @@
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+from .abstractions.message_handler import MessageHandler
+from .topics import topic_matches
+
+class DispatchSnapshot:
+    """
+    Immutable view of the registered handlers and subscribed topics.
+
+    The handlers matching a topic are resolved once per snapshot and cached, so
+    dispatch is a dictionary lookup. A snapshot never changes after it is published,
+    only its route cache grows, which is safe to do from any thread.
+    """
+
+    MAX_CACHED_ROUTES = 10000
+
+    __slots__ = ("handlers", "topics", "_filters", "_routes")
+
+    def __init__(self, handlers: Tuple[MessageHandler, ...], topics: FrozenSet[str]):
+        self.handlers = handlers
+        self.topics = topics
+        self._filters = tuple((handler, tuple(handler.get_subscribed_topics())) for handler in handlers)
+        self._routes: Dict[str, Tuple[MessageHandler, ...]] = {}
+
+    def handlers_for(self, topic: str) -> Tuple[MessageHandler, ...]:
+        """Get the handlers with a subscription matching the topic, in registration order."""
+        route = self._routes.get(topic)
+        if route is None:
+            route = tuple(
+                handler for handler, filters in self._filters
+                if any(topic_matches(topic_filter, topic) for topic_filter in filters)
+            )
+            if len(self._routes) >= self.MAX_CACHED_ROUTES:
+                self._routes.clear()
+            self._routes[topic] = route
+        return route
+
+class HandlerRegistry:
+    """
+    Copy-on-write registry of message handlers and subscribed topics.
+
+    Writers build a new DispatchSnapshot and publish it with a single reference
+    assignment. Readers take the current snapshot without locking and keep using it
+    for the whole message, so registrations never block or disturb dispatch.
+    """
+
+    def __init__(self, handlers: Iterable[MessageHandler] = (), topics: Iterable[str] = ()):
+        """
+        :param handlers: The initial handlers.
+        :param topics: Topics subscribed in addition to the handlers' own topics.
+        """
+        handlers = tuple(handlers)
+        all_topics = set(topics)
+        for handler in handlers:
+            all_topics.update(handler.get_subscribed_topics())
+        self._write_lock = threading.Lock()
+        self._snapshot = DispatchSnapshot(handlers, frozenset(all_topics))
+
+    @property
+    def snapshot(self) -> DispatchSnapshot:
+        """The current dispatch snapshot."""
+        return self._snapshot
+
+    def add(self, handler: MessageHandler) -> List[str]:
+        """
+        Register a handler.
+
+        :return: The handler's topics that were not subscribed yet.
+        """
+        with self._write_lock:
+            current = self._snapshot
+            new_topics = [topic for topic in dict.fromkeys(handler.get_subscribed_topics()) if topic not in current.topics]
+            self._snapshot = DispatchSnapshot(current.handlers + (handler,), current.topics.union(new_topics))
+        return new_topics
+
+    def remove(self, handler: MessageHandler) -> bool:
+        """
+        Unregister a handler, its topics stay subscribed.
+
+        :return: Whether the handler was registered.
+        """
+        with self._write_lock:
+            current = self._snapshot
+            if handler not in current.handlers:
+                return False
+            handlers = list(current.handlers)
+            handlers.remove(handler)
+            self._snapshot = DispatchSnapshot(tuple(handlers), current.topics)
+        return True
+
+    def replace(self, handlers: Iterable[MessageHandler]) -> List[str]:
+        """
+        Replace all handlers at once.
+
+        :return: The new handlers' topics that were not subscribed yet.
+        """
+        handlers = tuple(handlers)
+        with self._write_lock:
+            current = self._snapshot
+            new_topics = []
+            for handler in handlers:
+                for topic in handler.get_subscribed_topics():
+                    if topic not in current.topics and topic not in new_topics:
+                        new_topics.append(topic)
+            self._snapshot = DispatchSnapshot(handlers, current.topics.union(new_topics))
+        return new_topics
+
+    def add_topic(self, topic: str) -> bool:
+        """
+        Subscribe a topic that no handler declares.
+
+        :return: Whether the topic was not subscribed yet.
+        """
+        with self._write_lock:
+            current = self._snapshot
+            if topic in current.topics:
+                return False
+            self._snapshot = DispatchSnapshot(current.handlers, current.topics | {topic})
+        return True
@@ -0,0 +1,114 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+
+class RequestError(Exception):
+    """Raised through a request future when the responder reported an error."""
+
+def build_request(correlation_id: str, reply_to: str, payload: Any) -> Dict[str, Any]:
+    """Wrap a request payload with the fields a responder needs to reply."""
+    return {'correlation_id': correlation_id, 'reply_to': reply_to, 'payload': payload}
+
+def build_response(correlation_id: str, payload: Any = None, error: Optional[str] = None) -> Dict[str, Any]:
+    """Build the reply to a request, carrying either a result or an error."""
+    response = {'correlation_id': correlation_id, 'payload': payload}
+    if error is not None:
+        response['error'] = error
+    return response
+
+class PendingRequests:
+    """
+    Table of in-flight requests keyed by correlation ID.
+
+    Each request is a Future completed by its reply. Deadlines are kept in a heap
+    watched by a single daemon thread, which fails expired requests with TimeoutError.
+    """
+
+    def __init__(self):
+        self._futures: Dict[str, Future] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        self._condition = threading.Condition()
+        self._expiry_thread: Optional[threading.Thread] = None
+        self._ids = itertools.count(1)
+        self._id_prefix = os.urandom(4).hex()
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def new_correlation_id(self) -> str:
+        """Generate a correlation ID unique to this table."""
+        return f"{self._id_prefix}-{next(self._ids)}"
+
+    def add(self, correlation_id: str, timeout: float) -> Future:
+        """Register a request and get the future completed by its reply."""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._condition:
+            self._futures[correlation_id] = future
+            heapq.heappush(self._deadlines, (time.monotonic() + timeout, correlation_id))
+            if self._expiry_thread is None:
+                self._expiry_thread = threading.Thread(target=self._expire_loop, name="mqtt-rpc-expiry", daemon=True)
+                self._expiry_thread.start()
+            self._condition.notify()
+        return future
+
+    def resolve(self, response: Dict[str, Any]) -> bool:
+        """
+        Complete the request a reply belongs to.
+
+        :return: False if the reply matches no pending request, e.g. it arrived after expiry.
+        """
+        correlation_id = response.get('correlation_id') if isinstance(response, dict) else None
+        with self._condition:
+            future = self._futures.pop(correlation_id, None)
+        if future is None:
+            return False
+        if response.get('error') is not None:
+            future.set_exception(RequestError(response['error']))
+        else:
+            future.set_result(response.get('payload'))
+        return True
+
+    def fail(self, correlation_id: str, error: BaseException) -> None:
+        """Fail a pending request, e.g. when the request could not be published."""
+        with self._condition:
+            future = self._futures.pop(correlation_id, None)
+        if future is not None:
+            future.set_exception(error)
+
+    def fail_all(self, error: BaseException) -> int:
+        """
+        Fail every pending request.
+
+        :return: The number of requests failed.
+        """
+        with self._condition:
+            futures = list(self._futures.values())
+            self._futures.clear()
+            self._deadlines.clear()
+        for future in futures:
+            future.set_exception(error)
+        return len(futures)
+
+    def _expire_loop(self) -> None:
+        while True:
+            expired = []
+            with self._condition:
+                while not self._deadlines:
+                    self._condition.wait()
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, correlation_id = heapq.heappop(self._deadlines)
+                    future = self._futures.pop(correlation_id, None)
+                    if future is not None:
+                        expired.append((correlation_id, future))
+                if self._deadlines and not expired:
+                    self._condition.wait(self._deadlines[0][0] - now)
+            for correlation_id, future in expired:
+                logging.warning(f"Request {correlation_id} timed out")
+                future.set_exception(TimeoutError(f"Request {correlation_id} timed out"))
@@ -0,0 +1,92 @@
+import base64
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# An outgoing message as (topic, payload, qos)
+OutgoingMessage = Tuple[str, bytes, int]
+
+class SessionStore:
+    """
+    File persisting the client side of a persistent MQTT session across restarts.
+
+    It records the subscriptions the server holds for the session, so a resumed
+    session only subscribes what changed, and the QoS > 0 messages still waiting for
+    their acknowledgement, which are published again on the next start. The file is
+    JSON, replaced atomically on every save.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        """
+        :param path: Location of the session file, loaded if it exists.
+        """
+        self.path = path
+        self.subscriptions: Dict[str, int] = {}
+        self.unacknowledged: List[OutgoingMessage] = []
+        self._lock = threading.Lock()
+        self._saved: Optional[str] = None
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as session_file:
+                content = session_file.read()
+            state = json.loads(content)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable MQTT session file {self.path}: {str(e)}")
+            return
+        if state.get("version") != self.VERSION:
+            logging.warning(f"Ignoring MQTT session file {self.path} with unsupported version {state.get('version')}")
+            return
+        self.subscriptions = {topic: int(qos) for topic, qos in state.get("subscriptions", {}).items()}
+        self.unacknowledged = [
+            (message["topic"], base64.b64decode(message["payload"]), int(message["qos"]))
+            for message in state.get("unacknowledged", [])
+        ]
+        self._saved = content
+
+    def take_unacknowledged(self) -> List[OutgoingMessage]:
+        """Get the messages left unacknowledged by the previous run, once."""
+        with self._lock:
+            messages, self.unacknowledged = self.unacknowledged, []
+        return messages
+
+    def save(self, subscriptions: Dict[str, int], unacknowledged: List[OutgoingMessage]) -> bool:
+        """
+        Persist the session state, unless it is unchanged since the last save.
+
+        Messages loaded from the file and not yet taken are kept.
+
+        :return: Whether the file was written.
+        """
+        with self._lock:
+            self.subscriptions = dict(subscriptions)
+            pending = self.unacknowledged + list(unacknowledged)
+            content = json.dumps({
+                "version": self.VERSION,
+                "subscriptions": self.subscriptions,
+                "unacknowledged": [
+                    {
+                        "topic": topic,
+                        "payload": base64.b64encode(payload.encode() if isinstance(payload, str) else payload).decode(),
+                        "qos": qos,
+                    }
+                    for topic, payload, qos in pending
+                ],
+            }, sort_keys=True)
+            if content == self._saved:
+                return False
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as session_file:
+                session_file.write(content)
+                session_file.flush()
+                os.fsync(session_file.fileno())
+            os.replace(temporary_path, self.path)
+            self._saved = content
+            return True
@@ -0,0 +1,235 @@
+import json
+import logging
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Region header: magic, layout version, slot capacity, max topic bytes, max payload bytes, used slots
+_HEADER = struct.Struct("<4sIIIII")
+_USED_OFFSET = 20
+# Slot header: sequence, timestamp, payload length, topic length, padded to 24 bytes
+_SLOT_HEADER = struct.Struct("<QdIH2x")
+_SEQUENCE = struct.Struct("<Q")
+
+MAGIC = b"FPLV"
+VERSION = 1
+
+class SharedValue(NamedTuple):
+    """Latest value of a topic in a shared value region."""
+
+    payload: bytes
+    timestamp: float
+    # Even number increasing with every write, a reader can poll it for changes
+    sequence: int
+
+    def decode(self) -> Any:
+        """Parse the payload as JSON."""
+        return json.loads(self.payload)
+
+def _slot_size(max_topic: int, max_payload: int) -> int:
+    return _SLOT_HEADER.size + max_topic + max_payload
+
+class SharedValueWriter:
+    """
+    Writer of the latest payload per topic into a named shared memory region.
+
+    One process, the ingest leader, receives the messages and writes them; other
+    processes on the host read them with SharedValueReader without an MQTT connection
+    of their own. Each topic owns a fixed slot guarded by a sequence counter that is
+    odd while a write is in progress, so readers never block the writer and retry
+    the rare read that overlaps a write. Slots are allocated on first write and never
+    freed; topics beyond the capacity are not stored.
+    """
+
+    def __init__(self,
+                 name: str,
+                 slots: int = 1024,
+                 max_payload: int = 4096,
+                 max_topic: int = 256,
+                 replace_existing: bool = False):
+        """
+        :param name: Name of the region, shared with the readers.
+        :param slots: Maximum number of topics.
+        :param max_payload: Maximum payload size in bytes, larger payloads are not stored.
+        :param max_topic: Maximum topic size in bytes.
+        :param replace_existing: Whether a region left with the same name, e.g. by a crashed
+            writer, is removed; it may still be in use by another writer.
+        :raises FileExistsError: If a region with the name exists and is not replaced.
+        """
+        if slots < 1 or max_payload < 1 or max_topic < 1:
+            raise ValueError("A shared value region needs positive slots, max_payload and max_topic")
+        self.name = name
+        self.slots = slots
+        self.max_payload = max_payload
+        self.max_topic = max_topic
+        self.rejected = 0
+        self._slot_size = _slot_size(max_topic, max_payload)
+        size = _HEADER.size + slots * self._slot_size
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if not replace_existing:
+                raise FileExistsError(f"Shared value region {name} already exists, another writer may be using it; "
+                                      f"pass replace_existing=True to replace it") from None
+            logging.warning(f"Replacing existing shared value region {name}")
+            stale = shared_memory.SharedMemory(name=name)
+            # Clearing the magic tells a writer still attached that the name is no longer its own
+            stale.buf[:len(MAGIC)] = bytes(len(MAGIC))
+            stale.close()
+            stale.unlink()
+            self._memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._buffer = self._memory.buf
+        _HEADER.pack_into(self._buffer, 0, MAGIC, VERSION, slots, max_topic, max_payload, 0)
+        self._topics: Dict[str, int] = {}
+        self._sequences: List[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def write(self, topic: str, payload: bytes, timestamp: Optional[float] = None) -> bool:
+        """
+        Store the latest payload of a topic.
+
+        :return: Whether it was stored, False when the region is full or the payload too large.
+        """
+        if len(payload) > self.max_payload:
+            self.rejected += 1
+            return False
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self._buffer is None:
+                return False
+            slot = self._topics.get(topic)
+            if slot is None:
+                slot = self._allocate(topic)
+                if slot is None:
+                    self.rejected += 1
+                    return False
+            offset = _HEADER.size + slot * self._slot_size
+            sequence = self._sequences[slot]
+            _SEQUENCE.pack_into(self._buffer, offset, sequence + 1)
+            payload_offset = offset + _SLOT_HEADER.size + self.max_topic
+            self._buffer[payload_offset:payload_offset + len(payload)] = payload
+            struct.pack_into("<dI", self._buffer, offset + _SEQUENCE.size, timestamp, len(payload))
+            _SEQUENCE.pack_into(self._buffer, offset, sequence + 2)
+            self._sequences[slot] = sequence + 2
+        return True
+
+    def close(self) -> None:
+        """Release and remove the region, attached readers keep their mapping."""
+        with self._lock:
+            if self._buffer is None:
+                return
+            replaced = bytes(self._buffer[:len(MAGIC)]) != MAGIC
+            self._buffer.release()
+            self._buffer = None
+            self._memory.close()
+            if replaced:
+                # The name now belongs to the writer that replaced this region, which already unlinked it
+                resource_tracker.unregister(self._memory._name, "shared_memory")
+            else:
+                self._memory.unlink()
+
+    def _allocate(self, topic: str) -> Optional[int]:
+        encoded = topic.encode()
+        if len(self._topics) >= self.slots or len(encoded) > self.max_topic:
+            return None
+        slot = len(self._topics)
+        offset = _HEADER.size + slot * self._slot_size
+        _SLOT_HEADER.pack_into(self._buffer, offset, 0, 0.0, 0, len(encoded))
+        topic_offset = offset + _SLOT_HEADER.size
+        self._buffer[topic_offset:topic_offset + len(encoded)] = encoded
+        self._topics[topic] = slot
+        self._sequences.append(0)
+        # Published last, so readers only see fully initialised slots
+        struct.pack_into("<I", self._buffer, _USED_OFFSET, slot + 1)
+        return slot
+
+class SharedValueReader:
+    """
+    Read-only view of a shared value region written by another process.
+
+    Only depends on the standard library, so consumers do not need an MQTT client.
+    Reads are lock free and copy the payload out of the region.
+    """
+
+    MAX_READ_ATTEMPTS = 100
+
+    def __init__(self, name: str):
+        """
+        :param name: Name of the region, as given to the writer.
+        """
+        self.name = name
+        self._memory = self._attach(name)
+        self._buffer = self._memory.buf
+        magic, version, self.slots, self.max_topic, self.max_payload, _ = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{name} is not a shared value region of version {VERSION}")
+        self._slot_size = _slot_size(self.max_topic, self.max_payload)
+        self._topics: Dict[str, int] = {}
+
+    @staticmethod
+    def _attach(name: str) -> shared_memory.SharedMemory:
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the region, which would remove it when the reader exits
+            memory = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(memory._name, "shared_memory")
+            return memory
+
+    def __enter__(self) -> 'SharedValueReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def topics(self) -> List[str]:
+        """The topics with a slot in the region."""
+        self._refresh()
+        return list(self._topics)
+
+    def read(self, topic: str) -> Optional[SharedValue]:
+        """Get the latest value of a topic, None if it was never written."""
+        slot = self._topics.get(topic)
+        if slot is None:
+            self._refresh()
+            slot = self._topics.get(topic)
+            if slot is None:
+                return None
+        offset = _HEADER.size + slot * self._slot_size
+        payload_offset = offset + _SLOT_HEADER.size + self.max_topic
+        for _ in range(self.MAX_READ_ATTEMPTS):
+            sequence, timestamp, length, _ = _SLOT_HEADER.unpack_from(self._buffer, offset)
+            if sequence & 1:
+                continue
+            if sequence == 0:
+                return None
+            payload = bytes(self._buffer[payload_offset:payload_offset + min(length, self.max_payload)])
+            if _SEQUENCE.unpack_from(self._buffer, offset)[0] == sequence:
+                return SharedValue(payload, timestamp, sequence)
+        raise TimeoutError(f"Shared value of {topic} kept changing while being read")
+
+    def get(self, topic: str, default: Any = None) -> Any:
+        """Get the latest decoded JSON payload of a topic, or the default."""
+        value = self.read(topic)
+        return default if value is None else value.decode()
+
+    def close(self) -> None:
+        """Detach from the region."""
+        if self._buffer is not None:
+            self._buffer.release()
+            self._buffer = None
+            self._memory.close()
+
+    def _refresh(self) -> None:
+        used = struct.unpack_from("<I", self._buffer, _USED_OFFSET)[0]
+        for slot in range(len(self._topics), used):
+            offset = _HEADER.size + slot * self._slot_size
+            topic_length = _SLOT_HEADER.unpack_from(self._buffer, offset)[3]
+            topic_offset = offset + _SLOT_HEADER.size
+            self._topics[bytes(self._buffer[topic_offset:topic_offset + topic_length]).decode()] = slot
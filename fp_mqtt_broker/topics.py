@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+SHARED_SUBSCRIPTION_PREFIX = "$share/"
+
+
+def is_shared_subscription(subscription: str) -> bool:
+    """Check whether a subscription uses the ``$share/<group>/<filter>`` form."""
+    return subscription.startswith(SHARED_SUBSCRIPTION_PREFIX)
+
+
+def strip_shared_prefix(subscription: str) -> str:
+    """
+    Return the topic filter of a subscription without its shared subscription prefix.
+
+    :param subscription: A topic filter, optionally in ``$share/<group>/<filter>`` form.
+    :return: The bare topic filter used to match incoming message topics.
+    """
+    if not is_shared_subscription(subscription):
+        return subscription
+    parts = subscription.split("/", 2)
+    if len(parts) < 3 or not parts[1]:
+        raise ValueError(f"Invalid shared subscription: {subscription}")
+    return parts[2]
+
+
+def shared_subscription(group: Optional[str], topic_filter: str) -> str:
+    """
+    Build the subscription string for a topic filter in the given share group.
+
+    Filters that are already shared, or calls without a group, are returned unchanged.
+    """
+    if not group or is_shared_subscription(topic_filter):
+        return topic_filter
+    return f"{SHARED_SUBSCRIPTION_PREFIX}{group}/{topic_filter}"
+
+
+def topic_matches(subscription: str, topic: str) -> bool:
+    """
+    Check whether a message topic matches a subscription.
+
+    Supports the ``+`` and ``#`` wildcards and shared subscriptions. Topics starting
+    with ``$`` are not matched by filters starting with a wildcard, as per the MQTT spec.
+
+    :param subscription: The subscribed topic filter.
+    :param topic: The topic the message was published on.
+    :return: True if the message should be delivered for this subscription.
+    """
+    if subscription == topic:
+        return True
+    topic_filter = strip_shared_prefix(subscription)
+    if topic_filter == topic:
+        return True
+    if "+" not in topic_filter and "#" not in topic_filter:
+        return False
+    if topic.startswith("$") and topic_filter[0] in "+#":
+        return False
+
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class TopicAliasTable:
+    """
+    Client-side table of MQTT v5 topic aliases for outgoing publishes.
+
+    The server announces how many aliases it accepts in CONNACK. Topics are assigned
+    aliases on first use and the least recently used alias is reassigned once the
+    table is full. Aliases only live as long as a connection, so the table must be
+    reset whenever the client connects or disconnects.
+    """
+
+    def __init__(self, maximum: int = 0):
+        self._maximum = 0
+        self._aliases: "OrderedDict[str, int]" = OrderedDict()
+        self.reset(maximum)
+
+    @property
+    def maximum(self) -> int:
+        """The number of aliases the server accepts on the current connection."""
+        return self._maximum
+
+    def reset(self, maximum: int) -> None:
+        """Forget all aliases and apply the limit negotiated for a new connection."""
+        self._maximum = max(0, int(maximum or 0))
+        self._aliases.clear()
+
+    def resolve(self, topic: str) -> Tuple[Optional[int], bool]:
+        """
+        Get the alias to publish a topic with.
+
+        :param topic: The topic to publish on.
+        :return: Tuple of the alias (None when aliases are unavailable) and whether the
+            alias is already known to the server, so the topic name can be omitted.
+        """
+        if self._maximum == 0:
+            return None, False
+        alias = self._aliases.get(topic)
+        if alias is not None:
+            self._aliases.move_to_end(topic)
+            return alias, True
+        if len(self._aliases) < self._maximum:
+            alias = len(self._aliases) + 1
+        else:
+            _, alias = self._aliases.popitem(last=False)
+        self._aliases[topic] = alias
+        return alias, False
+
+    def __len__(self) -> int:
+        return len(self._aliases)
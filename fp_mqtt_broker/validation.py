@@ -0,0 +1,190 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .topics import topic_matches
+
+# A compiled validator returns None for a valid payload, or a description of the first error.
+Validator = Callable[[Any], Optional[str]]
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+def compile_schema(schema: Dict[str, Any], path: str = "$") -> Validator:
+    """
+    Compile a JSON Schema subset into a validator function.
+
+    Supported keywords: ``type``, ``enum``, ``minimum``, ``maximum``, ``minLength``,
+    ``maxLength``, ``required``, ``properties``, ``additionalProperties`` (boolean),
+    ``items``, ``minItems`` and ``maxItems``. The schema is inspected once so that
+    validating a payload only runs the checks it actually declares.
+
+    :param schema: The schema definition.
+    :param path: Location of the schema in the payload, used in error messages.
+    :return: A function returning None for valid values, or an error description.
+    """
+    checks: List[Validator] = []
+
+    if "type" in schema:
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        unknown = [name for name in types if name not in _TYPE_CHECKS]
+        if unknown:
+            raise ValueError(f"Unsupported schema type at {path}: {unknown}")
+        type_checks = [_TYPE_CHECKS[name] for name in types]
+        expected = " or ".join(types)
+
+        def check_type(value):
+            for type_check in type_checks:
+                if type_check(value):
+                    return None
+            return f"{path}: expected {expected}"
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value):
+            return None if value in allowed else f"{path}: value not in {allowed}"
+        checks.append(check_enum)
+
+    if "minimum" in schema or "maximum" in schema:
+        minimum = schema.get("minimum")
+        maximum = schema.get("maximum")
+
+        def check_range(value):
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                return None
+            if minimum is not None and value < minimum:
+                return f"{path}: {value} is below minimum {minimum}"
+            if maximum is not None and value > maximum:
+                return f"{path}: {value} is above maximum {maximum}"
+            return None
+        checks.append(check_range)
+
+    if "minLength" in schema or "maxLength" in schema:
+        min_length = schema.get("minLength", 0)
+        max_length = schema.get("maxLength")
+
+        def check_length(value):
+            if not isinstance(value, str):
+                return None
+            if len(value) < min_length or (max_length is not None and len(value) > max_length):
+                return f"{path}: invalid string length {len(value)}"
+            return None
+        checks.append(check_length)
+
+    if "required" in schema or "properties" in schema or "additionalProperties" in schema:
+        required = list(schema.get("required", []))
+        properties = [
+            (name, compile_schema(subschema, f"{path}.{name}"))
+            for name, subschema in schema.get("properties", {}).items()
+        ]
+        allow_additional = schema.get("additionalProperties", True) is not False
+        known = set(schema.get("properties", {}))
+
+        def check_object(value):
+            if not isinstance(value, dict):
+                return None
+            for name in required:
+                if name not in value:
+                    return f"{path}: missing required property '{name}'"
+            for name, validator in properties:
+                if name in value:
+                    error = validator(value[name])
+                    if error:
+                        return error
+            if not allow_additional:
+                extra = [name for name in value if name not in known]
+                if extra:
+                    return f"{path}: unexpected properties {extra}"
+            return None
+        checks.append(check_object)
+
+    if "items" in schema or "minItems" in schema or "maxItems" in schema:
+        item_validator = compile_schema(schema["items"], f"{path}[]") if "items" in schema else None
+        min_items = schema.get("minItems", 0)
+        max_items = schema.get("maxItems")
+
+        def check_array(value):
+            if not isinstance(value, list):
+                return None
+            if len(value) < min_items or (max_items is not None and len(value) > max_items):
+                return f"{path}: invalid number of items {len(value)}"
+            if item_validator:
+                for item in value:
+                    error = item_validator(item)
+                    if error:
+                        return error
+            return None
+        checks.append(check_array)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value):
+        for check in checks:
+            error = check(value)
+            if error:
+                return error
+        return None
+    return validate
+
+class SchemaRegistry:
+    """
+    Compiled payload schemas keyed by topic filter.
+
+    The validators that apply to a topic are resolved once and cached, so each
+    message only runs the validators for its own topic.
+    """
+
+    MAX_CACHED_TOPICS = 4096
+
+    def __init__(self):
+        self._validators: List[Tuple[str, Validator]] = []
+        self._topic_cache: Dict[str, List[Validator]] = {}
+
+    def __len__(self) -> int:
+        return len(self._validators)
+
+    def add_schema(self, topic_filter: str, schema: Dict[str, Any]) -> None:
+        """Compile a schema and apply it to messages matching the topic filter."""
+        self._validators.append((topic_filter, compile_schema(schema)))
+        self._topic_cache = {}
+
+    def add_schemas(self, schemas: Optional[Dict[str, Dict[str, Any]]]) -> None:
+        """Compile a mapping of topic filters to schemas."""
+        for topic_filter, schema in (schemas or {}).items():
+            self.add_schema(topic_filter, schema)
+
+    def _validators_for(self, topic: str) -> List[Validator]:
+        validators = self._topic_cache.get(topic)
+        if validators is None:
+            validators = [
+                validator for topic_filter, validator in self._validators
+                if topic_matches(topic_filter, topic)
+            ]
+            if len(self._topic_cache) >= self.MAX_CACHED_TOPICS:
+                self._topic_cache = {}
+            self._topic_cache[topic] = validators
+        return validators
+
+    def has_schemas(self, topic: str) -> bool:
+        """Whether any schema applies to the topic, so its payload needs decoding."""
+        return bool(self._validators) and bool(self._validators_for(topic))
+
+    def validate(self, topic: str, payload: Any) -> Optional[str]:
+        """
+        Validate a payload against every schema matching its topic.
+
+        :return: None if the payload is valid, otherwise a description of the error.
+        """
+        for validator in self._validators_for(topic):
+            error = validator(payload)
+            if error:
+                return error
+        return None
@@ -22,11 +22,27 @@ setup(
         "paho-mqtt==1.6.1",
     ],
     extras_require={
+        "numpy": [
+            "numpy"
+        ],
+        "parquet": [
+            "pyarrow"
+        ],
+        "compression": [
+            "zstandard",
+            "lz4"
+        ],
         "dev": [
             "pytest==8.4.1",
             "pytest-mock==3.14.1",
             "coverage==7.9.1",
-            "pytest-cov==6.2.1"
+            "pytest-cov==6.2.1",
+            "numpy"
+        ]
+    },
+    entry_points={
+        "console_scripts": [
+            "fp-mqtt-bench=fp_mqtt_broker.bench:main"
         ]
     },
     python_requires=">=3.8"
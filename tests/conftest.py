@@ -30,12 +30,13 @@ class MockMQTTClient(MQTTClient):
     def subscribe(self, topic: str, qos: int = 0) -> None:
         self.subscribed_topics.add(topic)
         
-    def publish(self, topic: str, payload: str, qos: int = 0) -> bool:
+    def publish(self, topic: str, payload: str, qos: int = 0, **properties) -> bool:
         if self.connected:
             self.published_messages.append({
                 'topic': topic,
                 'payload': payload,
                 'qos': qos,
+                'properties': properties,
                 'timestamp': time.time()
             })
             return True
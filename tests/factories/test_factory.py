@@ -1,6 +1,8 @@
 import pytest
 from fp_mqtt_broker.factories.broker_factory import BrokerFactory
+from unittest.mock import patch
 from fp_mqtt_broker import MQTTBroker
+from fp_mqtt_broker.implementations import FederatedMQTTClient, InMemoryMQTTClient, InMemoryMQTTHub
 from tests.conftest import TestMessageHandler
 
 
@@ -56,4 +58,50 @@ class TestBrokerFactory:
         assert isinstance(broker, MQTTBroker)
         assert broker.config.broker_host == 'test.com'
         assert broker.config.broker_port == 1883  # Default
-        assert broker.config.client_id == 'mqtt_client'  # Default
\ No newline at end of file
+        assert broker.config.client_id == 'mqtt_client'  # Default
+
+    @patch('fp_mqtt_broker.factories.broker_factory.PahoMQTTClient')
+    def test_create_broker_mqtt_v5(self, mock_paho_client):
+        """Test creating broker passes MQTT v5 options to the client"""
+        config = {'mqtt': {'client_id': 'v5_client', 'protocol_version': 5, 'session_expiry_interval': 120}}
+        
+        BrokerFactory.create_broker(config)
+        
+        mock_paho_client.assert_called_once_with('v5_client', protocol_version=5, session_expiry_interval=120,
+                                                 max_inflight_messages=20, clean_session=True, transport='tcp',
+                                                 unix_socket_path=None, tcp_nodelay=True, socket_send_buffer=None,
+                                                 socket_receive_buffer=None, websocket_path='/mqtt',
+                                                 websocket_headers=None)
+
+    @patch('fp_mqtt_broker.factories.broker_factory.PahoMQTTClient')
+    def test_create_broker_transport_options(self, mock_paho_client):
+        """Test creating broker passes the transport options to the client"""
+        config = {'mqtt': {'client_id': 'local', 'transport': 'unix', 'unix_socket_path': '/run/mosquitto.sock',
+                           'socket_send_buffer': 65536}}
+
+        BrokerFactory.create_broker(config)
+
+        kwargs = mock_paho_client.call_args.kwargs
+        assert kwargs['transport'] == 'unix'
+        assert kwargs['unix_socket_path'] == '/run/mosquitto.sock'
+        assert kwargs['socket_send_buffer'] == 65536
+        assert kwargs['tcp_nodelay'] is True
+
+    def test_create_in_memory_broker(self, basic_config):
+        """Test creating a broker connected to an in-process hub"""
+        hub = InMemoryMQTTHub()
+        
+        broker = BrokerFactory.create_in_memory_broker(basic_config, hub=hub)
+        
+        assert isinstance(broker.client, InMemoryMQTTClient)
+        assert broker.client.hub is hub
+
+    def test_create_federated_broker(self, basic_config):
+        """Test several upstreams create a federated client with one paho client each"""
+        basic_config['mqtt']['upstreams'] = ['a:1883', 'b:1883']
+
+        broker = BrokerFactory.create_broker(basic_config)
+
+        assert isinstance(broker.client, FederatedMQTTClient)
+        assert broker.client.upstreams == [('a', 1883), ('b', 1883)]
+        assert [client._client._client_id for client in broker.client.clients] == [b'test_client-0', b'test_client-1']
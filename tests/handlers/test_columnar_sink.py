@@ -0,0 +1,120 @@
+import csv
+import gzip
+import json
+import time
+
+import pytest
+from fp_mqtt_broker import MQTTBroker
+from fp_mqtt_broker.handlers import ColumnarSink
+from fp_mqtt_broker.handlers.columnar_sink import flatten_payload
+from fp_mqtt_broker.message import Message
+
+
+def make_message(topic, payload, received_at=1.0):
+    return Message(topic, json.dumps(payload).encode(), json.loads, received_at=received_at)
+
+
+def written_files(directory):
+    return sorted(path for path in directory.rglob('*') if path.is_file())
+
+
+@pytest.mark.unit
+class TestColumnarSink:
+    """Test cases for ColumnarSink"""
+
+    def test_flatten_payload(self):
+        """Test nested fields become dotted columns and lists JSON strings"""
+        assert flatten_payload({'a': 1, 'env': {'hum': 2, 'tags': ['x']}}) == {'a': 1, 'env.hum': 2, 'env.tags': '["x"]'}
+        assert flatten_payload(3) == {'value': 3}
+
+    def test_npz_batches_on_size(self, tmp_path):
+        """Test full batches are written as typed columns by the background thread"""
+        np = pytest.importorskip('numpy')
+        sink = ColumnarSink(['sensors/+'], str(tmp_path), max_rows=3, file_format='npz')
+        try:
+            for i in range(4):
+                payload = {'temp': 20 + i, 'env': {'hum': 0.5}, 'ok': True, 'id': f'd{i}'}
+                if i == 1:
+                    payload['extra'] = 'x'
+                sink.handle(make_message('sensors/a', payload, 100.0 + i))
+
+            deadline = time.monotonic() + 5
+            while sink.files_written < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert sink.pending_rows() == 1
+        finally:
+            sink.close()
+
+        first, second = written_files(tmp_path)
+        assert first.parent == tmp_path / 'sensors' / 'a'
+        columns = np.load(first)
+        assert columns['temp'].dtype == np.int64
+        assert columns['temp'].tolist() == [20, 21, 22]
+        assert columns['env.hum'].tolist() == [0.5, 0.5, 0.5]
+        assert columns['ok'].dtype == bool
+        assert columns['extra'].tolist() == ['', 'x', '']
+        assert columns['received_at'].tolist() == [100.0, 101.0, 102.0]
+        assert np.load(second)['temp'].tolist() == [23]
+        assert sink.rows_written == 4
+
+    def test_batches_on_age(self, tmp_path):
+        """Test batches older than max_age are written without being full"""
+        sink = ColumnarSink(['sensors/+'], str(tmp_path), max_rows=1000, max_age=0.05, file_format='csv')
+        try:
+            sink.handle(make_message('sensors/a', {'temp': 1}))
+            deadline = time.monotonic() + 5
+            while sink.files_written < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            sink.close()
+
+        assert sink.files_written == 1
+
+    def test_csv_fallback_with_selected_fields(self, tmp_path):
+        """Test gzipped CSV output keeps only the selected fields"""
+        sink = ColumnarSink(['sensors/+'], str(tmp_path), fields=['temp', 'env.hum'], file_format='csv')
+        sink.handle(make_message('sensors/a', {'temp': 1, 'env': {'hum': 2}, 'other': 3}))
+        sink.handle(make_message('sensors/a', {'temp': 1.5}))
+        sink.close()
+
+        path, = written_files(tmp_path)
+        assert path.name.endswith('.csv.gz')
+        with gzip.open(path, 'rt', newline='') as output:
+            rows = list(csv.reader(output))
+        assert rows == [['temp', 'env.hum', 'received_at'], ['1.0', '2', '1.0'], ['1.5', '', '1.0']]
+
+    def test_parquet(self, tmp_path):
+        """Test Parquet output when pyarrow is installed"""
+        pytest.importorskip('pyarrow')
+        import pyarrow.parquet
+        sink = ColumnarSink(['sensors/+'], str(tmp_path), file_format='parquet')
+        sink.handle(make_message('sensors/a', {'temp': 1, 'id': 'x'}))
+        sink.handle(make_message('sensors/a', {'temp': 2.5, 'id': 3}))
+        sink.close()
+
+        path, = written_files(tmp_path)
+        table = pyarrow.parquet.read_table(path)
+        assert table.column('temp').to_pylist() == [1.0, 2.5]
+        assert table.column('id').to_pylist() == ['x', '3']
+
+    def test_unsupported_format(self, tmp_path):
+        """Test an unknown format is refused"""
+        with pytest.raises(ValueError):
+            ColumnarSink(['sensors/+'], str(tmp_path), file_format='xlsx')
+
+    def test_broker_shutdown_closes_thread(self, tmp_path, broker_config, mock_mqtt_client):
+        """Test the background writer starts with the first message and stops on broker shutdown"""
+        sink = ColumnarSink(['sensors/+'], str(tmp_path), file_format='csv')
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [sink])
+        assert sink._thread is None
+
+        mock_mqtt_client.simulate_message('sensors/a', {'temp': 1})
+        thread = sink._thread
+        assert thread.is_alive()
+
+        report = broker.shutdown(timeout=2)
+
+        assert report.failed_flushes == []
+        assert not thread.is_alive()
+        assert sink._thread is None
+        assert len(written_files(tmp_path)) == 1
@@ -0,0 +1,39 @@
+import pytest
+from unittest.mock import Mock
+from fp_mqtt_broker.handlers import RequestResponder
+
+
+@pytest.mark.unit
+class TestRequestResponder:
+    """Test cases for RequestResponder"""
+
+    def test_replies_with_result(self):
+        """Test the responder publishes the result to the reply topic"""
+        publish = Mock(return_value=True)
+        responder = RequestResponder(['devices/cmd'], lambda topic, payload: {'echo': payload}, publish)
+
+        responder.handle_message('devices/cmd', {'correlation_id': 'c1', 'reply_to': 'app/reply', 'payload': 5})
+
+        publish.assert_called_once_with('app/reply', {'correlation_id': 'c1', 'payload': {'echo': 5}}, 1)
+        assert responder.get_subscribed_topics() == ['devices/cmd']
+
+    def test_replies_with_error(self):
+        """Test exceptions are sent back as errors"""
+        publish = Mock(return_value=True)
+        responder = RequestResponder(['cmd'], Mock(side_effect=ValueError('bad command')), publish)
+
+        responder.handle_message('cmd', {'correlation_id': 'c1', 'reply_to': 'reply', 'payload': None})
+
+        publish.assert_called_once_with('reply', {'correlation_id': 'c1', 'payload': None, 'error': 'bad command'}, 1)
+
+    def test_ignores_non_requests(self):
+        """Test messages without request fields are ignored"""
+        publish = Mock()
+        respond = Mock()
+        responder = RequestResponder(['cmd'], respond, publish)
+
+        responder.handle_message('cmd', {'payload': 1})
+        responder.handle_message('cmd', [1, 2])
+
+        respond.assert_not_called()
+        publish.assert_not_called()
@@ -0,0 +1,88 @@
+import pytest
+from unittest.mock import Mock
+from fp_mqtt_broker.handlers import WindowedAggregator
+from tests.conftest import TestMessageHandler
+
+pytest.importorskip('numpy')
+
+
+@pytest.mark.unit
+class TestWindowedAggregator:
+    """Test cases for WindowedAggregator"""
+
+    def test_tumbling_window(self):
+        """Test statistics are emitted once per full tumbling window"""
+        on_window = Mock()
+        aggregator = WindowedAggregator(['sensors/+'], ['temp'], window_size=4,
+                                        statistics=['mean', 'min', 'max', 'p50'], on_window=on_window)
+
+        for i, value in enumerate([1, 2, 3, 4, 5, 6, 7]):
+            aggregator.handle_message('sensors/a', {'temp': value, 'timestamp': 100 + i})
+
+        on_window.assert_called_once()
+        topic, result = on_window.call_args.args
+        assert topic == 'sensors/a/stats'
+        assert result['fields']['temp'] == {'mean': 2.5, 'min': 1.0, 'max': 4.0, 'p50': 2.5}
+        assert result['window_start'] == 100
+        assert result['window_end'] == 103
+        assert result['count'] == 4
+
+    def test_sliding_window(self):
+        """Test sliding windows emit every step samples"""
+        on_window = Mock()
+        aggregator = WindowedAggregator(['s'], ['v'], window_size=3, step=1, statistics=['sum'], on_window=on_window)
+
+        for value in [1, 2, 3, 4]:
+            aggregator.handle_message('s', {'v': value})
+
+        sums = [call.args[1]['fields']['v']['sum'] for call in on_window.call_args_list]
+        assert sums == [6.0, 9.0]
+
+    def test_topics_aggregated_separately(self):
+        """Test each topic has its own window"""
+        on_window = Mock()
+        aggregator = WindowedAggregator(['s/#'], ['v'], window_size=2, statistics=['max'], on_window=on_window)
+
+        aggregator.handle_message('s/a', {'v': 1})
+        aggregator.handle_message('s/b', {'v': 10})
+        aggregator.handle_message('s/a', {'v': 2})
+
+        on_window.assert_called_once()
+        assert on_window.call_args.args[1]['fields']['v']['max'] == 2.0
+
+    def test_nested_and_missing_fields(self):
+        """Test dotted field paths and fields missing from every sample"""
+        on_window = Mock()
+        aggregator = WindowedAggregator(['s'], ['env.temp', 'humidity'], window_size=2,
+                                        statistics=['mean'], on_window=on_window)
+
+        aggregator.handle_message('s', {'env': {'temp': 20}, 'humidity': 'n/a'})
+        aggregator.handle_message('s', {'env': {'temp': 22}})
+
+        fields = on_window.call_args.args[1]['fields']
+        assert fields['env.temp']['mean'] == 21.0
+        assert fields['humidity']['mean'] is None
+
+    def test_emits_to_handlers_and_publish(self):
+        """Test results are passed to downstream handlers and published"""
+        downstream = TestMessageHandler(['s/stats'])
+        publish = Mock(return_value=True)
+        aggregator = WindowedAggregator(['s'], ['v'], window_size=1, statistics=['mean'],
+                                        handlers=[downstream], publish=publish, output_topic='stats/{topic}')
+
+        aggregator.handle_message('s', {'v': 3})
+
+        assert downstream.received_messages[0]['topic'] == 'stats/s'
+        publish.assert_called_once_with('stats/s', downstream.received_messages[0]['payload'])
+        assert aggregator.get_subscribed_topics() == ['s']
+
+    @pytest.mark.parametrize('statistics', [['median'], ['p101']])
+    def test_invalid_statistic(self, statistics):
+        """Test rejecting unknown statistics"""
+        with pytest.raises(ValueError):
+            WindowedAggregator(['s'], ['v'], window_size=2, statistics=statistics)
+
+    def test_invalid_window(self):
+        """Test rejecting invalid window sizes"""
+        with pytest.raises(ValueError):
+            WindowedAggregator(['s'], ['v'], window_size=0)
@@ -0,0 +1,171 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from fp_mqtt_broker.implementations import FederatedMQTTClient, InMemoryMQTTClient, InMemoryMQTTHub
+
+
+def wait_until(condition, timeout=1.0):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        event.wait(0.01)
+    return condition()
+
+
+@pytest.fixture
+def hubs():
+    return [InMemoryMQTTHub(), InMemoryMQTTHub()]
+
+
+@pytest.fixture
+def federated(hubs):
+    clients = [InMemoryMQTTClient(f"fed-{index}", hub) for index, hub in enumerate(hubs)]
+    client = FederatedMQTTClient(clients, [('a', 1883), ('b', 1883)])
+    yield client
+    client.loop_stop()
+
+
+@pytest.mark.unit
+class TestFederatedMQTTClient:
+    """Test cases for FederatedMQTTClient"""
+
+    def test_requires_client_per_upstream(self):
+        with pytest.raises(ValueError):
+            FederatedMQTTClient([InMemoryMQTTClient('x')], [])
+
+    def test_connect_notifies_once(self, federated):
+        on_connect = Mock()
+        federated.set_on_connect_callback(on_connect)
+
+        federated.connect('ignored', 0, 60)
+        federated.loop_start()
+
+        assert wait_until(lambda: len(federated.connected_upstreams()) == 2)
+        assert wait_until(lambda: on_connect.call_count == 1)
+        assert federated.is_connected()
+
+    def test_refusal_forwarded_once_every_upstream_refused(self):
+        clients = [Mock(), Mock()]
+        federated = FederatedMQTTClient(clients, [('a', 1), ('b', 2)])
+        on_connect = Mock()
+        federated.set_on_connect_callback(on_connect)
+        federated.connect('ignored', 0, 60)
+        handlers = [client.set_on_connect_callback.call_args[0][0] for client in clients]
+
+        handlers[0](clients[0], None, {}, 3)
+        on_connect.assert_not_called()
+        clients[1].is_connected.return_value = True
+        handlers[1](clients[1], None, {}, 0)
+        assert on_connect.call_args[0][3] == 0
+
+        federated.connect('ignored', 0, 60)
+        federated._connected = [False, False]
+        handlers[0](clients[0], None, {}, 3)
+        handlers[1](clients[1], None, {}, 5)
+        assert on_connect.call_count == 2
+        assert on_connect.call_args[0][3] == 5
+
+    def test_subscribes_on_every_upstream(self, federated, hubs):
+        received = []
+        federated.set_on_message_callback(lambda client, userdata, msg: received.append(msg.topic))
+        federated.connect('ignored', 0, 60)
+        federated.loop_start()
+        assert wait_until(lambda: all(federated._connected))
+        federated.subscribe('devices/#')
+
+        hubs[0].publish('devices/1', b'{}', 0, False)
+        hubs[1].publish('devices/2', b'{}', 0, False)
+
+        assert wait_until(lambda: sorted(received) == ['devices/1', 'devices/2'])
+
+    def test_publish_routed_by_topic(self, federated, hubs):
+        federated.connect('ignored', 0, 60)
+        federated.loop_start()
+        assert wait_until(lambda: all(federated._connected))
+        observers = []
+        for index, hub in enumerate(hubs):
+            observer = InMemoryMQTTClient(f"observer-{index}", hub)
+            observer.connect('', 0, 0)
+            observer.subscribe('#')
+            hub_messages = []
+            observer.set_on_message_callback(lambda client, userdata, msg, out=hub_messages: out.append(msg.topic))
+            observer.loop_start()
+            observers.append((observer, hub_messages))
+
+        topics = [f"devices/{index}/data" for index in range(40)]
+        for topic in topics * 2:
+            assert federated.publish(topic, b'{}')
+
+        assert wait_until(lambda: sum(len(messages) for _, messages in observers) == 80)
+        per_hub = [set(messages) for _, messages in observers]
+        assert per_hub[0] and per_hub[1]
+        assert not per_hub[0] & per_hub[1]
+        for observer, _ in observers:
+            observer.loop_stop()
+
+    def test_failover(self, federated):
+        disconnected = Mock()
+        federated.set_on_disconnect_callback(disconnected)
+        federated.connect('ignored', 0, 60)
+        federated.loop_start()
+        assert wait_until(lambda: all(federated._connected))
+        topic = 'devices/1/data'
+        owner = federated.route(topic)
+
+        owner.disconnect()
+
+        fallback = federated.route(topic)
+        assert fallback is not None and fallback is not owner
+        assert federated.publish(topic, b'{}')
+        assert federated.publish_with_ack(topic, b'{}', 1).result(1) is True
+        disconnected.assert_not_called()
+
+        fallback.disconnect()
+        assert federated.route(topic) is None
+        assert not federated.publish(topic, b'{}')
+        with pytest.raises(ConnectionError):
+            federated.publish_with_ack(topic, b'{}', 1).result(1)
+        assert wait_until(lambda: disconnected.call_count == 1)
+
+    def test_reconnected_upstream_restores_subscriptions(self, federated, hubs):
+        received = []
+        federated.set_on_message_callback(lambda client, userdata, msg: received.append(msg.topic))
+        federated.connect('ignored', 0, 60)
+        federated.loop_start()
+        assert wait_until(lambda: all(federated._connected))
+        federated.subscribe('devices/#')
+        federated.clients[0].disconnect()
+        assert wait_until(lambda: not federated._connected[0])
+
+        federated.reconnect()
+        assert wait_until(lambda: federated._connected[0])
+        hubs[0].publish('devices/1', b'{}', 0, False)
+
+        assert wait_until(lambda: received == ['devices/1'])
+
+    def test_reconnect_from_disconnect_callback(self):
+        clients = [Mock(), Mock()]
+        federated = FederatedMQTTClient(clients, [('a', 1), ('b', 2)])
+        federated.set_on_disconnect_callback(lambda client, userdata, rc: federated.reconnect())
+        connect_handlers = [client.set_on_connect_callback.call_args[0][0] for client in clients]
+        disconnect_handlers = [client.set_on_disconnect_callback.call_args[0][0] for client in clients]
+        for client, handler in zip(clients, connect_handlers):
+            handler(client, None, {}, 0)
+
+        disconnect_handlers[0](clients[0], None, 1)
+        disconnect_handlers[1](clients[1], None, 1)
+
+        clients[0].reconnect.assert_not_called()
+        clients[1].reconnect.assert_called_once()
+
+    def test_connect_fails_when_no_upstream_reachable(self):
+        clients = [Mock(), Mock()]
+        for client in clients:
+            client.connect.side_effect = OSError('refused')
+        federated = FederatedMQTTClient(clients, [('a', 1), ('b', 2)])
+
+        with pytest.raises(ConnectionError):
+            federated.connect('ignored', 0, 60)
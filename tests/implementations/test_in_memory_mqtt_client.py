@@ -0,0 +1,94 @@
+import pytest
+from unittest.mock import Mock
+from fp_mqtt_broker.implementations import InMemoryMQTTClient, InMemoryMQTTHub
+
+
+def _collect(client):
+    """Record the messages delivered to a client"""
+    messages = []
+    client.set_on_message_callback(lambda c, userdata, msg: messages.append(msg))
+    return messages
+
+
+def _drain(client):
+    """Run the client's queued callbacks on the calling thread"""
+    client._events.put(("stop", None))
+    client._loop()
+
+
+@pytest.mark.unit
+class TestInMemoryMQTTClient:
+    """Test cases for InMemoryMQTTClient and InMemoryMQTTHub"""
+
+    def test_publish_subscribe(self):
+        """Test messages are routed to matching subscribers"""
+        hub = InMemoryMQTTHub()
+        publisher = InMemoryMQTTClient('pub', hub)
+        subscriber = InMemoryMQTTClient('sub', hub)
+        received = _collect(subscriber)
+        publisher.connect('localhost', 1883, 60)
+        subscriber.connect('localhost', 1883, 60)
+        subscriber.subscribe('sensors/+', qos=1)
+
+        assert publisher.publish('sensors/a', '{"v": 1}', qos=1) is True
+        assert publisher.publish('other/a', '{"v": 2}') is True
+        _drain(subscriber)
+
+        assert [(msg.topic, msg.payload, msg.qos) for msg in received] == [('sensors/a', b'{"v": 1}', 1)]
+
+    def test_publish_disconnected(self):
+        """Test publishing fails when not connected"""
+        client = InMemoryMQTTClient('pub', InMemoryMQTTHub())
+
+        assert client.publish('a', '{}') is False
+        assert client.is_connected() is False
+
+    def test_shared_subscription_round_robin(self):
+        """Test shared subscriptions deliver each message to one group member"""
+        hub = InMemoryMQTTHub()
+        publisher = InMemoryMQTTClient('pub', hub)
+        publisher.connect('localhost', 1883, 60)
+        members = [InMemoryMQTTClient(f'member-{i}', hub) for i in range(2)]
+        received = [_collect(member) for member in members]
+        for member in members:
+            member.subscribe('$share/group/jobs/#')
+
+        for i in range(4):
+            publisher.publish('jobs/run', str(i))
+        for member in members:
+            _drain(member)
+
+        assert [len(messages) for messages in received] == [2, 2]
+
+    def test_unsubscribe_and_disconnect(self):
+        """Test unsubscribed and disconnected clients stop receiving messages"""
+        hub = InMemoryMQTTHub()
+        publisher = InMemoryMQTTClient('pub', hub)
+        publisher.connect('localhost', 1883, 60)
+        first = InMemoryMQTTClient('first', hub)
+        second = InMemoryMQTTClient('second', hub)
+        first.subscribe('a')
+        second.subscribe('$share/g/a')
+
+        first.unsubscribe('a')
+        second.disconnect()
+
+        assert hub.publish('a', b'', 0, False) == 0
+
+    def test_callbacks_on_loop_thread(self):
+        """Test connect, message and disconnect callbacks run on the loop thread"""
+        client = InMemoryMQTTClient('client', InMemoryMQTTHub())
+        on_connect = Mock()
+        on_disconnect = Mock()
+        client.set_on_connect_callback(on_connect)
+        client.set_on_disconnect_callback(on_disconnect)
+        client.loop_start()
+
+        client.connect('localhost', 1883, 60)
+        client.reconnect()
+        client.disconnect()
+        client.loop_stop()
+
+        assert on_connect.call_count == 2
+        on_connect.assert_called_with(client, None, {'session present': 0}, 0)
+        on_disconnect.assert_called_once_with(client, None, 0)
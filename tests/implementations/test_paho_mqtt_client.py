@@ -1,6 +1,7 @@
+import socket
 import pytest
 import paho.mqtt.client as mqtt
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 from fp_mqtt_broker.implementations.paho_mqtt_client import PahoMQTTClient
 
 
@@ -13,7 +14,15 @@ class TestPahoMQTTClient:
         """Test client initialization"""
         PahoMQTTClient('test_client')
         
-        mock_mqtt_client.assert_called_once_with('test_client')
+        mock_mqtt_client.assert_called_once_with('test_client', protocol=mqtt.MQTTv311)
+
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_initialization_mqtt_v5(self, mock_mqtt_client):
+        """Test client initialization with MQTT v5"""
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5)
+        
+        mock_mqtt_client.assert_called_once_with('test_client', protocol=mqtt.MQTTv5)
+        assert client.is_mqtt_v5 is True
 
     @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
     def test_connect(self, mock_mqtt_client):
@@ -25,7 +34,67 @@ class TestPahoMQTTClient:
         client.connect('localhost', 1883, 60)
         
         mock_instance.connect.assert_called_once_with('localhost', 1883, 60)
+
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_connect_mqtt_v5_session_expiry(self, mock_mqtt_client):
+        """Test MQTT v5 connection sends the session expiry interval"""
+        mock_instance = Mock()
+        mock_mqtt_client.return_value = mock_instance
+        
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5, session_expiry_interval=300)
+        client.connect('localhost', 1883, 60)
+        
+        properties = mock_instance.connect.call_args.kwargs['properties']
+        assert properties.SessionExpiryInterval == 300
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_connect_mqtt_v5_without_properties(self, mock_mqtt_client):
+        """Test MQTT v5 connection without session expiry sends no properties"""
+        mock_instance = Mock()
+        mock_mqtt_client.return_value = mock_instance
+        
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5)
+        client.connect('localhost', 1883, 60)
+        
+        mock_instance.connect.assert_called_once_with('localhost', 1883, 60, properties=None)
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_persistent_session_mqtt_v311(self, mock_mqtt_client):
+        """Test MQTT v3.1.1 persistent sessions disable the clean session flag"""
+        PahoMQTTClient('test_client', clean_session=False)
         
+        mock_mqtt_client.assert_called_once_with('test_client', clean_session=False, protocol=mqtt.MQTTv311)
+
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_persistent_session_mqtt_v5(self, mock_mqtt_client):
+        """Test MQTT v5 persistent sessions connect without clean start"""
+        mock_instance = Mock()
+        mock_mqtt_client.return_value = mock_instance
+        
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5, session_expiry_interval=3600,
+                                clean_session=False)
+        client.connect('localhost', 1883, 60)
+        
+        assert mock_instance.connect.call_args.kwargs['clean_start'] is False
+        assert mock_instance.connect.call_args.kwargs['properties'].SessionExpiryInterval == 3600
+
+    def test_persistent_session_mqtt_v5_needs_expiry(self):
+        """Test MQTT v5 persistent sessions require a session expiry interval"""
+        with pytest.raises(ValueError):
+            PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5, clean_session=False)
+
+    def test_unacknowledged_messages(self):
+        """Test QoS > 0 messages waiting for their acknowledgement are reported"""
+        client = PahoMQTTClient('test_client')
+        client._client._sock = Mock()
+        client._client._state = mqtt.mqtt_cs_connected
+        client._client._send_publish = Mock(return_value=mqtt.MQTT_ERR_SUCCESS)
+        
+        client.publish('a', b'one', 0)
+        client.publish('b', b'two', 1)
+        
+        assert client.unacknowledged_messages() == [('b', b'two', 1)]
+
     @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
     def test_disconnect(self, mock_mqtt_client):
         """Test disconnecting from broker"""
@@ -58,6 +127,17 @@ class TestPahoMQTTClient:
         client.subscribe('test/topic', qos=1)
         
         mock_instance.subscribe.assert_called_once_with('test/topic', 1)
+
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_unsubscribe(self, mock_mqtt_client):
+        """Test unsubscribing from topic"""
+        mock_instance = Mock()
+        mock_mqtt_client.return_value = mock_instance
+        
+        client = PahoMQTTClient('test_client')
+        client.unsubscribe('test/topic')
+        
+        mock_instance.unsubscribe.assert_called_once_with('test/topic')
         
     @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
     def test_publish_success(self, mock_mqtt_client):
@@ -132,4 +212,254 @@ class TestPahoMQTTClient:
         
         assert mock_instance.on_connect == connect_callback
         assert mock_instance.on_message == message_callback
-        assert mock_instance.on_disconnect == disconnect_callback
\ No newline at end of file
+        assert mock_instance.on_disconnect == disconnect_callback
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_mqtt_v5_topic_alias(self, mock_mqtt_client):
+        """Test MQTT v5 publishes omit the topic once its alias is established"""
+        mock_instance = Mock()
+        mock_instance.publish.return_value = Mock(rc=0)
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5)
+        connect_callback = Mock()
+        client.set_on_connect_callback(connect_callback)
+        connack_properties = Mock(TopicAliasMaximum=10)
+        mock_instance.on_connect(mock_instance, None, {}, 0, connack_properties)
+        
+        assert client.publish('devices/site-1/sensor-42/temperature', '{}') is True
+        assert client.publish('devices/site-1/sensor-42/temperature', '{}') is True
+        
+        first, second = mock_instance.publish.call_args_list
+        assert first.args[0] == 'devices/site-1/sensor-42/temperature'
+        assert first.kwargs['properties'].TopicAlias == 1
+        assert second.args[0] == ''
+        assert second.kwargs['properties'].TopicAlias == 1
+        connect_callback.assert_called_once_with(mock_instance, None, {}, 0, connack_properties)
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_mqtt_v5_aliases_reset_on_disconnect(self, mock_mqtt_client):
+        """Test topic aliases are forgotten on disconnect and unused while disconnected"""
+        mock_instance = Mock()
+        mock_instance.publish.return_value = Mock(rc=0)
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5)
+        disconnect_callback = Mock()
+        client.set_on_disconnect_callback(disconnect_callback)
+        mock_instance.on_connect(mock_instance, None, {}, 0, Mock(TopicAliasMaximum=10))
+        client.publish('devices/1', '{}')
+        
+        mock_instance.on_disconnect(mock_instance, None, 7, None)
+        assert len(client._topic_aliases) == 0
+        disconnect_callback.assert_called_once_with(mock_instance, None, 7, None)
+        
+        mock_instance.is_connected.return_value = False
+        mock_instance.on_connect(mock_instance, None, {}, 0, Mock(TopicAliasMaximum=10))
+        client.publish('devices/1', '{}')
+        offline = mock_instance.publish.call_args
+        assert offline.args[0] == 'devices/1'
+        assert not hasattr(offline.kwargs['properties'], 'TopicAlias')
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_mqtt_v5_qos1_skips_alias(self, mock_mqtt_client):
+        """Test QoS 1 publishes always carry the full topic"""
+        mock_instance = Mock()
+        mock_instance.publish.return_value = Mock(rc=0)
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5)
+        client.set_on_connect_callback(Mock())
+        mock_instance.on_connect(mock_instance, None, {}, 0, Mock(TopicAliasMaximum=10))
+        
+        client.publish('a/b', '{}', qos=1)
+        client.publish('a/b', '{}', qos=1)
+        
+        for call in mock_instance.publish.call_args_list:
+            assert call.args[0] == 'a/b'
+            assert not hasattr(call.kwargs['properties'], 'TopicAlias')
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_mqtt_v5_properties(self, mock_mqtt_client):
+        """Test content type and message expiry are sent as publish properties"""
+        mock_instance = Mock()
+        mock_instance.publish.return_value = Mock(rc=0)
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client', protocol_version=mqtt.MQTTv5)
+        
+        client.publish('a/b', '{}', content_type='application/json', message_expiry_interval=30)
+        
+        properties = mock_instance.publish.call_args.kwargs['properties']
+        assert properties.ContentType == 'application/json'
+        assert properties.MessageExpiryInterval == 30
+        assert not hasattr(properties, 'TopicAlias')
+
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_max_inflight_messages(self, mock_mqtt_client):
+        """Test the in-flight window is applied to paho"""
+        mock_instance = MagicMock()
+        mock_mqtt_client.return_value = mock_instance
+        
+        PahoMQTTClient('test_client', max_inflight_messages=5)
+        
+        mock_instance.max_inflight_messages_set.assert_called_once_with(5)
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_with_ack_completed_on_puback(self, mock_mqtt_client):
+        """Test QoS 1 futures complete when paho reports the acknowledgement"""
+        mock_instance = MagicMock()
+        mock_instance.publish.side_effect = [Mock(rc=0, mid=7), Mock(rc=0, mid=8)]
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client')
+        
+        first = client.publish_with_ack('a/b', 'payload', qos=1)
+        second = client.publish_with_ack('a/b', 'payload', qos=1)
+        assert not first.done()
+        assert client.pending_ack_count() == 2
+        
+        mock_instance.on_publish(mock_instance, None, 8)
+        
+        assert second.result(timeout=1) is True
+        assert not first.done()
+        assert client.pending_ack_count() == 1
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_with_ack_window_full(self, mock_mqtt_client):
+        """Test publishing waits for a free in-flight slot"""
+        mock_instance = MagicMock()
+        mock_instance.publish.side_effect = [Mock(rc=0, mid=1), Mock(rc=0, mid=2)]
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client', max_inflight_messages=1)
+        
+        client.publish_with_ack('a/b', 'payload', qos=1)
+        blocked = client.publish_with_ack('a/b', 'payload', qos=1, timeout=0.01)
+        
+        with pytest.raises(TimeoutError):
+            blocked.result(timeout=1)
+        
+        mock_instance.on_publish(mock_instance, None, 1)
+        released = client.publish_with_ack('a/b', 'payload', qos=1, timeout=0.01)
+        assert not released.done()
+        assert client.pending_ack_count() == 1
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_with_ack_failure_releases_window(self, mock_mqtt_client):
+        """Test failed publishes fail their future and free their slot"""
+        mock_instance = MagicMock()
+        mock_instance.publish.side_effect = [Mock(rc=mqtt.MQTT_ERR_QUEUE_SIZE, mid=1), ValueError('bad topic')]
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client', max_inflight_messages=1)
+        
+        with pytest.raises(ConnectionError):
+            client.publish_with_ack('a/b', 'payload', qos=1).result(timeout=1)
+        with pytest.raises(ValueError):
+            client.publish_with_ack('a/b', 'payload', qos=1, timeout=0.01).result(timeout=1)
+        assert client.pending_ack_count() == 0
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_with_ack_queued_while_disconnected(self, mock_mqtt_client):
+        """Test QoS 1 messages paho keeps for the next connection stay pending"""
+        mock_instance = MagicMock()
+        mock_instance.publish.return_value = Mock(rc=mqtt.MQTT_ERR_NO_CONN, mid=3)
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client')
+        
+        future = client.publish_with_ack('a/b', 'payload', qos=1)
+        assert not future.done()
+        assert client.pending_ack_count() == 1
+        
+        mock_instance.on_publish(mock_instance, None, 3)
+        assert future.result(timeout=1) is True
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_fail_pending_acks(self, mock_mqtt_client):
+        """Test failing pending acknowledgements fails their futures and frees the window"""
+        mock_instance = MagicMock()
+        mock_instance.publish.side_effect = [Mock(rc=0, mid=1), Mock(rc=0, mid=2)]
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client', max_inflight_messages=1)
+        pending = client.publish_with_ack('a/b', 'payload', qos=1)
+        
+        assert client.fail_pending_acks(ConnectionError('gone')) == 1
+        
+        with pytest.raises(ConnectionError):
+            pending.result(timeout=1)
+        assert client.pending_ack_count() == 0
+        assert not client.publish_with_ack('a/b', 'payload', qos=1, timeout=0.01).done()
+        
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_publish_with_ack_qos0(self, mock_mqtt_client):
+        """Test QoS 0 futures complete once the message is queued"""
+        mock_instance = MagicMock()
+        mock_instance.publish.side_effect = [Mock(rc=0, mid=1), Mock(rc=mqtt.MQTT_ERR_NO_CONN, mid=2)]
+        mock_mqtt_client.return_value = mock_instance
+        client = PahoMQTTClient('test_client')
+        
+        assert client.publish_with_ack('a/b', 'payload').result(timeout=1) is True
+        with pytest.raises(ConnectionError):
+            client.publish_with_ack('a/b', 'payload').result(timeout=1)
+
+
+@pytest.mark.unit
+class TestPahoMQTTClientTransport:
+    """Test cases for PahoMQTTClient transports and socket options"""
+
+    @patch('fp_mqtt_broker.implementations.paho_mqtt_client.mqtt.Client')
+    def test_websockets(self, mock_mqtt_client):
+        """Test the WebSocket transport and its options are passed to paho"""
+        mock_instance = Mock()
+        mock_mqtt_client.return_value = mock_instance
+
+        PahoMQTTClient('test_client', transport='websockets', websocket_path='/ws', websocket_headers={'X-Id': '1'})
+
+        mock_mqtt_client.assert_called_once_with('test_client', protocol=mqtt.MQTTv311, transport='websockets')
+        mock_instance.ws_set_options.assert_called_once_with(path='/ws', headers={'X-Id': '1'})
+
+    def test_invalid_transport(self):
+        """Test unknown transports and Unix sockets without a path are rejected"""
+        with pytest.raises(ValueError):
+            PahoMQTTClient('test_client', transport='quic')
+        with pytest.raises(ValueError):
+            PahoMQTTClient('test_client', transport='unix')
+
+    def test_tcp_socket_options(self):
+        """Test TCP_NODELAY and buffer sizes are set on the connection socket"""
+        with socket.create_server(('127.0.0.1', 0)) as server:
+            client = PahoMQTTClient('test_client', socket_send_buffer=32768)
+            client.connect('127.0.0.1', server.getsockname()[1], 60)
+            connection, _ = server.accept()
+            try:
+                sock = client._client.socket()
+                assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) != 0
+                # Linux doubles the requested size for bookkeeping
+                assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) >= 32768
+            finally:
+                connection.close()
+                client._client.socket().close()
+
+    def test_tcp_nodelay_disabled(self):
+        """Test Nagle's algorithm is kept when TCP_NODELAY is disabled"""
+        with socket.create_server(('127.0.0.1', 0)) as server:
+            client = PahoMQTTClient('test_client', tcp_nodelay=False)
+            client.connect('127.0.0.1', server.getsockname()[1], 60)
+            connection, _ = server.accept()
+            try:
+                assert client._client.socket().getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) == 0
+            finally:
+                connection.close()
+                client._client.socket().close()
+
+    @pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="Unix domain sockets are not available")
+    def test_unix_socket(self, tmp_path):
+        """Test the unix transport connects to the socket path and sends CONNECT there"""
+        path = str(tmp_path / 'mqtt.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(path)
+            server.listen(1)
+            client = PahoMQTTClient('test_client', transport='unix', unix_socket_path=path)
+            client.connect('ignored.example', 1883, 60)
+            connection, _ = server.accept()
+            try:
+                assert client._client.socket().family == socket.AF_UNIX
+                connection.settimeout(1)
+                # CONNECT packet type
+                assert connection.recv(1) == b'\x10'
+            finally:
+                connection.close()
+                client._client.socket().close()
@@ -0,0 +1,73 @@
+import json
+import pytest
+from fp_mqtt_broker.bench import _broker_config, build_parser, format_report, main, percentile, run_benchmark
+
+
+@pytest.mark.unit
+class TestBench:
+    """Test cases for the fp-mqtt-bench load generator"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == 51
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        assert percentile([], 50) == 0.0
+
+    def test_embedded_benchmark(self):
+        """Test a short benchmark against the in-process hub"""
+        options = build_parser().parse_args([
+            '--embedded', '--devices', '3', '--rate', '50', '--duration', '0.2', '--payload-size', '128'
+        ])
+
+        results = run_benchmark(options)
+
+        assert results['sent'] == 30
+        assert results['received'] == 30
+        assert results['lost'] == 0
+        assert results['latency_ms']['p99'] >= results['latency_ms']['p50'] >= 0
+        assert 'lost:' in format_report(results)
+
+    def test_shared_consumers(self):
+        """Test consumers share the load without duplicates"""
+        options = build_parser().parse_args([
+            '--embedded', '--devices', '2', '--consumers', '3', '--rate', '50', '--duration', '0.1'
+        ])
+
+        results = run_benchmark(options)
+
+        assert results['received'] == results['sent']
+        assert results['duplicates'] == 0
+
+    def test_main_json(self, capsys):
+        """Test the command line entry point"""
+        assert main(['--embedded', '--devices', '1', '--rate', '20', '--duration', '0.1', '--json']) == 0
+
+        results = json.loads(capsys.readouterr().out)
+        assert results['sent'] == 2
+
+    def test_main_connection_failure(self, capsys):
+        """Test the command fails cleanly when the broker is unreachable"""
+        assert main(['--host', '127.0.0.1', '--port', '1', '--devices', '1', '--duration', '0.1']) == 1
+
+        assert 'could not connect' in capsys.readouterr().err
+
+    def test_transport_options(self):
+        """Test transport options end up in the broker configuration"""
+        options = build_parser().parse_args(['--transport', 'unix', '--unix-socket', '/run/mqtt.sock',
+                                             '--no-tcp-nodelay'])
+
+        mqtt_config = _broker_config(options, 'client')['mqtt']
+
+        assert mqtt_config['transport'] == 'unix'
+        assert mqtt_config['unix_socket_path'] == '/run/mqtt.sock'
+        assert mqtt_config['tcp_nodelay'] is False
+
+    def test_unix_transport_needs_socket(self, capsys):
+        """Test the unix transport is rejected without a socket path"""
+        with pytest.raises(SystemExit):
+            main(['--transport', 'unix'])
+
+        assert '--unix-socket' in capsys.readouterr().err
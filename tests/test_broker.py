@@ -2,8 +2,10 @@ import pytest
 import json
 import time
 import threading
+import uuid
+from concurrent.futures import Future
 from unittest.mock import Mock, patch
-from fp_mqtt_broker import MQTTBroker, RecordingState
+from fp_mqtt_broker import BrokerConfig, EnvelopeMessageHandler, MQTTBroker, RecordingState
 from tests.conftest import MockMQTTClient, TestMessageHandler
 
 
@@ -209,6 +211,24 @@ class TestMQTTBroker:
             mqtt_broker.on_disconnect(None, None, 0)  # Zero rc = expected
             mock_reconnect.assert_not_called()
             
+    def test_on_disconnect_fails_pending_acks(self, mqtt_broker, mock_mqtt_client):
+        """Test a disconnect without a persistent session fails the publishes waiting for acks"""
+        mock_mqtt_client.fail_pending_acks = Mock(return_value=1)
+        
+        mqtt_broker.on_disconnect(None, None, 1)
+        
+        mock_mqtt_client.fail_pending_acks.assert_called_once()
+        
+    def test_on_disconnect_persistent_keeps_pending_acks(self, basic_config, mock_mqtt_client):
+        """Test a persistent session keeps pending acks across a disconnect"""
+        basic_config['mqtt']['clean_session'] = False
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client)
+        mock_mqtt_client.fail_pending_acks = Mock(return_value=0)
+        
+        broker.on_disconnect(None, None, 1)
+        
+        mock_mqtt_client.fail_pending_acks.assert_not_called()
+        
     def test_publish_message_connected(self, mqtt_broker, mock_mqtt_client):
         """Test publishing message when connected"""
         def mock_connect(host, port, keepalive):
@@ -292,7 +312,7 @@ class TestMQTTBroker:
 
         command = {'command': 'start_recording', 'timestamp': time.time()}
         
-        mqtt_broker.publish_recording_command(command)
+        assert mqtt_broker.publish_recording_command(command) == {'test/control': True}
         
         assert len(mock_mqtt_client.published_messages) == 1
         published = mock_mqtt_client.published_messages[0]
@@ -330,7 +350,9 @@ class TestMQTTBroker:
         mock_mqtt_client.connect = mock_connect
         mqtt_broker.connect(timeout=1)
         
-        mqtt_broker.signal_handler(2, None)  # SIGINT
+        with patch.object(mqtt_broker, 'shutdown', wraps=mqtt_broker.shutdown) as mock_shutdown:
+            mqtt_broker.signal_handler(2, None)  # SIGINT
+            mock_shutdown.assert_called_once_with()
         
         assert mqtt_broker.service_running is False
         mock_exit.assert_called_once_with(0)
@@ -363,4 +385,780 @@ class TestMQTTBroker:
         result = mqtt_broker.connect(timeout=0.1)  # Very short timeout
         end_time = time.time()
         assert result is False
-        assert end_time - start_time < 0.2  # Ensure it timed out quickly
\ No newline at end of file
+        assert end_time - start_time < 0.2  # Ensure it timed out quickly
+
+    def test_on_message_shared_subscription(self, broker_config, mock_mqtt_client):
+        """Test dispatch strips the shared subscription prefix when matching handlers"""
+        handler = TestMessageHandler(['$share/workers/sensors/+'])
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        
+        mock_mqtt_client.simulate_message('sensors/kitchen', {'value': 1})
+        mock_mqtt_client.simulate_message('other/kitchen', {'value': 2})
+        
+        assert handler.received_messages == [{'topic': 'sensors/kitchen', 'payload': {'value': 1}}]
+
+    def test_on_connect_shared_subscription_group(self, broker_config, mock_mqtt_client):
+        """Test configured share group is applied to subscriptions"""
+        broker_config.shared_subscription_group = 'ingest'
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [TestMessageHandler(['$share/own/a'])])
+        
+        broker.on_connect(None, None, None, 0, properties=None)
+        
+        assert '$share/ingest/test/data' in mock_mqtt_client.subscribed_topics
+        assert '$share/own/a' in mock_mqtt_client.subscribed_topics
+
+    def test_publish_message_with_properties(self, mqtt_broker, mock_mqtt_client):
+        """Test publishing message with MQTT v5 properties"""
+        mock_mqtt_client.connected = True
+        
+        result = mqtt_broker.publish_message('test/topic', {'a': 1}, content_type='application/json', message_expiry_interval=60)
+        
+        assert result is True
+        published = mock_mqtt_client.published_messages[0]
+        assert published['properties'] == {'content_type': 'application/json', 'message_expiry_interval': 60}
+
+    def test_publish_and_receive_compressed(self, broker_config, mock_mqtt_client):
+        """Test large payloads are compressed on publish and decompressed on receive"""
+        broker_config.compression_codec = 'zlib'
+        broker_config.compression_threshold = 128
+        handler = TestMessageHandler(['test/data'])
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        mock_mqtt_client.connected = True
+        payload = {'values': list(range(200))}
+        
+        assert broker.publish_message('test/data', payload) is True
+        data = mock_mqtt_client.published_messages[0]['payload']
+        assert isinstance(data, bytes)
+        assert len(data) < len(json.dumps(payload))
+        
+        msg = Mock()
+        msg.topic = 'test/data'
+        msg.payload = data
+        broker.on_message(None, None, msg)
+        
+        assert handler.received_messages == [{'topic': 'test/data', 'payload': payload}]
+
+    def test_on_message_rejects_invalid_payload(self, broker_config, mock_mqtt_client):
+        """Test payloads failing a handler schema are rejected before dispatch"""
+        handler = TestMessageHandler(['test/data'])
+        handler.get_payload_schemas = lambda: {'test/data': {'required': ['value']}}
+        other_handler = TestMessageHandler(['test/data'])
+        broker_config.topics['dead_letter'] = 'test/dead_letter'
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler, other_handler])
+        mock_mqtt_client.connected = True
+        
+        mock_mqtt_client.simulate_message('test/data', {'other': 1})
+        mock_mqtt_client.simulate_message('test/data', {'value': 1})
+        
+        assert broker.rejected_message_count == 1
+        assert handler.received_messages == [{'topic': 'test/data', 'payload': {'value': 1}}]
+        assert other_handler.received_messages == handler.received_messages
+        dead_letter = mock_mqtt_client.published_messages[0]
+        assert dead_letter['topic'] == 'test/dead_letter'
+        assert json.loads(dead_letter['payload'])['payload'] == {'other': 1}
+
+    def test_schema_registry_follows_handlers(self, broker_config, mock_mqtt_client):
+        """Test config and handler schemas are compiled and updated with handlers"""
+        broker_config.payload_schemas = {'test/control': {'type': 'object'}}
+        broker = MQTTBroker(broker_config, mock_mqtt_client)
+        handler = TestMessageHandler(['test/data'])
+        handler.get_payload_schemas = lambda: {'test/data': {'required': ['value']}}
+        
+        broker.add_message_handler(handler)
+        assert len(broker.schema_registry) == 2
+        
+        broker.remove_message_handler(handler)
+        assert len(broker.schema_registry) == 1
+
+    def test_handler_state_ready_before_snapshot(self, broker_config, mock_mqtt_client):
+        """Test schemas and downsamplers of a new handler exist once dispatch can see it"""
+        broker = MQTTBroker(broker_config, mock_mqtt_client)
+        handler = TestMessageHandler(['test/data'])
+        handler.get_payload_schemas = lambda: {'test/data': {'required': ['value']}}
+        handler.get_delivery_policies = lambda: {'test/#': {'keep_every': 2}}
+        seen = []
+        add = broker._registry.add
+
+        def add_checked(added):
+            seen.append((broker.schema_registry.has_schemas('test/data'), broker.get_downsampler(added) is not None))
+            return add(added)
+
+        broker._registry.add = add_checked
+        broker.add_message_handler(handler)
+
+        assert seen == [(True, True)]
+
+    def test_history_from_config(self, broker_config, mock_mqtt_client):
+        """Test configured per-topic history records received samples"""
+        broker_config.history = {'test/data': {'fields': ['value'], 'capacity': 2}}
+        broker = MQTTBroker(broker_config, mock_mqtt_client)
+        
+        for value in [1, 2, 3]:
+            mock_mqtt_client.simulate_message('test/data', {'value': value})
+        
+        assert broker.get_history('test/data').column('value').tolist() == [2.0, 3.0]
+        assert broker.get_history('test/control') is None
+
+    def test_enable_history(self, mqtt_broker, mock_mqtt_client):
+        """Test enabling history at runtime"""
+        assert mqtt_broker.get_history('test/data') is None
+        
+        mqtt_broker.enable_history('test/+', ['value'], capacity=5)
+        mock_mqtt_client.simulate_message('test/data', {'value': 7, 'timestamp': 42.0})
+        
+        history = mqtt_broker.get_history('test/data')
+        assert history.timestamps().tolist() == [42.0]
+        assert history.column('value').tolist() == [7.0]
+
+    def test_request_response(self, mqtt_broker, mock_mqtt_client):
+        """Test a request is completed by the matching reply"""
+        mock_mqtt_client.connected = True
+        
+        future = mqtt_broker.request('devices/cmd', {'action': 'start'}, timeout=5)
+        
+        assert 'test_client/reply' in mock_mqtt_client.subscribed_topics
+        request = json.loads(mock_mqtt_client.published_messages[0]['payload'])
+        assert request['reply_to'] == 'test_client/reply'
+        assert request['payload'] == {'action': 'start'}
+        assert mock_mqtt_client.published_messages[0]['qos'] == 1
+        
+        mock_mqtt_client.simulate_message('test_client/reply', {'correlation_id': request['correlation_id'], 'payload': 'ok'})
+        
+        assert future.result(timeout=1) == 'ok'
+        assert len(mqtt_broker.pending_requests) == 0
+
+    def test_request_publish_failure(self, mqtt_broker):
+        """Test a request fails immediately when it cannot be published"""
+        future = mqtt_broker.request('devices/cmd', {}, timeout=5)
+        
+        with pytest.raises(ConnectionError):
+            future.result(timeout=1)
+
+    def test_reply_topic_not_shared(self, broker_config, mock_mqtt_client):
+        """Test the reply topic is never subscribed through the share group"""
+        broker_config.shared_subscription_group = 'ingest'
+        broker = MQTTBroker(broker_config, mock_mqtt_client)
+        broker.request('devices/cmd', {}, timeout=5)
+        
+        broker.on_connect(None, None, None, 0)
+        
+        assert 'test_client/reply' in mock_mqtt_client.subscribed_topics
+        assert '$share/ingest/test/data' in mock_mqtt_client.subscribed_topics
+
+    def test_publish_message_with_ack(self, mqtt_broker, mock_mqtt_client):
+        """Test acknowledged publishing through a client without ack tracking"""
+        mock_mqtt_client.connected = True
+        
+        future = mqtt_broker.publish_message_with_ack('test/topic', {'a': 1}, message_expiry_interval=5)
+        
+        assert future.result(timeout=1) is True
+        assert mock_mqtt_client.published_messages[0]['qos'] == 1
+        assert mock_mqtt_client.published_messages[0]['properties'] == {'message_expiry_interval': 5}
+
+    def test_publish_message_with_ack_disconnected(self, mqtt_broker):
+        """Test acknowledged publishing fails when disconnected"""
+        future = mqtt_broker.publish_message_with_ack('test/topic', {'a': 1})
+        
+        with pytest.raises(ConnectionError):
+            future.result(timeout=1)
+
+    def test_publish_many(self, mqtt_broker, mock_mqtt_client):
+        """Test publishing a batch waits for every acknowledgement"""
+        mock_mqtt_client.connected = True
+        acks = {}
+        def publish_with_ack(topic, payload, qos=0, timeout=None, **properties):
+            acks[topic] = Future()
+            return acks[topic]
+        mock_mqtt_client.publish_with_ack = publish_with_ack
+        threading.Timer(0.05, lambda: acks['a'].set_result(True)).start()
+        
+        results = mqtt_broker.publish_many([('a', {'n': 1}), ('b', {'n': 2})], timeout=0.3)
+        
+        assert results == [True, False]
+
+    def test_publish_many_failures(self, mqtt_broker, mock_mqtt_client):
+        """Test failed publishes are reported in the batch results"""
+        mock_mqtt_client.connected = True
+        acknowledged = Future()
+        acknowledged.set_result(True)
+        mock_mqtt_client.publish_with_ack = Mock(side_effect=[acknowledged, ValueError('boom')])
+        
+        assert mqtt_broker.publish_many([('a', {}), ('b', {})]) == [True, False]
+
+    def test_envelope_handler_skips_decoding(self, broker_config, mock_mqtt_client):
+        """Test payloads are not decoded when no handler reads them"""
+        class RawHandler(EnvelopeMessageHandler):
+            def __init__(self):
+                self.messages = []
+
+            def get_subscribed_topics(self):
+                return ['test/data']
+
+            def handle(self, message):
+                self.messages.append(message)
+
+        handler = RawHandler()
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        mock_msg = Mock()
+        mock_msg.topic = 'test/data'
+        mock_msg.payload = b'{"value": 1}'
+
+        broker.on_message(None, None, mock_msg)
+
+        assert len(handler.messages) == 1
+        assert handler.messages[0].raw == b'{"value": 1}'
+        assert not handler.messages[0].is_decoded
+        assert handler.messages[0].payload == {'value': 1}
+
+    def test_on_message_interns_topics(self, mqtt_broker, test_message_handler):
+        """Test messages on the same topic share one topic string"""
+        for _ in range(2):
+            mock_msg = Mock()
+            mock_msg.topic = ''.join(['test/', 'data'])
+            mock_msg.payload.decode.return_value = json.dumps({'key': 'value'})
+            mqtt_broker.on_message(None, None, mock_msg)
+
+        first, second = test_message_handler.received_messages
+        assert first['topic'] is second['topic']
+
+    def test_message_handlers_snapshot(self, mqtt_broker, test_message_handler):
+        """Test the handler list is an immutable snapshot"""
+        handlers = mqtt_broker.message_handlers
+        mqtt_broker.add_message_handler(TestMessageHandler(['other/topic']))
+
+        assert handlers == (test_message_handler,)
+        assert len(mqtt_broker.message_handlers) == 2
+        with pytest.raises(AttributeError):
+            mqtt_broker.message_handlers.append(test_message_handler)
+
+    def test_set_message_handlers_subscribes_new_topics(self, mqtt_broker, mock_mqtt_client):
+        """Test replacing the handlers subscribes their new topics"""
+        mock_mqtt_client.connected = True
+        mqtt_broker.message_handlers = [TestMessageHandler(['replaced/topic'])]
+
+        assert 'replaced/topic' in mqtt_broker.subscribed_topics
+        assert 'replaced/topic' in mock_mqtt_client.subscribed_topics
+
+    def test_dispatch_during_registration(self, mqtt_broker, test_message_handler):
+        """Test messages keep being dispatched while handlers are registered concurrently"""
+        stop = threading.Event()
+
+        def register():
+            index = 0
+            while not stop.is_set():
+                handler = TestMessageHandler([f"device/{index}"])
+                mqtt_broker.add_message_handler(handler)
+                mqtt_broker.remove_message_handler(handler)
+                index += 1
+
+        writer = threading.Thread(target=register)
+        writer.start()
+        try:
+            mock_msg = Mock()
+            mock_msg.topic = 'test/data'
+            mock_msg.payload.decode.return_value = json.dumps({'key': 'value'})
+            for _ in range(500):
+                mqtt_broker.on_message(None, None, mock_msg)
+        finally:
+            stop.set()
+            writer.join()
+
+        assert len(test_message_handler.received_messages) == 500
+
+    def test_shutdown_clean(self, mqtt_broker, mock_mqtt_client, test_message_handler):
+        """Test a shutdown without pending work unsubscribes, flushes and reports nothing lost"""
+        mock_mqtt_client.connected = True
+        mock_mqtt_client.unsubscribe = Mock()
+        test_message_handler.flush = Mock()
+
+        report = mqtt_broker.shutdown(timeout=1)
+
+        assert report.clean
+        assert mock_mqtt_client.unsubscribe.call_count == len(mqtt_broker.subscribed_topics)
+        test_message_handler.flush.assert_called_once()
+        assert not mock_mqtt_client.connected
+
+    def test_shutdown_refuses_new_messages(self, mqtt_broker, test_message_handler):
+        """Test messages arriving during shutdown are refused and counted"""
+        mqtt_broker.shutdown(timeout=0)
+        mock_msg = Mock()
+        mock_msg.topic = 'test/data'
+        mock_msg.payload.decode.return_value = json.dumps({'key': 'value'})
+
+        mqtt_broker.on_message(None, None, mock_msg)
+
+        assert len(test_message_handler.received_messages) == 0
+        assert mqtt_broker._refused_message_count == 1
+
+    def test_shutdown_reports_losses(self, mqtt_broker, mock_mqtt_client, test_message_handler):
+        """Test unacknowledged publishes and failing flushes are reported"""
+        mock_mqtt_client.connected = True
+        mock_mqtt_client.pending_ack_count = Mock(return_value=2)
+        test_message_handler.flush = Mock(side_effect=RuntimeError('disk full'))
+
+        report = mqtt_broker.shutdown(timeout=0.05)
+
+        assert not report.clean
+        assert report.unacknowledged_publishes == 2
+        assert report.failed_flushes == ['TestMessageHandler']
+
+    def test_shutdown_closes_handler_after_failed_flush(self, mqtt_broker, test_message_handler):
+        """Test a handler whose flush fails is still closed, and the failure reported"""
+        test_message_handler.flush = Mock(side_effect=RuntimeError('disk full'))
+        test_message_handler.close = Mock()
+
+        report = mqtt_broker.shutdown(timeout=0)
+
+        test_message_handler.close.assert_called_once()
+        assert report.failed_flushes == ['TestMessageHandler']
+
+    def test_shutdown_fails_pending_acks(self, mqtt_broker, mock_mqtt_client):
+        """Test publishes still unacknowledged at the deadline have their futures failed"""
+        mock_mqtt_client.connected = True
+        mock_mqtt_client.pending_ack_count = Mock(return_value=1)
+        mock_mqtt_client.fail_pending_acks = Mock(return_value=1)
+
+        mqtt_broker.shutdown(timeout=0)
+
+        mock_mqtt_client.fail_pending_acks.assert_called()
+
+    def test_dispatch_workers(self, basic_config, mock_mqtt_client):
+        """Test messages are dispatched on worker threads and drained on shutdown"""
+        basic_config['mqtt']['dispatch_workers'] = 2
+        handled_on = []
+        release = threading.Event()
+
+        class SlowHandler(TestMessageHandler):
+            def handle_message(self, topic, payload):
+                release.wait(1)
+                handled_on.append(threading.current_thread().name)
+                super().handle_message(topic, payload)
+
+        handler = SlowHandler(['test/data'])
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client, [handler])
+        mock_msg = Mock()
+        mock_msg.topic = 'test/data'
+        mock_msg.payload.decode.return_value = json.dumps({'key': 'value'})
+        for _ in range(4):
+            broker.on_message(None, None, mock_msg)
+        release.set()
+
+        report = broker.shutdown(timeout=2)
+
+        assert report.drained and report.dropped_messages == 0
+        assert len(handler.received_messages) == 4
+        assert all(name.startswith('mqtt-dispatch-') for name in handled_on)
+
+    def test_shutdown_drops_after_deadline(self, basic_config, mock_mqtt_client):
+        """Test queued messages left at the deadline are dropped and counted"""
+        basic_config['mqtt']['dispatch_workers'] = 1
+        release = threading.Event()
+
+        class BlockedHandler(TestMessageHandler):
+            def handle_message(self, topic, payload):
+                release.wait(2)
+
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client, [BlockedHandler(['test/data'])])
+        mock_msg = Mock()
+        mock_msg.topic = 'test/data'
+        mock_msg.payload.decode.return_value = json.dumps({'key': 'value'})
+        for _ in range(3):
+            broker.on_message(None, None, mock_msg)
+        time.sleep(0.05)
+
+        report = broker.shutdown(timeout=0.05)
+        release.set()
+
+        assert not report.drained
+        assert report.dropped_messages == 2
+
+    def test_dispatch_overflow_dead_letters(self, basic_config, mock_mqtt_client):
+        """Test a full dispatch queue drops and dead-letters messages without blocking"""
+        basic_config['mqtt'].update({'dispatch_workers': 1, 'dispatch_queue_size': 1, 'dead_letter_queue': {}})
+        release = threading.Event()
+
+        class BlockedHandler(TestMessageHandler):
+            def handle_message(self, topic, payload):
+                release.wait(2)
+
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client, [BlockedHandler(['test/data'])])
+        mock_msg = Mock()
+        mock_msg.topic = 'test/data'
+        mock_msg.payload = b'{"key": "value"}'
+        broker.on_message(None, None, mock_msg)
+        time.sleep(0.05)
+        broker.on_message(None, None, mock_msg)
+        broker.on_message(None, None, mock_msg)
+
+        assert broker.dispatch_overflow_count == 1
+        letters = broker.dead_letters.inspect()
+        assert [letter.reason for letter in letters] == ['overflow']
+        release.set()
+        broker.shutdown(timeout=2)
+
+    def test_publish_fanout_encodes_once(self, mqtt_broker, mock_mqtt_client):
+        """Test a fan-out serializes the payload once and reports results per topic"""
+        mock_mqtt_client.connected = True
+        topics = [f"devices/{index}/control" for index in range(5)]
+
+        with patch('fp_mqtt_broker.broker.json.dumps', wraps=json.dumps) as mock_dumps:
+            results = mqtt_broker.publish_fanout(topics + topics[:1], {'command': 'start'})
+
+        mock_dumps.assert_called_once()
+        assert results == {topic: True for topic in topics}
+        published = mock_mqtt_client.published_messages
+        assert [message['topic'] for message in published] == topics
+        assert len({id(message['payload']) for message in published}) == 1
+        assert all(message['qos'] == 1 for message in published)
+
+    def test_publish_fanout_partial_failure(self, mqtt_broker, mock_mqtt_client):
+        """Test failed topics are reported in the fan-out results"""
+        mock_mqtt_client.connected = True
+        acknowledged = Future()
+        acknowledged.set_result(True)
+        mock_mqtt_client.publish_with_ack = Mock(side_effect=[acknowledged, ConnectionError('down')])
+
+        assert mqtt_broker.publish_fanout(['a', 'b'], {}) == {'a': True, 'b': False}
+
+    def test_publish_fanout_disconnected(self, mqtt_broker):
+        """Test a fan-out while disconnected fails every topic"""
+        assert mqtt_broker.publish_fanout(['a', 'b'], {}) == {'a': False, 'b': False}
+
+    def test_publish_recording_command_fanout(self, mqtt_broker, mock_mqtt_client):
+        """Test recording commands can be fanned out to device topics"""
+        mock_mqtt_client.connected = True
+
+        results = mqtt_broker.publish_recording_command({'action': 'stop'}, topics=['d/1', 'd/2'])
+
+        assert results == {'d/1': True, 'd/2': True}
+        assert [message['topic'] for message in mock_mqtt_client.published_messages] == ['d/1', 'd/2']
+
+    def test_publish_recording_command_without_topic(self, basic_config, mock_mqtt_client):
+        """Test recording commands report no topics without a recording_control topic"""
+        del basic_config['mqtt']['topics']['recording_control']
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client)
+        mock_mqtt_client.connected = True
+
+        assert broker.publish_recording_command({'action': 'stop'}) == {}
+        assert mock_mqtt_client.published_messages == []
+
+    def test_resumed_session_skips_resubscribe(self, basic_config, tmp_path):
+        """Test a resumed persistent session only subscribes what changed"""
+        basic_config['mqtt'].update({'clean_session': False, 'session_store_path': str(tmp_path / 'session.json')})
+        config = BrokerConfig.from_dict(basic_config)
+        first_client = MockMQTTClient('test_client')
+        first = MQTTBroker(config, first_client, [TestMessageHandler(['old/topic'])])
+        first.on_connect(None, None, {'session present': 0}, 0)
+        assert 'old/topic' in first_client.subscribed_topics
+
+        client = MockMQTTClient('test_client')
+        client.subscribe = Mock()
+        client.unsubscribe = Mock()
+        broker = MQTTBroker(config, client, [TestMessageHandler(['new/topic'])])
+        broker.on_connect(None, None, {'session present': 1}, 0)
+
+        client.subscribe.assert_called_once_with('new/topic', 0)
+        client.unsubscribe.assert_called_once_with('old/topic')
+
+    def test_lost_session_resubscribes_everything(self, basic_config, mock_mqtt_client):
+        """Test subscriptions are all made again when the server has no session"""
+        basic_config['mqtt']['clean_session'] = False
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client)
+        broker.on_connect(None, None, {'session present': 0}, 0)
+        mock_mqtt_client.subscribed_topics.clear()
+
+        broker.on_connect(None, None, {'session present': 0}, 0)
+
+        assert mock_mqtt_client.subscribed_topics == set(broker.subscribed_topics)
+
+    def test_unacknowledged_messages_survive_restart(self, basic_config, tmp_path):
+        """Test unacknowledged publishes are saved and published again by the next run"""
+        basic_config['mqtt']['session_store_path'] = str(tmp_path / 'session.json')
+        config = BrokerConfig.from_dict(basic_config)
+        first_client = MockMQTTClient('test_client')
+        first_client.unacknowledged_messages = Mock(return_value=[('devices/1', b'{"a": 1}', 1)])
+        MQTTBroker(config, first_client).disconnect()
+
+        client = MockMQTTClient('test_client')
+        client.connected = True
+        broker = MQTTBroker(config, client)
+        broker.on_connect(None, None, {'session present': 0}, 0)
+
+        republished = [message for message in client.published_messages if message['topic'] == 'devices/1']
+        assert republished[0]['payload'] == b'{"a": 1}'
+        assert republished[0]['qos'] == 1
+        assert broker.session_store.take_unacknowledged() == []
+
+    def test_shutdown_keeps_persistent_subscriptions(self, basic_config, mock_mqtt_client):
+        """Test a shutdown with a persistent session keeps the server-side subscriptions"""
+        basic_config['mqtt']['clean_session'] = False
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client)
+        mock_mqtt_client.connected = True
+        mock_mqtt_client.unsubscribe = Mock()
+
+        broker.shutdown(timeout=0)
+
+        mock_mqtt_client.unsubscribe.assert_not_called()
+
+    def test_delivery_policies_downsample_handlers(self, broker_config, mock_mqtt_client):
+        """Test a handler's delivery policy only limits that handler"""
+        sampled = TestMessageHandler(['test/data'])
+        sampled.get_delivery_policies = lambda: {'test/#': {'keep_every': 2}}
+        unsampled = TestMessageHandler(['test/data'])
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [sampled, unsampled])
+
+        for value in range(4):
+            mock_mqtt_client.simulate_message('test/data', {'value': value})
+
+        assert [m['payload']['value'] for m in sampled.received_messages] == [1, 3]
+        assert len(unsampled.received_messages) == 4
+        assert broker.get_downsampler(sampled).dropped == 2
+        assert broker.get_downsampler(unsampled) is None
+
+    def test_downsamplers_follow_handlers(self, mqtt_broker):
+        """Test downsamplers are created and dropped with their handlers"""
+        handler = TestMessageHandler(['test/data'])
+        handler.get_delivery_policies = lambda: {'test/data': {'max_rate': 1.0}}
+
+        mqtt_broker.add_message_handler(handler)
+        downsampler = mqtt_broker.get_downsampler(handler)
+        mqtt_broker.add_message_handler(TestMessageHandler(['other']))
+
+        assert downsampler is not None
+        assert mqtt_broker.get_downsampler(handler) is downsampler
+        mqtt_broker.remove_message_handler(handler)
+        assert mqtt_broker.get_downsampler(handler) is None
+
+    def test_dead_letters_capture_failures(self, broker_config, mock_mqtt_client):
+        """Test invalid payloads and handler errors are captured with their context"""
+        handler = TestMessageHandler(['test/data'])
+        handler.handle_message = Mock(side_effect=RuntimeError('boom'))
+        broker_config.dead_letter_queue = {'capacity': 10}
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        invalid = Mock()
+        invalid.topic = 'test/data'
+        invalid.payload = b'not json'
+        invalid.qos = 1
+
+        broker.on_message(None, None, invalid)
+        mock_mqtt_client.simulate_message('test/data', {'value': 1})
+
+        first, second = broker.dead_letters.inspect()
+        assert (first.reason, first.raw, first.handler) == ('invalid_payload', b'not json', None)
+        assert (second.reason, second.error, second.handler) == ('handler_error', 'boom', 'TestMessageHandler')
+
+    def test_redrive_dead_letters(self, broker_config, mock_mqtt_client):
+        """Test re-driven letters reach the failed handler only and fail back into the queue"""
+        class FailingHandler(TestMessageHandler):
+            pass
+
+        failing = FailingHandler(['test/data'])
+        healthy = TestMessageHandler(['test/data'])
+        failing.handle_message = Mock(side_effect=[RuntimeError('boom'), RuntimeError('again'), None])
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [healthy])
+        broker.add_message_handler(failing)
+        broker.enable_dead_letter_queue()
+
+        mock_mqtt_client.simulate_message('test/data', {'value': 1})
+        assert broker.redrive_dead_letters() == 1
+        assert broker.dead_letters.inspect()[0].attempts == 2
+        assert broker.redrive_dead_letters() == 1
+
+        assert len(broker.dead_letters) == 0
+        assert failing.handle_message.call_args.args == ('test/data', {'value': 1})
+        assert len(healthy.received_messages) == 1
+
+    def test_redrive_keeps_letters_of_removed_handlers(self, broker_config, mock_mqtt_client):
+        """Test letters are kept when their handler is not registered anymore"""
+        handler = TestMessageHandler(['test/data'])
+        handler.handle_message = Mock(side_effect=RuntimeError('boom'))
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        broker.enable_dead_letter_queue()
+        mock_mqtt_client.simulate_message('test/data', {'value': 1})
+        broker.remove_message_handler(handler)
+
+        assert broker.redrive_dead_letters() == 0
+        assert len(broker.dead_letters) == 1
+
+    def test_shared_values_from_config(self, broker_config, mock_mqtt_client):
+        """Test the broker shares the latest payloads and removes the region on shutdown"""
+        from fp_mqtt_broker.shared_values import SharedValueReader
+        name = f"fp-test-{uuid.uuid4().hex[:12]}"
+        broker_config.shared_values = {'name': name, 'topics': ['sensors/#']}
+        broker = MQTTBroker(broker_config, mock_mqtt_client)
+
+        for value in [1, 2]:
+            mock_msg = Mock()
+            mock_msg.topic = 'sensors/a'
+            mock_msg.payload = json.dumps({'value': value}).encode()
+            broker.on_message(None, None, mock_msg)
+
+        with SharedValueReader(name) as reader:
+            assert reader.get('sensors/a') == {'value': 2}
+        assert 'sensors/#' in broker.subscribed_topics
+        broker.shutdown(timeout=0)
+        with pytest.raises(FileNotFoundError):
+            SharedValueReader(name)
+
+    def test_latency_tracking_round_trip(self, broker_config, mock_mqtt_client):
+        """Test published payloads are stamped and the stamp is removed before handlers"""
+        handler = TestMessageHandler(['test/data'])
+        broker_config.latency_tracking = {}
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        mock_mqtt_client.connected = True
+
+        broker.publish_message('test/data', {'value': 1})
+        sent = json.loads(mock_mqtt_client.published_messages[0]['payload'])
+        mock_msg = Mock()
+        mock_msg.topic = 'test/data'
+        mock_msg.payload = json.dumps(sent).encode()
+        broker.on_message(None, None, mock_msg)
+
+        assert sent['_sent']['src'] == 'test_client'
+        assert sent['_sent']['seq'] == 1
+        assert handler.received_messages == [{'topic': 'test/data', 'payload': {'value': 1}}]
+        assert broker.latency.snapshot()['publishers']['test_client']['received'] == 1
+
+    def test_catch_up_drops_stale_messages(self, broker_config, mock_mqtt_client):
+        """Test messages stamped long ago are dropped until fresh ones arrive"""
+        handler = TestMessageHandler(['test/data'])
+        broker_config.catch_up = {'enter_age': 5.0, 'ttl': 10.0, 'timestamp_field': 'timestamp'}
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        now = time.time()
+
+        for age in [60, 30, 0]:
+            mock_mqtt_client.simulate_message('test/data', {'timestamp': now - age})
+
+        assert [m['payload']['timestamp'] for m in handler.received_messages] == [now]
+        assert broker.catch_up.dropped_stale == 2
+        assert broker.catch_up.active is False
+
+    def test_catch_up_drops_are_not_lost(self, broker_config, mock_mqtt_client):
+        """Test messages dropped while catching up are not reported as network loss"""
+        handler = TestMessageHandler(['test/data'])
+        broker_config.catch_up = {'enter_age': 5.0, 'ttl': 10.0, 'timestamp_field': 'timestamp'}
+        broker_config.latency_tracking = {}
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [handler])
+        mock_mqtt_client.connected = True
+        now = time.time()
+
+        for age in [60, 30, 20, 0]:
+            broker.publish_message('test/data', {'timestamp': now - age})
+        for published in mock_mqtt_client.published_messages:
+            mock_msg = Mock()
+            mock_msg.topic = 'test/data'
+            mock_msg.payload = published['payload'].encode()
+            broker.on_message(None, None, mock_msg)
+
+        assert broker.catch_up.dropped_stale == 3
+        assert len(handler.received_messages) == 1
+        snapshot = broker.latency.snapshot()
+        assert snapshot['received'] == 4
+        assert snapshot['lost'] == 0
+
+    def test_catch_up_keeps_replies(self, broker_config, mock_mqtt_client):
+        """Test replies resolve their request even when stale while catching up"""
+        broker_config.catch_up = {'enter_age': 5.0, 'ttl': 10.0, 'timestamp_field': 'timestamp'}
+        broker = MQTTBroker(broker_config, mock_mqtt_client)
+        mock_mqtt_client.connected = True
+        future = broker.request('devices/1/rpc', {'command': 'status'}, timeout=5)
+        request = json.loads(mock_mqtt_client.published_messages[0]['payload'])
+        now = time.time()
+
+        mock_mqtt_client.simulate_message('test/data', {'timestamp': now - 60})
+        mock_mqtt_client.simulate_message(broker.reply_topic, {
+            'correlation_id': request['correlation_id'], 'payload': 'ok', 'timestamp': now - 60
+        })
+
+        assert broker.catch_up.active is True
+        assert future.result(timeout=1) == 'ok'
+
+    def test_adaptive_concurrency_limits(self, basic_config):
+        """Test handlers get adaptive limits exposed per handler class"""
+        basic_config['mqtt'].update({'dispatch_workers': 2, 'adaptive_concurrency': {'max_limit': 2}})
+        handlers = [TestMessageHandler(['test/data']), TestMessageHandler(['test/data'])]
+        client = MockMQTTClient('test_client')
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), client, handlers)
+
+        client.simulate_message('test/data', {'value': 1})
+        broker.shutdown(timeout=5)
+
+        limits = broker.concurrency_limits()
+        assert set(limits) == {'TestMessageHandler', 'TestMessageHandler#2'}
+        assert limits['TestMessageHandler']['limit'] == 1
+        assert limits['TestMessageHandler']['in_flight'] == 0
+        assert len(handlers[1].received_messages) == 1
+
+    def test_non_concurrent_handler_serialised(self, basic_config):
+        """Test handlers that are not concurrent are called one message at a time across topics"""
+        basic_config['mqtt'].update({'dispatch_workers': 4})
+        active = []
+        overlaps = []
+
+        class SerialHandler(TestMessageHandler):
+            concurrent = False
+
+            def handle_message(self, topic, payload):
+                active.append(topic)
+                if len(active) > 1:
+                    overlaps.append(topic)
+                time.sleep(0.005)
+                active.remove(topic)
+                super().handle_message(topic, payload)
+
+        handler = SerialHandler(['test/#'])
+        client = MockMQTTClient('test_client')
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), client, [handler])
+        for index in range(5):
+            for topic in ('test/a', 'test/b', 'test/c', 'test/d'):
+                client.simulate_message(topic, {'value': index})
+        broker.shutdown(timeout=5)
+
+        assert len(handler.received_messages) == 20
+        assert overlaps == []
+
+    def test_non_concurrent_handler_locked_inline(self, mqtt_broker, mock_mqtt_client):
+        """Test handlers that are not concurrent are serialised without dispatch workers too"""
+        class SerialHandler(TestMessageHandler):
+            concurrent = False
+
+        handler = SerialHandler(['test/data'])
+        mqtt_broker.add_message_handler(handler)
+        mock_mqtt_client.simulate_message('test/data', {'value': 1})
+
+        assert len(handler.received_messages) == 1
+        assert handler in mqtt_broker._handler_locks
+
+    def test_replacing_handlers_prunes_handler_state(self, mqtt_broker, mock_mqtt_client):
+        """Test replacing the handlers drops the locks of the handlers no longer registered"""
+        class SerialHandler(TestMessageHandler):
+            concurrent = False
+
+        old, new = SerialHandler(['test/data']), SerialHandler(['test/data'])
+        mqtt_broker.message_handlers = [old]
+        mock_mqtt_client.simulate_message('test/data', {'value': 1})
+
+        mqtt_broker.message_handlers = [new]
+
+        assert old not in mqtt_broker._handler_locks
+        mock_mqtt_client.simulate_message('test/data', {'value': 2})
+        assert list(mqtt_broker._handler_locks) == [new]
+
+    def test_adaptive_concurrency_non_concurrent_handler(self, basic_config):
+        """Test handlers that are not concurrent keep an adaptive limit of 1"""
+        basic_config['mqtt'].update({'dispatch_workers': 4, 'adaptive_concurrency': {'min_limit': 2}})
+
+        class SerialHandler(TestMessageHandler):
+            concurrent = False
+
+        client = MockMQTTClient('test_client')
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), client, [SerialHandler(['test/data'])])
+        client.simulate_message('test/data', {'value': 1})
+        broker.shutdown(timeout=5)
+
+        assert broker.concurrency_limits()['SerialHandler']['limit'] == 1
+
+    def test_adaptive_concurrency_needs_workers(self, mqtt_broker):
+        """Test adaptive concurrency is refused for inline dispatch"""
+        with pytest.raises(ValueError):
+            mqtt_broker.enable_adaptive_concurrency()
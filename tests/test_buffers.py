@@ -0,0 +1,48 @@
+import pytest
+from fp_mqtt_broker.buffers import NumericRingBuffer
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.mark.unit
+class TestNumericRingBuffer:
+    """Test cases for NumericRingBuffer"""
+
+    def test_append_and_read(self):
+        """Test reading samples in insertion order"""
+        buffer = NumericRingBuffer(4, ['a', 'b'])
+        buffer.append(1.0, [1, 10])
+        buffer.append(2.0, [2, 20])
+
+        assert len(buffer) == 2
+        assert buffer.timestamps().tolist() == [1.0, 2.0]
+        assert buffer.values().tolist() == [[1, 10], [2, 20]]
+        assert buffer.column('b').tolist() == [10, 20]
+
+    def test_wraps_and_keeps_latest(self):
+        """Test the oldest samples are overwritten once full"""
+        buffer = NumericRingBuffer(3, ['a'])
+        for i in range(7):
+            buffer.append(float(i), [i])
+
+        assert len(buffer) == 3
+        assert buffer.total_samples == 7
+        assert buffer.column('a').tolist() == [4, 5, 6]
+        assert buffer.column('a', count=2).tolist() == [5, 6]
+
+    def test_views_are_zero_copy_and_read_only(self):
+        """Test readers get read-only views into the buffer memory"""
+        buffer = NumericRingBuffer(3, ['a'])
+        for i in range(5):
+            buffer.append(float(i), [i])
+
+        view = buffer.values()
+
+        assert np.shares_memory(view, buffer._values)
+        with pytest.raises(ValueError):
+            view[0, 0] = 1
+
+    def test_invalid_capacity(self):
+        """Test rejecting an empty buffer"""
+        with pytest.raises(ValueError):
+            NumericRingBuffer(0, ['a'])
@@ -0,0 +1,71 @@
+import json
+import time
+
+import pytest
+from fp_mqtt_broker.catch_up import CatchUpController
+from fp_mqtt_broker.message import Message
+
+
+def make_message(topic, payload=None, age=0.0):
+    return Message(topic, json.dumps(payload or {}).encode(), json.loads, received_at=time.time() - age)
+
+
+@pytest.mark.unit
+class TestCatchUpController:
+    """Test cases for CatchUpController"""
+
+    def test_enters_and_exits_with_hysteresis(self):
+        """Test catch-up starts above the enter age and ends at the exit age"""
+        controller = CatchUpController(enter_age=5.0, exit_age=1.0)
+
+        controller.admit(make_message('a', age=3.0))
+        assert controller.active is False
+        controller.admit(make_message('a', age=6.0))
+        assert controller.active is True
+        controller.admit(make_message('a', age=3.0))
+        assert controller.active is True
+        controller.admit(make_message('a', age=0.5))
+        assert controller.active is False
+        assert controller.activations == 1
+
+    def test_drops_messages_older_than_topic_ttl(self):
+        """Test stale messages are dropped per topic TTL while catching up"""
+        controller = CatchUpController(enter_age=5.0, ttl=30.0, topic_ttls={'sensors/#': 2.0})
+
+        assert controller.admit(make_message('sensors/a', age=10.0)) is False
+        assert controller.admit(make_message('status', age=10.0)) is True
+        assert controller.admit(make_message('status', age=40.0)) is False
+        assert controller.dropped_stale == 2
+        assert controller.ttl_for('sensors/a') == 2.0
+
+    def test_keeps_everything_when_not_behind(self):
+        """Test stale-looking messages pass while not catching up"""
+        controller = CatchUpController(enter_age=50.0, ttl=1.0)
+
+        assert controller.admit(make_message('a', age=10.0)) is True
+
+    def test_collapses_to_latest_queued(self):
+        """Test only the latest queued message per topic is dispatched while catching up"""
+        controller = CatchUpController(enter_age=1.0, exit_age=0.5)
+        queued = [make_message('a', age=10.0), make_message('a', age=9.0), make_message('b', age=9.0),
+                  make_message('a', age=8.0)]
+        for message in queued:
+            controller.queued(message)
+
+        admitted = [message for message in queued if controller.admit(message)]
+
+        assert admitted == queued[2:]
+        assert controller.collapsed == 2
+
+    def test_embedded_timestamp(self):
+        """Test the payload send time detects messages that were received just now"""
+        controller = CatchUpController(enter_age=5.0, timestamp_field='timestamp')
+
+        controller.admit(make_message('a', {'timestamp': time.time() - 60}))
+
+        assert controller.active is True
+
+    def test_invalid_ages(self):
+        """Test an exit age above the enter age is refused"""
+        with pytest.raises(ValueError):
+            CatchUpController(enter_age=1.0, exit_age=2.0)
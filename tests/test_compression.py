@@ -0,0 +1,152 @@
+import json
+import pytest
+from unittest.mock import Mock
+from fp_mqtt_broker.compression import (
+    Codec,
+    FRAME_MAGIC,
+    Lz4Codec,
+    PayloadCompressor,
+    ZstdCodec,
+    is_compressed,
+)
+
+
+def _large_payload() -> str:
+    return json.dumps({'readings': [{'sensor': f'sensor-{i}', 'value': i * 0.5} for i in range(500)]})
+
+
+@pytest.mark.unit
+class TestPayloadCompressor:
+    """Test cases for PayloadCompressor"""
+
+    def test_disabled_by_default(self):
+        """Test payloads pass through when no codec is configured"""
+        compressor = PayloadCompressor()
+        payload = _large_payload()
+
+        assert compressor.enabled is False
+        assert compressor.compress(payload) is payload
+
+    def test_below_threshold_not_compressed(self):
+        """Test small payloads are sent unchanged"""
+        compressor = PayloadCompressor(codec='zlib', threshold=1024)
+
+        assert compressor.compress('{"a": 1}') == '{"a": 1}'
+
+    def test_zlib_round_trip(self):
+        """Test zlib compression round trip"""
+        compressor = PayloadCompressor(codec='zlib', threshold=64)
+        payload = _large_payload()
+
+        frame = compressor.compress(payload)
+
+        assert is_compressed(frame)
+        assert frame.startswith(FRAME_MAGIC)
+        assert len(frame) < len(payload)
+        assert PayloadCompressor().decompress(frame) == payload.encode()
+
+    def test_incompressible_payload_unchanged(self):
+        """Test payloads that do not shrink are sent unchanged"""
+        compressor = PayloadCompressor(codec='zlib', threshold=1)
+        payload = bytes(range(256))
+
+        assert compressor.compress(payload) is payload
+
+    def test_decompress_passes_plain_payloads(self):
+        """Test uncompressed payloads are returned as is"""
+        assert PayloadCompressor().decompress(b'{"a": 1}') == b'{"a": 1}'
+
+    def test_repeated_payload_compressed_once(self):
+        compressor = PayloadCompressor('zlib', threshold=64, cache_size=8)
+        payload = _large_payload()
+        compressor.codec.compress = Mock(wraps=compressor.codec.compress)
+
+        first = compressor.compress(payload)
+        second = compressor.compress(payload)
+
+        assert first is second
+        compressor.codec.compress.assert_called_once()
+
+    def test_cache_bounded_and_optional(self):
+        compressor = PayloadCompressor('zlib', threshold=64, cache_size=2)
+        for index in range(3):
+            compressor.compress(_large_payload() + ' ' * index)
+        assert len(compressor._cache) == 2
+
+        uncached = PayloadCompressor('zlib', threshold=64)
+        uncached.compress(_large_payload())
+        assert len(uncached._cache) == 0
+
+    def test_unknown_codec(self):
+        """Test rejecting an unknown codec name"""
+        with pytest.raises(ValueError):
+            PayloadCompressor(codec='brotli')
+
+    def test_zlib_dictionary(self):
+        """Test dictionary compression of small similar messages"""
+        samples = [json.dumps({'device': f'dev-{i}', 'temperature': 20 + i, 'humidity': 40}) for i in range(50)]
+        message = json.dumps({'device': 'dev-77', 'temperature': 21, 'humidity': 40})
+        plain = PayloadCompressor(codec='zlib', threshold=1)
+        trained = PayloadCompressor(codec='zlib', threshold=1)
+        dictionary = trained.train_dictionary(samples, size=1024)
+
+        frame = trained.compress(message)
+        receiver = PayloadCompressor()
+        receiver.register_dictionary(dictionary)
+
+        assert len(frame) < len(plain.compress(message))
+        assert receiver.decompress(frame) == message.encode()
+
+    def test_unknown_dictionary(self):
+        """Test decompressing with a dictionary the receiver does not know"""
+        compressor = PayloadCompressor(codec='zlib', threshold=1)
+        compressor.train_dictionary(['{"value": 1}' * 10])
+
+        frame = compressor.compress('{"value": 2}' * 10)
+
+        with pytest.raises(ValueError):
+            PayloadCompressor().decompress(frame)
+
+    def test_dictionary_requires_codec(self):
+        """Test dictionaries need a codec that supports them"""
+        with pytest.raises(ValueError):
+            PayloadCompressor().train_dictionary(['{}'])
+
+    def test_dictionary_unsupported_by_codec(self):
+        """Test training a dictionary fails cleanly with a codec without dictionaries"""
+        if not Lz4Codec.is_available():
+            pytest.skip('lz4 is not installed')
+        with pytest.raises(ValueError):
+            PayloadCompressor(codec='lz4').train_dictionary(['{}'])
+
+    def test_codec_is_abstract(self):
+        """Test codecs must implement compress and decompress"""
+        with pytest.raises(TypeError):
+            Codec()
+
+    @pytest.mark.parametrize('codec_class', [ZstdCodec, Lz4Codec])
+    def test_optional_codec_round_trip(self, codec_class):
+        """Test optional codecs when their libraries are installed"""
+        if not codec_class.is_available():
+            pytest.skip(f'{codec_class.name} is not installed')
+        compressor = PayloadCompressor(codec=codec_class.name, threshold=64)
+        payload = _large_payload()
+
+        frame = compressor.compress(payload)
+
+        assert is_compressed(frame)
+        assert PayloadCompressor().decompress(frame) == payload.encode()
+
+    def test_zstd_dictionary(self):
+        """Test zstd dictionary training when zstandard is installed"""
+        if not ZstdCodec.is_available():
+            pytest.skip('zstd is not installed')
+        samples = [json.dumps({'device': f'dev-{i}', 'temperature': 20 + i % 7, 'seq': i}) for i in range(500)]
+        compressor = PayloadCompressor(codec='zstd', threshold=1)
+        dictionary = compressor.train_dictionary(samples, size=2048)
+        receiver = PayloadCompressor()
+        receiver.register_dictionary(dictionary)
+
+        frame = compressor.compress(samples[3])
+
+        assert receiver.decompress(frame) == samples[3].encode()
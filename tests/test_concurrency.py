@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+from fp_mqtt_broker.concurrency import AdaptiveLimit
+
+
+def run_calls(limit, count, latency, failed=False):
+    for _ in range(count):
+        limit.acquire()
+        limit.release(latency, failed)
+
+
+@pytest.mark.unit
+class TestAdaptiveLimit:
+    """Test cases for AdaptiveLimit"""
+
+    def test_grows_while_saturated(self):
+        """Test the limit grows by one per window while callers wait and latency is fine"""
+        limit = AdaptiveLimit(min_limit=1, max_limit=3)
+        limit._saturated = True
+        run_calls(limit, 1, 0.01)
+        assert limit.current == 2
+
+        run_calls(limit, 10, 0.01)
+        assert limit.current == 2
+
+    def test_never_exceeds_bounds(self):
+        """Test the limit stays within min_limit and max_limit"""
+        limit = AdaptiveLimit(min_limit=2, max_limit=3)
+        for _ in range(5):
+            limit._saturated = True
+            run_calls(limit, 3, 0.01)
+        assert limit.current == 3
+
+        run_calls(limit, 20, 1.0, failed=True)
+        assert limit.current == 2
+
+    def test_shrinks_on_latency(self):
+        """Test the limit backs off when latency exceeds the tolerated level"""
+        limit = AdaptiveLimit(min_limit=1, max_limit=8, tolerance=2.0, backoff=0.5)
+        limit.limit = 8.0
+        run_calls(limit, 8, 0.01)
+        assert limit.current == 8
+
+        run_calls(limit, 16, 0.5)
+        assert limit.current < 8
+        assert limit.to_dict()['best_latency'] < 0.02
+
+    def test_target_latency(self):
+        """Test an explicit target latency is used instead of the best latency"""
+        limit = AdaptiveLimit(max_limit=4, target_latency=1.0)
+        limit.limit = 4.0
+        run_calls(limit, 8, 0.5)
+        assert limit.current == 4
+
+    def test_acquire_blocks_at_limit(self):
+        """Test callers wait for a free slot and are counted as waiting"""
+        limit = AdaptiveLimit(min_limit=1, max_limit=1)
+        limit.acquire()
+        acquired = threading.Event()
+
+        def waiter():
+            limit.acquire()
+            acquired.set()
+
+        threading.Thread(target=waiter, daemon=True).start()
+        deadline = time.monotonic() + 5
+        while limit.waiting == 0 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert not acquired.is_set()
+
+        limit.release(0.01)
+        assert acquired.wait(5)
+        assert limit.in_flight == 1
+
+    def test_invalid_bounds(self):
+        """Test invalid limits are refused"""
+        with pytest.raises(ValueError):
+            AdaptiveLimit(min_limit=4, max_limit=2)
+        with pytest.raises(ValueError):
+            AdaptiveLimit(backoff=1.5)
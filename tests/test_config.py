@@ -14,6 +14,19 @@ class TestBrokerConfig:
         assert config.client_id == "mqtt_client"
         assert config.keepalive == 60
         assert config.topics is None
+        assert config.protocol_version == 4
+        assert config.session_expiry_interval is None
+        assert config.shared_subscription_group is None
+        assert config.is_mqtt_v5 is False
+        assert config.max_inflight_messages == 20
+        assert config.dispatch_workers == 0
+        assert config.dispatch_queue_size == 10000
+        assert config.shutdown_timeout == 10.0
+        assert config.health is None
+        assert config.clean_session is True
+        assert config.persistent_session is False
+        assert config.subscription_qos == 0
+        assert config.session_store_path is None
         
     def test_custom_configuration(self):
         """Test custom configuration values"""
@@ -95,4 +108,70 @@ class TestBrokerConfig:
         assert config.broker_port == 1883
         assert config.client_id == 'mqtt_client'
         assert config.keepalive == 60
-        assert config.topics == {}
\ No newline at end of file
+        assert config.topics == {}
+
+    def test_from_dict_mqtt_v5_options(self):
+        """Test creating config with MQTT v5 and shared subscription options"""
+        config_dict = {
+            'mqtt': {
+                'protocol_version': 5,
+                'session_expiry_interval': 3600,
+                'shared_subscription_group': 'ingest'
+            }
+        }
+        
+        config = BrokerConfig.from_dict(config_dict)
+        
+        assert config.protocol_version == 5
+        assert config.is_mqtt_v5 is True
+        assert config.session_expiry_interval == 3600
+        assert config.shared_subscription_group == 'ingest'
+
+    def test_from_dict_compression_options(self):
+        """Test creating config with compression options"""
+        config = BrokerConfig.from_dict({'mqtt': {'compression_codec': 'zlib', 'compression_threshold': 512, 'compression_level': 9}})
+        
+        assert config.compression_codec == 'zlib'
+        assert config.compression_threshold == 512
+        assert config.compression_level == 9
+        assert config.compression_cache_size == 0
+        assert BrokerConfig.from_dict({'mqtt': {'compression_cache_size': 64}}).compression_cache_size == 64
+
+    def test_upstream_addresses(self):
+        """Test upstream brokers given as strings and dictionaries"""
+        config = BrokerConfig.from_dict({'mqtt': {
+            'broker_port': 1884,
+            'upstreams': ['a.example:1883', 'b.example', {'host': 'c.example', 'port': 8883}]
+        }})
+
+        assert config.upstream_addresses == [('a.example', 1883), ('b.example', 1884), ('c.example', 8883)]
+
+    def test_upstream_addresses_default(self):
+        """Test the single broker is the only upstream by default"""
+        assert BrokerConfig(broker_host='h', broker_port=1).upstream_addresses == [('h', 1)]
+
+    def test_from_dict_dead_letter_queue(self):
+        """Test creating config with a dead letter queue"""
+        config = BrokerConfig.from_dict({'mqtt': {'dead_letter_queue': {'capacity': 50, 'spill_path': '/tmp/dlq'}}})
+
+        assert config.dead_letter_queue == {'capacity': 50, 'spill_path': '/tmp/dlq'}
+        assert BrokerConfig().dead_letter_queue is None
+
+    def test_from_dict_transport_options(self):
+        """Test creating config with transport and socket options"""
+        config = BrokerConfig.from_dict({'mqtt': {
+            'transport': 'websockets',
+            'websocket_path': '/ws',
+            'websocket_headers': {'Authorization': 'Bearer token'},
+            'tcp_nodelay': False,
+            'socket_receive_buffer': 262144
+        }})
+
+        assert config.transport == 'websockets'
+        assert config.websocket_path == '/ws'
+        assert config.websocket_headers == {'Authorization': 'Bearer token'}
+        assert config.tcp_nodelay is False
+        assert config.socket_receive_buffer == 262144
+        assert config.socket_send_buffer is None
+        assert BrokerConfig().transport == 'tcp'
+        assert BrokerConfig().tcp_nodelay is True
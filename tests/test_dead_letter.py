@@ -0,0 +1,132 @@
+import pytest
+from fp_mqtt_broker.dead_letter import DeadLetter, DeadLetterQueue
+
+
+def make_letter(index):
+    return DeadLetter(f'sensors/{index}', f'{{"value": {index}}}'.encode(), 'handler_error', 'boom', 'Handler')
+
+
+@pytest.mark.unit
+class TestDeadLetterQueue:
+    """Test cases for DeadLetterQueue"""
+
+    def test_dict_round_trip(self):
+        """Test letters survive serialization with their raw bytes"""
+        letter = DeadLetter('a', b'\x00\xff', 'invalid_payload', 'bad', qos=1, received_at=1.0, attempts=2)
+
+        assert DeadLetter.from_dict(letter.to_dict()) == letter
+
+    def test_ring_drops_oldest_without_spill_path(self):
+        """Test the oldest letters are dropped when the ring is full"""
+        queue = DeadLetterQueue(capacity=2)
+        for index in range(3):
+            queue.put(make_letter(index))
+
+        assert len(queue) == 2
+        assert queue.dropped == 1
+        assert [letter.topic for letter in queue.inspect()] == ['sensors/1', 'sensors/2']
+
+    def test_spills_oldest_to_disk(self, tmp_path):
+        """Test overflowing letters are spilled and read back oldest first"""
+        queue = DeadLetterQueue(capacity=2, spill_path=str(tmp_path / 'dlq.jsonl'))
+        for index in range(5):
+            queue.put(make_letter(index))
+
+        assert len(queue) == 5
+        assert queue.spilled == 3
+        assert [letter.topic for letter in queue.inspect(4)] == [f'sensors/{i}' for i in range(4)]
+        assert [letter.topic for letter in queue.take(2)] == ['sensors/0', 'sensors/1']
+        assert [letter.topic for letter in queue.take(2)] == ['sensors/2', 'sensors/3']
+        assert queue.spilled == 0
+        assert not (tmp_path / 'dlq.jsonl').exists()
+        assert len(queue) == 1
+
+    def test_spill_is_bounded(self, tmp_path):
+        """Test letters not fitting in the spill file are dropped"""
+        queue = DeadLetterQueue(capacity=1, spill_path=str(tmp_path / 'dlq.jsonl'), max_spill_bytes=300)
+        for index in range(5):
+            queue.put(make_letter(index))
+        queue.flush()
+
+        assert queue.spilled == 1
+        assert queue.dropped == 3
+        assert (tmp_path / 'dlq.jsonl').stat().st_size <= 300
+
+    def test_spills_in_batches(self, tmp_path):
+        """Test spilled letters are appended a batch at a time and written out before reading"""
+        path = tmp_path / 'dlq.jsonl'
+        queue = DeadLetterQueue(capacity=1, spill_path=str(path))
+        queue.SPILL_BATCH = 3
+        for index in range(3):
+            queue.put(make_letter(index))
+
+        assert queue.spilled == 2
+        assert not path.exists()
+
+        queue.put(make_letter(3))
+        assert len(path.read_bytes().splitlines()) == 3
+
+        queue.put(make_letter(4))
+        assert [letter.topic for letter in queue.inspect(5)] == [f'sensors/{i}' for i in range(5)]
+        queue.close()
+        assert DeadLetterQueue(capacity=1, spill_path=str(path)).spilled == 4
+
+    def test_persist_survives_restart(self, tmp_path):
+        """Test persisted letters are loaded by a new queue"""
+        path = str(tmp_path / 'dlq.jsonl')
+        queue = DeadLetterQueue(spill_path=path)
+        queue.put(make_letter(0))
+        queue.put(make_letter(1))
+
+        assert queue.persist() == 2
+
+        restored = DeadLetterQueue(spill_path=path)
+        assert len(restored) == 2
+        assert restored.take(10) == [make_letter(0), make_letter(1)]
+
+    def test_take_advances_offset(self, tmp_path):
+        """Test taking from the segment keeps the file and resumes at the offset after a restart"""
+        path = tmp_path / 'dlq.jsonl'
+        queue = DeadLetterQueue(capacity=1, spill_path=str(path))
+        for index in range(5):
+            queue.put(make_letter(index))
+        queue.flush()
+        size = path.stat().st_size
+
+        assert [letter.topic for letter in queue.take(2)] == ['sensors/0', 'sensors/1']
+        assert path.stat().st_size == size
+        assert queue.spilled == 2
+        assert [letter.topic for letter in queue.inspect(1)] == ['sensors/2']
+
+        restored = DeadLetterQueue(capacity=1, spill_path=str(path))
+        assert restored.spilled == 2
+        assert [letter.topic for letter in restored.take(3)] == ['sensors/2', 'sensors/3']
+        assert not path.exists()
+        assert not (tmp_path / 'dlq.jsonl.offset').exists()
+
+    def test_compacts_taken_letters(self, tmp_path):
+        """Test the segment is rewritten once the taken letters are most of it"""
+        path = tmp_path / 'dlq.jsonl'
+        queue = DeadLetterQueue(capacity=1, spill_path=str(path))
+        queue.COMPACT_BYTES = 0
+        for index in range(7):
+            queue.put(make_letter(index))
+
+        queue.take(2)
+        assert queue._offset > 0
+        queue.take(1)
+
+        assert queue._offset == 0
+        assert not (tmp_path / 'dlq.jsonl.offset').exists()
+        assert [letter.topic for letter in queue.take(10)] == ['sensors/3', 'sensors/4', 'sensors/5', 'sensors/6']
+
+    def test_clear(self, tmp_path):
+        """Test clearing removes the ring and the spill file"""
+        queue = DeadLetterQueue(capacity=1, spill_path=str(tmp_path / 'dlq.jsonl'))
+        queue.put(make_letter(0))
+        queue.put(make_letter(1))
+
+        queue.clear()
+
+        assert len(queue) == 0
+        assert not (tmp_path / 'dlq.jsonl').exists()
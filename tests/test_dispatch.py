@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+
+import pytest
+
+from fp_mqtt_broker.dispatch import Dispatcher
+from fp_mqtt_broker.message import Message
+
+
+def make_message(topic='test/data'):
+    return Message(topic, b'{}', json.loads)
+
+
+@pytest.mark.unit
+class TestDispatcher:
+    """Test cases for the dispatch worker pool"""
+
+    def test_requires_worker(self):
+        with pytest.raises(ValueError):
+            Dispatcher(lambda message: None, 0)
+
+    def test_dispatches_on_workers(self):
+        threads = set()
+        done = threading.Event()
+
+        def dispatch(message):
+            threads.add(threading.current_thread().name)
+            done.set()
+
+        dispatcher = Dispatcher(dispatch, 2)
+        dispatcher.submit(make_message())
+
+        assert done.wait(1)
+        assert threads <= {'mqtt-dispatch-0', 'mqtt-dispatch-1'}
+        assert dispatcher.workers == 2
+        dispatcher.stop()
+
+    def test_topic_order(self):
+        """Test messages on one topic are handled by one worker in arrival order"""
+        handled = {}
+        lock = threading.Lock()
+
+        def dispatch(message):
+            time.sleep(0.001)
+            with lock:
+                handled.setdefault(message.topic, []).append((message.raw, threading.current_thread().name))
+
+        dispatcher = Dispatcher(dispatch, 4)
+        for index in range(20):
+            for topic in ('a', 'b', 'c'):
+                dispatcher.submit(Message(topic, str(index).encode(), json.loads))
+
+        assert dispatcher.drain(5)
+        for topic, entries in handled.items():
+            assert [raw for raw, _ in entries] == [str(index).encode() for index in range(20)]
+            assert len({thread for _, thread in entries}) == 1
+        dispatcher.stop()
+
+    def test_drain(self):
+        handled = []
+        dispatcher = Dispatcher(lambda message: (time.sleep(0.01), handled.append(message)), 1)
+        for _ in range(5):
+            dispatcher.submit(make_message())
+
+        assert dispatcher.drain(2)
+        assert len(handled) == 5
+        assert dispatcher.stop() == 0
+
+    def test_drain_timeout_and_stop_discards(self):
+        release = threading.Event()
+        dispatcher = Dispatcher(lambda message: release.wait(2), 1)
+        for _ in range(4):
+            dispatcher.submit(make_message())
+
+        assert not dispatcher.drain(0.05)
+        assert len(dispatcher) == 3
+        assert dispatcher.oldest_age() >= 0.05
+        release.set()
+        assert dispatcher.stop() == 3
+
+    def test_full_queue_refuses(self):
+        """Test a full queue refuses messages instead of blocking the caller"""
+        release = threading.Event()
+        dispatcher = Dispatcher(lambda message: release.wait(2), 1, queue_size=2)
+        assert dispatcher.submit(make_message())
+        time.sleep(0.05)
+        assert dispatcher.submit(make_message())
+        assert dispatcher.submit(make_message())
+
+        started = time.monotonic()
+        assert not dispatcher.submit(make_message())
+        assert time.monotonic() - started < 0.1
+        assert dispatcher.overflowed == 1
+        release.set()
+        dispatcher.stop()
+
+    def test_worker_survives_errors(self):
+        handled = []
+
+        def dispatch(message):
+            if message.topic == 'bad':
+                raise RuntimeError('boom')
+            handled.append(message)
+
+        dispatcher = Dispatcher(dispatch, 1)
+        dispatcher.submit(make_message('bad'))
+        dispatcher.submit(make_message())
+
+        assert dispatcher.drain(1)
+        assert len(handled) == 1
+        dispatcher.stop()
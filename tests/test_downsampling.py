@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from fp_mqtt_broker.downsampling import DeliveryPolicy, Downsampler
+from fp_mqtt_broker.message import Message, PayloadDecodeError
+
+
+def make_message(topic, payload, received_at=0.0):
+    return Message(topic, json.dumps(payload).encode(), lambda raw: json.loads(raw), received_at=received_at)
+
+
+@pytest.mark.unit
+class TestDeliveryPolicy:
+    """Test cases for DeliveryPolicy"""
+
+    def test_from_dict(self):
+        """Test creating a policy from a dictionary"""
+        policy = DeliveryPolicy.from_dict('sensors/#', {'max_rate': 2.0, 'mode': 'mean'})
+
+        assert policy == DeliveryPolicy('sensors/#', max_rate=2.0, mode='mean')
+
+    @pytest.mark.parametrize('config', [
+        {},
+        {'max_rate': 1.0, 'keep_every': 2},
+        {'max_rate': 0},
+        {'keep_every': 0},
+        {'keep_every': 2, 'mode': 'median'},
+    ])
+    def test_invalid_policies(self, config):
+        """Test invalid policies are refused"""
+        with pytest.raises(ValueError):
+            DeliveryPolicy.from_dict('sensors/#', config)
+
+
+@pytest.mark.unit
+class TestDownsampler:
+    """Test cases for Downsampler"""
+
+    def test_keep_every_drops_without_decoding(self):
+        """Test one message in N is delivered and the others are never decoded"""
+        downsampler = Downsampler([DeliveryPolicy('sensors/+', keep_every=3)])
+        messages = [make_message('sensors/a', {'value': i}) for i in range(6)]
+
+        delivered = [downsampler.offer(message) for message in messages]
+
+        assert delivered == [None, None, messages[2], None, None, messages[5]]
+        assert not any(message.is_decoded for message in messages)
+        assert downsampler.dropped == 4
+
+    def test_max_rate_uses_receive_time(self):
+        """Test messages closer than the rate interval to the last delivery are dropped"""
+        downsampler = Downsampler([DeliveryPolicy('sensors/+', max_rate=2.0)])
+        times = [0.0, 0.1, 0.4, 0.5, 0.9, 1.0]
+
+        delivered = [downsampler.offer(make_message('sensors/a', {}, t)) for t in times]
+
+        assert [message.received_at for message in delivered if message] == [0.0, 0.5, 1.0]
+
+    def test_windows_are_per_topic(self):
+        """Test every topic has its own window"""
+        downsampler = Downsampler([DeliveryPolicy('sensors/+', keep_every=2)])
+
+        assert downsampler.offer(make_message('sensors/a', {})) is None
+        assert downsampler.offer(make_message('sensors/b', {})) is None
+        assert downsampler.offer(make_message('sensors/a', {})) is not None
+
+    def test_unmatched_topics_pass_through(self):
+        """Test topics without a policy are always delivered"""
+        downsampler = Downsampler.from_dict({'sensors/#': {'keep_every': 10}})
+        message = make_message('status', {})
+
+        assert downsampler.offer(message) is message
+        assert downsampler.policy_for('status') is None
+
+    def test_mean_averages_numeric_fields(self):
+        """Test mean mode delivers the latest payload with numeric fields averaged"""
+        downsampler = Downsampler([DeliveryPolicy('imu', keep_every=2, mode='mean')])
+        downsampler.offer(make_message('imu', {'x': 1, 'acc': {'z': 2.0}, 'ok': True, 'id': 'a'}))
+
+        delivered = downsampler.offer(make_message('imu', {'x': 4, 'acc': {'z': 4.0}, 'ok': False, 'id': 'b'}, 7.0))
+
+        assert delivered.payload == {'x': 2.5, 'acc': {'z': 3.0}, 'ok': False, 'id': 'b'}
+        assert delivered.received_at == 7.0
+        assert downsampler.offer(make_message('imu', {'x': 10})) is None
+
+    def test_mean_invalid_payload_leaves_window(self):
+        """Test an undecodable payload raises without counting towards the window"""
+        downsampler = Downsampler([DeliveryPolicy('imu', keep_every=2, mode='mean')])
+        invalid = Message('imu', b'not json', lambda raw: json.loads(raw))
+
+        with pytest.raises(PayloadDecodeError):
+            downsampler.offer(invalid)
+        assert downsampler.offer(make_message('imu', {'x': 1})) is None
@@ -0,0 +1,47 @@
+from collections import Counter
+
+import pytest
+
+from fp_mqtt_broker.hashing import ConsistentHashRing
+
+
+@pytest.mark.unit
+class TestConsistentHashRing:
+    """Test cases for the consistent hash ring"""
+
+    def test_requires_unique_nodes(self):
+        with pytest.raises(ValueError):
+            ConsistentHashRing([])
+        with pytest.raises(ValueError):
+            ConsistentHashRing(['a', 'a'])
+
+    def test_stable_mapping(self):
+        ring = ConsistentHashRing(['a:1883', 'b:1883', 'c:1883'])
+        other = ConsistentHashRing(['c:1883', 'a:1883', 'b:1883'])
+
+        for index in range(100):
+            assert ring.get(f"devices/{index}") == other.get(f"devices/{index}")
+
+    def test_keys_spread_over_nodes(self):
+        ring = ConsistentHashRing(['a', 'b', 'c'])
+        counts = Counter(ring.get(f"devices/{index}/data") for index in range(3000))
+
+        assert set(counts) == {'a', 'b', 'c'}
+        assert min(counts.values()) > 600
+
+    def test_removing_node_only_moves_its_keys(self):
+        keys = [f"devices/{index}" for index in range(1000)]
+        before = ConsistentHashRing(['a', 'b', 'c'])
+        after = ConsistentHashRing(['a', 'b'])
+
+        for key in keys:
+            if before.get(key) != 'c':
+                assert after.get(key) == before.get(key)
+
+    def test_preference_list(self):
+        ring = ConsistentHashRing(['a', 'b', 'c'])
+
+        for index in range(50):
+            order = ring.preference_list(f"t/{index}")
+            assert order[0] == ring.get(f"t/{index}")
+            assert sorted(order) == ['a', 'b', 'c']
@@ -0,0 +1,120 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from unittest.mock import Mock
+
+import pytest
+
+from fp_mqtt_broker import BrokerConfig, MQTTBroker
+from fp_mqtt_broker.health import HealthMonitor
+
+
+def probe_reply(broker, payload):
+    msg = Mock()
+    msg.topic = broker.health.probe_topic
+    msg.payload = payload
+    broker.on_message(None, None, msg)
+
+
+@pytest.mark.unit
+class TestHealthMonitor:
+    """Test cases for the network loop health monitor"""
+
+    def test_enable_subscribes_private_probe_topic(self, broker_config, mock_mqtt_client):
+        broker_config.shared_subscription_group = 'ingest'
+        broker = MQTTBroker(broker_config, mock_mqtt_client)
+        mock_mqtt_client.connected = True
+
+        monitor = broker.enable_health_monitor(max_loop_lag=1.0)
+
+        assert isinstance(monitor, HealthMonitor)
+        assert monitor.probe_topic == 'test_client/health/probe'
+        assert 'test_client/health/probe' in mock_mqtt_client.subscribed_topics
+
+    def test_health_from_config(self, basic_config, mock_mqtt_client):
+        basic_config['mqtt']['health'] = {'interval': 5, 'stale_after': 30}
+        basic_config['mqtt']['topics']['health'] = 'test/health'
+        broker = MQTTBroker(BrokerConfig.from_dict(basic_config), mock_mqtt_client)
+
+        assert broker.health.interval == 5
+        assert broker.health.stale_after == 30
+        assert broker.health.alert_topic == 'test/health'
+
+    def test_probe_measures_loop_lag(self, mqtt_broker, mock_mqtt_client):
+        mock_mqtt_client.connected = True
+        monitor = mqtt_broker.enable_health_monitor()
+
+        monitor.check()
+        probe = mock_mqtt_client.published_messages[-1]
+        assert probe['topic'] == monitor.probe_topic
+        probe_reply(mqtt_broker, probe['payload'])
+
+        status = monitor.status()
+        assert status.loop_lag is not None and status.loop_lag < 1
+        assert status.live and status.ready
+
+    def test_unanswered_probe_degrades(self, mqtt_broker, mock_mqtt_client):
+        mock_mqtt_client.connected = True
+        monitor = mqtt_broker.enable_health_monitor(max_loop_lag=0.01, liveness_timeout=0.02, alert_topic='alerts')
+
+        monitor.check()
+        time.sleep(0.03)
+        status = monitor.check()
+
+        assert status.reasons == ['loop_lag']
+        assert not status.ready and not status.live
+        alert = mock_mqtt_client.published_messages[-1]
+        assert alert['topic'] == 'alerts'
+        assert json.loads(alert['payload'])['status'] == 'degraded'
+
+    def test_alerts_only_on_change(self, mqtt_broker, mock_mqtt_client):
+        mock_mqtt_client.connected = True
+        monitor = mqtt_broker.enable_health_monitor(stale_after=0.01, alert_topic='alerts')
+        mqtt_broker.on_message(None, None, Mock(topic='test/data', payload=b'{}'))
+        time.sleep(0.02)
+
+        monitor.check()
+        monitor.check()
+        alerts = [message for message in mock_mqtt_client.published_messages if message['topic'] == 'alerts']
+        assert len(alerts) == 1
+        assert json.loads(alerts[0]['payload'])['stale_topics'] == ['test/data']
+
+    def test_topic_ages_are_bounded(self, mqtt_broker):
+        """Test only the most recently active topics are tracked"""
+        monitor = mqtt_broker.enable_health_monitor()
+        monitor.MAX_TOPICS = 3
+        for topic in ['a', 'b', 'c', 'a', 'd']:
+            monitor.record_message(topic)
+
+        assert set(monitor.status().topic_ages) == {'c', 'a', 'd'}
+
+    def test_http_host_defaults_to_loopback(self, mqtt_broker):
+        """Test the HTTP endpoint is not exposed on every interface by default"""
+        assert mqtt_broker.enable_health_monitor().http_host == '127.0.0.1'
+
+    def test_disconnected_not_ready(self, mqtt_broker):
+        monitor = mqtt_broker.enable_health_monitor()
+
+        status = monitor.check()
+
+        assert status.live
+        assert not status.ready
+        assert status.reasons == ['disconnected']
+
+    def test_http_endpoint(self, mqtt_broker, mock_mqtt_client):
+        mock_mqtt_client.connected = True
+        monitor = mqtt_broker.enable_health_monitor(interval=60, http_port=0, http_host='127.0.0.1')
+        monitor.start()
+        try:
+            port = monitor._http_server.server_port
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz") as response:
+                assert response.status == 200
+                assert json.loads(response.read())['live'] is True
+            mock_mqtt_client.connected = False
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz")
+            assert error.value.code == 503
+        finally:
+            monitor.stop()
+        assert not monitor.running
@@ -0,0 +1,57 @@
+import pytest
+from fp_mqtt_broker.history import HistorySpec, HistoryStore
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.mark.unit
+class TestHistoryStore:
+    """Test cases for HistoryStore"""
+
+    def test_records_matching_topics(self):
+        """Test only topics matching a spec are recorded"""
+        store = HistoryStore()
+        store.add_spec(HistorySpec('sensors/+', ['temp', 'env.hum'], capacity=3))
+
+        assert store.record('sensors/a', {'temp': 20, 'env': {'hum': 40}, 'timestamp': 1.0}) is True
+        assert store.record('other/a', {'temp': 20}) is False
+
+        history = store.get('sensors/a')
+        assert store.topics() == ['sensors/a']
+        assert history.timestamps().tolist() == [1.0]
+        assert history.column('env.hum').tolist() == [40.0]
+        assert history.values().dtype == np.float32
+        assert store.get('other/a') is None
+
+    def test_fixed_memory_per_topic(self):
+        """Test the memory of a topic does not grow with samples"""
+        store = HistoryStore()
+        store.add_spec(HistorySpec('s', ['v'], capacity=100))
+        store.record('s', {'v': 0})
+        initial = store.nbytes
+
+        for i in range(1000):
+            store.record('s', {'v': i})
+
+        assert store.nbytes == initial
+        assert store.get('s').column('v')[-1] == 999
+
+    def test_max_topics(self):
+        """Test new topics beyond the limit are not recorded"""
+        store = HistoryStore(max_topics=1)
+        store.add_spec(HistorySpec('#', ['v']))
+
+        assert store.record('a', {'v': 1}) is True
+        assert store.record('b', {'v': 1}) is False
+        assert len(store) == 1
+
+    def test_spec_requires_fields(self):
+        """Test rejecting a spec without fields"""
+        with pytest.raises(ValueError):
+            HistoryStore().add_spec(HistorySpec('s', []))
+
+    def test_spec_from_dict(self):
+        """Test creating a spec from configuration"""
+        spec = HistorySpec.from_dict('s/#', {'fields': ['v'], 'capacity': 10, 'dtype': 'float64'})
+
+        assert spec == HistorySpec('s/#', ['v'], 10, 'float64', 'timestamp')
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+from fp_mqtt_broker.latency import LatencyHistogram, LatencyTracker
+from fp_mqtt_broker.message import Message
+
+
+def received(tracker, payload, topic='sensors/a', received_at=None):
+    message = Message(topic, json.dumps(payload).encode(), json.loads, received_at=received_at)
+    tracker.observe(message)
+    return message
+
+
+@pytest.mark.unit
+class TestLatencyHistogram:
+    """Test cases for LatencyHistogram"""
+
+    def test_buckets_and_percentiles(self):
+        """Test values land in their bucket and percentiles use bucket bounds"""
+        histogram = LatencyHistogram([0.01, 0.1, 1.0])
+        for value in [0.005, 0.005, 0.05, 0.5, 3.0]:
+            histogram.record(value)
+
+        summary = histogram.to_dict()
+        assert histogram.counts == [2, 1, 1, 1]
+        assert summary['count'] == 5
+        assert summary['max'] == 3.0
+        assert histogram.percentile(40) == 0.01
+        assert histogram.percentile(60) == 0.1
+        assert histogram.percentile(100) == 3.0
+        assert LatencyHistogram().percentile(50) is None
+
+
+@pytest.mark.unit
+class TestLatencyTracker:
+    """Test cases for LatencyTracker"""
+
+    def test_stamp_sequences_per_topic(self):
+        """Test stamps carry the publisher, send time and a sequence per topic"""
+        tracker = LatencyTracker('pub')
+        payload = {'v': 1}
+
+        first = tracker.stamp(payload, 'a')
+        second = tracker.stamp(payload, 'a')
+        other = tracker.stamp(payload, 'b')
+        shared = tracker.stamp(payload)
+
+        assert payload == {'v': 1}
+        assert [first['_sent']['seq'], second['_sent']['seq'], other['_sent']['seq']] == [1, 2, 1]
+        assert first['_sent']['src'] == 'pub'
+        assert 'seq' not in shared['_sent']
+
+    def test_observe_strips_stamp_and_records(self):
+        """Test receiving removes the stamp and records transit and queueing latency"""
+        publisher = LatencyTracker('pub')
+        subscriber = LatencyTracker('sub')
+        stamped = publisher.stamp({'v': 1}, 'sensors/a')
+
+        message = received(subscriber, stamped, received_at=stamped['_sent']['ts'] + 0.05)
+
+        assert message.payload == {'v': 1}
+        snapshot = subscriber.snapshot()
+        assert snapshot['received'] == 1
+        assert snapshot['transit']['count'] == 1
+        assert snapshot['transit']['p50'] == 0.05
+        assert snapshot['queueing']['count'] == 1
+
+    def test_gaps_and_duplicates(self):
+        """Test sequence gaps count as lost and repeats as duplicates"""
+        publisher = LatencyTracker('pub')
+        subscriber = LatencyTracker('sub')
+        stamped = [publisher.stamp({}, 'sensors/a') for _ in range(5)]
+
+        for index in [0, 1, 4, 4]:
+            received(subscriber, dict(stamped[index], _sent=dict(stamped[index]['_sent'])))
+
+        assert subscriber.lost == 2
+        assert subscriber.duplicates == 1
+        assert subscriber.snapshot()['publishers']['pub'] == {'received': 4, 'lost': 2, 'duplicates': 1}
+
+    def test_publisher_restart_is_not_loss(self):
+        """Test a new publisher run starts its own sequences"""
+        subscriber = LatencyTracker('sub')
+        for _ in range(2):
+            publisher = LatencyTracker('pub')
+            for _ in range(3):
+                received(subscriber, publisher.stamp({}, 'sensors/a'))
+
+        assert subscriber.lost == 0
+        assert subscriber.duplicates == 0
+
+    def test_clock_skew(self):
+        """Test messages sent in the future are counted as clock skew"""
+        subscriber = LatencyTracker('sub')
+        received(subscriber, {'_sent': {'src': 'pub', 'ts': 200.0}}, received_at=100.0)
+
+        assert subscriber.clock_skew == 1
+        assert subscriber.transit.max == 0.0
+
+    def test_unstamped_messages_are_ignored(self):
+        """Test messages without a stamp are left untouched"""
+        subscriber = LatencyTracker('sub')
+        message = received(subscriber, {'v': 1})
+
+        assert message.payload == {'v': 1}
+        assert subscriber.received == 0
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from unittest.mock import Mock
+
+from fp_mqtt_broker import EnvelopeMessageHandler, Message, MessageHandler
+from fp_mqtt_broker.message import PayloadDecodeError
+
+
+class EnvelopeHandler(EnvelopeMessageHandler):
+    def __init__(self):
+        self.messages = []
+
+    def get_subscribed_topics(self):
+        return ['test/data']
+
+    def handle(self, message):
+        self.messages.append(message)
+
+
+@pytest.mark.unit
+class TestMessage:
+    """Test cases for the message envelope"""
+
+    def test_payload_decoded_lazily_once(self):
+        decoder = Mock(side_effect=lambda raw: json.loads(raw))
+        message = Message('test/data', b'{"value": 1}', decoder, qos=1)
+
+        assert not message.is_decoded
+        decoder.assert_not_called()
+        assert message.payload == {'value': 1}
+        assert message.payload == {'value': 1}
+        assert message.is_decoded
+        decoder.assert_called_once_with(b'{"value": 1}')
+
+    def test_decode_error_cached(self):
+        decoder = Mock(side_effect=ValueError('bad payload'))
+        message = Message('test/data', b'invalid', decoder)
+
+        for _ in range(2):
+            with pytest.raises(PayloadDecodeError):
+                message.payload
+        decoder.assert_called_once()
+
+    def test_slots(self):
+        message = Message('test/data', b'{}', json.loads)
+        with pytest.raises(AttributeError):
+            message.extra = True
+
+    def test_from_payload(self):
+        message = Message.from_payload('test/data', {'value': 1}, qos=1)
+        assert message.is_decoded
+        assert message.payload == {'value': 1}
+        assert message.qos == 1
+
+    def test_legacy_handler_receives_decoded_payload(self):
+        handler = Mock(spec=MessageHandler)
+        MessageHandler.handle(handler, Message('test/data', b'{"value": 1}', json.loads))
+        handler.handle_message.assert_called_once_with('test/data', {'value': 1})
+
+    def test_envelope_handler_handle_message(self):
+        handler = EnvelopeHandler()
+        handler.handle_message('test/data', {'value': 1})
+        assert handler.messages[0].topic == 'test/data'
+        assert handler.messages[0].payload == {'value': 1}
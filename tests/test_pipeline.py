@@ -0,0 +1,132 @@
+import json
+
+import pytest
+from unittest.mock import Mock
+from fp_mqtt_broker import MQTTBroker, Pipeline
+from fp_mqtt_broker.message import Message
+from tests.conftest import TestMessageHandler
+
+
+def make_message(topic, payload):
+    return Message(topic, json.dumps(payload).encode(), json.loads)
+
+
+@pytest.mark.unit
+class TestPipeline:
+    """Test cases for Pipeline"""
+
+    def test_shared_stages_run_once(self):
+        """Test a stage shared by several handlers runs once per message"""
+        normalise = Mock(side_effect=lambda payload: {'celsius': payload['temp'] / 10})
+        enrich = Mock(side_effect=lambda reading, message: {**reading, 'topic': message.topic})
+        raw = TestMessageHandler(['sensors/#'])
+        first = TestMessageHandler(['sensors/#'])
+        second = TestMessageHandler(['sensors/+'])
+        pipeline = (Pipeline()
+                    .stage('normalised', normalise)
+                    .stage('enriched', enrich, inputs=['normalised', 'message'])
+                    .add_handler(raw)
+                    .add_handler(first, 'enriched')
+                    .add_handler(second, 'enriched'))
+
+        pipeline.handle(make_message('sensors/a', {'temp': 215}))
+
+        assert normalise.call_count == 1
+        assert enrich.call_count == 1
+        assert raw.received_messages == [{'topic': 'sensors/a', 'payload': {'temp': 215}}]
+        expected = {'celsius': 21.5, 'topic': 'sensors/a'}
+        assert first.received_messages[0]['payload'] == expected
+        assert second.received_messages[0]['payload'] == expected
+        assert set(pipeline.stage_timings()) == {'payload', 'normalised', 'enriched'}
+        assert pipeline.stage_timings()['enriched']['count'] == 1
+
+    def test_only_needed_stages_run(self):
+        """Test stages no matching handler needs are skipped, payload included"""
+        expensive = Mock(return_value={})
+        pipeline = (Pipeline()
+                    .stage('topic', lambda message: message.topic, inputs=['message'])
+                    .stage('expensive', expensive)
+                    .add_handler(TestMessageHandler(['a']), 'topic')
+                    .add_handler(TestMessageHandler(['b']), 'expensive'))
+        message = make_message('a', {})
+
+        pipeline.handle(message)
+
+        expensive.assert_not_called()
+        assert not message.is_decoded
+        assert pipeline.get_subscribed_topics() == ['a', 'b']
+
+    def test_none_filters_dependents(self):
+        """Test a stage returning None skips everything depending on it"""
+        downstream = Mock()
+        handler = TestMessageHandler(['#'])
+        pipeline = (Pipeline()
+                    .stage('valid', lambda payload: payload if payload.get('ok') else None)
+                    .stage('downstream', downstream, inputs=['valid'])
+                    .add_handler(handler, 'downstream'))
+
+        pipeline.handle(make_message('a', {'ok': False}))
+
+        downstream.assert_not_called()
+        assert handler.received_messages == []
+
+    def test_stage_error_delivers_nothing(self):
+        """Test a failing stage fails the message before any handler runs"""
+        handler = TestMessageHandler(['#'])
+        pipeline = (Pipeline()
+                    .stage('broken', Mock(side_effect=RuntimeError('boom')))
+                    .add_handler(handler)
+                    .add_handler(TestMessageHandler(['#']), 'broken'))
+
+        with pytest.raises(RuntimeError):
+            pipeline.handle(make_message('a', {}))
+        assert handler.received_messages == []
+
+    def test_handler_error_is_isolated(self):
+        """Test a failing downstream handler does not affect the others"""
+        failing = TestMessageHandler(['#'])
+        failing.handle_message = Mock(side_effect=RuntimeError('boom'))
+        healthy = TestMessageHandler(['#'])
+        pipeline = Pipeline().add_handler(failing).add_handler(healthy)
+
+        pipeline.handle(make_message('a', {'v': 1}))
+
+        assert len(healthy.received_messages) == 1
+
+    def test_invalid_declarations(self):
+        """Test duplicate stages and unknown inputs are refused"""
+        pipeline = Pipeline().stage('a', lambda payload: payload)
+
+        with pytest.raises(ValueError):
+            pipeline.stage('a', lambda payload: payload)
+        with pytest.raises(ValueError):
+            pipeline.stage('b', lambda value: value, inputs=['missing'])
+        with pytest.raises(ValueError):
+            pipeline.add_handler(TestMessageHandler(['#']), 'missing')
+
+    def test_registered_with_broker(self, broker_config, mock_mqtt_client):
+        """Test the broker subscribes the pipeline topics and flushes its handlers"""
+        handler = TestMessageHandler(['sensors/+'])
+        handler.flush = Mock()
+        handler.close = Mock()
+        pipeline = Pipeline().stage('value', lambda payload: payload['v']).add_handler(handler, 'value')
+        broker = MQTTBroker(broker_config, mock_mqtt_client, [pipeline])
+
+        mock_mqtt_client.simulate_message('sensors/a', {'v': 3})
+        broker.shutdown(timeout=0)
+
+        assert 'sensors/+' in broker.subscribed_topics
+        assert handler.received_messages == [{'topic': 'sensors/a', 'payload': 3}]
+        handler.flush.assert_called_once()
+        handler.close.assert_called_once()
+
+    def test_concurrent_follows_handlers(self):
+        """Test a pipeline is only concurrent when all of its handlers are"""
+        class SerialHandler(TestMessageHandler):
+            concurrent = False
+
+        pipeline = Pipeline().add_handler(TestMessageHandler(['a']))
+        assert pipeline.concurrent is True
+
+        pipeline.add_handler(SerialHandler(['b']))
+        assert pipeline.concurrent is False
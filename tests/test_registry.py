@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from fp_mqtt_broker.registry import HandlerRegistry
+from tests.conftest import TestMessageHandler
+
+
+@pytest.mark.unit
+class TestHandlerRegistry:
+    """Test cases for the copy-on-write handler registry"""
+
+    def test_initial_snapshot(self):
+        handler = TestMessageHandler(['a/+'])
+        registry = HandlerRegistry([handler], ['status'])
+
+        assert registry.snapshot.handlers == (handler,)
+        assert registry.snapshot.topics == {'a/+', 'status'}
+
+    def test_add_returns_new_topics(self):
+        registry = HandlerRegistry([TestMessageHandler(['a'])])
+
+        assert registry.add(TestMessageHandler(['a', 'b', 'b'])) == ['b']
+        assert registry.snapshot.topics == {'a', 'b'}
+        assert len(registry.snapshot.handlers) == 2
+
+    def test_snapshots_are_immutable(self):
+        first = TestMessageHandler(['a/#'])
+        registry = HandlerRegistry([first])
+        snapshot = registry.snapshot
+        assert snapshot.handlers_for('a/b') == (first,)
+
+        second = TestMessageHandler(['a/b'])
+        registry.add(second)
+
+        assert snapshot.handlers_for('a/b') == (first,)
+        assert registry.snapshot.handlers_for('a/b') == (first, second)
+        assert registry.snapshot is not snapshot
+
+    def test_remove(self):
+        handler = TestMessageHandler(['a'])
+        registry = HandlerRegistry([handler])
+
+        assert registry.remove(handler)
+        assert not registry.remove(handler)
+        assert registry.snapshot.handlers == ()
+        assert registry.snapshot.topics == {'a'}
+        assert registry.snapshot.handlers_for('a') == ()
+
+    def test_replace(self):
+        registry = HandlerRegistry([TestMessageHandler(['a'])])
+        handler = TestMessageHandler(['a', 'c'])
+
+        assert registry.replace([handler]) == ['c']
+        assert registry.snapshot.handlers == (handler,)
+
+    def test_add_topic(self):
+        registry = HandlerRegistry()
+
+        assert registry.add_topic('reply')
+        assert not registry.add_topic('reply')
+        assert registry.snapshot.topics == {'reply'}
+
+    def test_route_cache_bounded(self):
+        registry = HandlerRegistry([TestMessageHandler(['#'])])
+        snapshot = registry.snapshot
+        for index in range(snapshot.MAX_CACHED_ROUTES + 5):
+            snapshot.handlers_for(f"t/{index}")
+        assert len(snapshot._routes) <= snapshot.MAX_CACHED_ROUTES
+
+    def test_concurrent_writers(self):
+        registry = HandlerRegistry()
+        handlers = [TestMessageHandler([f"t/{index}"]) for index in range(200)]
+
+        def register(chunk):
+            for handler in chunk:
+                registry.add(handler)
+
+        threads = [threading.Thread(target=register, args=(handlers[start::4],)) for start in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(registry.snapshot.handlers) == 200
+        assert len(registry.snapshot.topics) == 200
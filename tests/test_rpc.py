@@ -0,0 +1,68 @@
+import pytest
+from concurrent.futures import TimeoutError
+from fp_mqtt_broker.rpc import PendingRequests, RequestError, build_request, build_response
+
+
+@pytest.mark.unit
+class TestPendingRequests:
+    """Test cases for PendingRequests"""
+
+    def test_resolve(self):
+        """Test a reply completes the matching future"""
+        pending = PendingRequests()
+        correlation_id = pending.new_correlation_id()
+        future = pending.add(correlation_id, timeout=5)
+
+        assert pending.resolve(build_response(correlation_id, {'ok': True})) is True
+        assert future.result(timeout=1) == {'ok': True}
+        assert len(pending) == 0
+
+    def test_resolve_error(self):
+        """Test an error reply fails the future"""
+        pending = PendingRequests()
+        future = pending.add('id-1', timeout=5)
+
+        pending.resolve(build_response('id-1', error='device busy'))
+
+        with pytest.raises(RequestError, match='device busy'):
+            future.result(timeout=1)
+
+    def test_resolve_unknown(self):
+        """Test replies without a pending request are ignored"""
+        pending = PendingRequests()
+
+        assert pending.resolve(build_response('missing')) is False
+        assert pending.resolve(['not', 'a', 'response']) is False
+
+    def test_timeout(self):
+        """Test requests without reply expire"""
+        pending = PendingRequests()
+        future = pending.add('id-1', timeout=0.05)
+        other = pending.add('id-2', timeout=5)
+
+        with pytest.raises(TimeoutError):
+            future.result(timeout=2)
+        assert pending.resolve(build_response('id-1')) is False
+        assert not other.done()
+
+    def test_fail_and_fail_all(self):
+        """Test failing one or all pending requests"""
+        pending = PendingRequests()
+        first = pending.add('id-1', timeout=5)
+        second = pending.add('id-2', timeout=5)
+
+        pending.fail('id-1', ConnectionError('lost'))
+        assert pending.fail_all(ConnectionError('shutdown')) == 1
+
+        assert isinstance(first.exception(), ConnectionError)
+        assert str(second.exception()) == 'shutdown'
+
+    def test_unique_correlation_ids(self):
+        """Test correlation IDs are unique"""
+        pending = PendingRequests()
+
+        assert len({pending.new_correlation_id() for _ in range(100)}) == 100
+
+    def test_build_request(self):
+        """Test the request envelope"""
+        assert build_request('id', 'reply', {'a': 1}) == {'correlation_id': 'id', 'reply_to': 'reply', 'payload': {'a': 1}}
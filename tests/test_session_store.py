@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from fp_mqtt_broker.session_store import SessionStore
+
+
+@pytest.mark.unit
+class TestSessionStore:
+    """Test cases for the persistent session store"""
+
+    def test_missing_file(self, tmp_path):
+        store = SessionStore(str(tmp_path / 'session.json'))
+
+        assert store.subscriptions == {}
+        assert store.take_unacknowledged() == []
+
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / 'session.json')
+        assert SessionStore(path).save({'a/#': 1}, [('a/1', b'\x00binary', 1), ('a/2', '{"text": 1}', 2)])
+
+        store = SessionStore(path)
+
+        assert store.subscriptions == {'a/#': 1}
+        assert store.take_unacknowledged() == [('a/1', b'\x00binary', 1), ('a/2', b'{"text": 1}', 2)]
+        assert store.take_unacknowledged() == []
+
+    def test_unchanged_state_not_rewritten(self, tmp_path):
+        store = SessionStore(str(tmp_path / 'session.json'))
+
+        assert store.save({'a': 0}, [])
+        assert not store.save({'a': 0}, [])
+        assert store.save({'a': 0, 'b': 0}, [])
+
+    def test_untaken_messages_kept(self, tmp_path):
+        path = str(tmp_path / 'session.json')
+        SessionStore(path).save({}, [('a', b'1', 1)])
+
+        store = SessionStore(path)
+        store.save({}, [('b', b'2', 1)])
+
+        assert SessionStore(path).take_unacknowledged() == [('a', b'1', 1), ('b', b'2', 1)]
+
+    @pytest.mark.parametrize('content', ['not json', json.dumps({'version': 99, 'subscriptions': {'a': 1}})])
+    def test_unusable_file_ignored(self, tmp_path, content):
+        path = tmp_path / 'session.json'
+        path.write_text(content)
+
+        assert SessionStore(str(path)).subscriptions == {}
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+from fp_mqtt_broker.shared_values import SharedValueReader, SharedValueWriter
+
+
+@pytest.fixture
+def writer():
+    writer = SharedValueWriter(f"fp-test-{uuid.uuid4().hex[:12]}", slots=2, max_payload=32, max_topic=16)
+    yield writer
+    writer.close()
+
+
+@pytest.mark.unit
+class TestSharedValues:
+    """Test cases for SharedValueWriter and SharedValueReader"""
+
+    def test_read_latest_value(self, writer):
+        """Test readers see the latest payload of each topic"""
+        with SharedValueReader(writer.name) as reader:
+            assert reader.read('sensors/a') is None
+
+            writer.write('sensors/a', b'{"v": 1}', timestamp=1.0)
+            writer.write('sensors/a', b'{"v": 22}', timestamp=2.0)
+
+            value = reader.read('sensors/a')
+            assert value.payload == b'{"v": 22}'
+            assert value.timestamp == 2.0
+            assert value.sequence == 4
+            assert reader.get('sensors/a') == {'v': 22}
+            assert reader.get('sensors/b', {}) == {}
+            assert reader.topics() == ['sensors/a']
+
+    def test_existing_region_is_kept(self, writer):
+        """Test a second writer cannot take over a live region unless asked to replace it"""
+        writer.write('sensors/a', b'1')
+
+        with pytest.raises(FileExistsError):
+            SharedValueWriter(writer.name, slots=2, max_payload=32, max_topic=16)
+        with SharedValueReader(writer.name) as reader:
+            assert reader.read('sensors/a').payload == b'1'
+
+        replacement = SharedValueWriter(writer.name, slots=2, max_payload=32, max_topic=16, replace_existing=True)
+        try:
+            writer.close()
+            with SharedValueReader(writer.name) as reader:
+                assert reader.read('sensors/a') is None
+        finally:
+            replacement.close()
+
+    def test_capacity_limits(self, writer):
+        """Test topics beyond the slots and oversized payloads are rejected"""
+        assert writer.write('a', b'1') is True
+        assert writer.write('b', b'2') is True
+        assert writer.write('c', b'3') is False
+        assert writer.write('a', b'x' * 33) is False
+        assert writer.write('t' * 17, b'1') is False
+
+        assert writer.rejected == 3
+        assert len(writer) == 2
+
+    def test_reader_in_other_process(self, writer):
+        """Test a separate process reads the values without MQTT"""
+        writer.write('sensors/a', json.dumps({'v': 3}).encode())
+        script = (
+            "import sys; from fp_mqtt_broker.shared_values import SharedValueReader\n"
+            "reader = SharedValueReader(sys.argv[1]); print(reader.get('sensors/a')['v']); reader.close()"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        result = subprocess.run([sys.executable, "-c", script, writer.name], capture_output=True, text=True,
+                                cwd=root, timeout=30)
+
+        assert result.stdout.strip() == '3', result.stderr
+        with SharedValueReader(writer.name) as reader:
+            assert reader.get('sensors/a') == {'v': 3}
+
+    def test_reader_rejects_foreign_region(self):
+        """Test attaching to a region without the shared value header fails"""
+        from multiprocessing import shared_memory
+        region = shared_memory.SharedMemory(name=f"fp-test-{uuid.uuid4().hex[:12]}", create=True, size=64)
+        try:
+            with pytest.raises(ValueError):
+                SharedValueReader(region.name)
+        finally:
+            region.close()
+            region.unlink()
@@ -0,0 +1,88 @@
+import pytest
+from fp_mqtt_broker.topics import (
+    TopicAliasTable,
+    is_shared_subscription,
+    shared_subscription,
+    strip_shared_prefix,
+    topic_matches,
+)
+
+
+@pytest.mark.unit
+class TestTopics:
+    """Test cases for topic filter helpers"""
+
+    def test_strip_shared_prefix(self):
+        """Test stripping the shared subscription prefix"""
+        assert strip_shared_prefix('$share/workers/sensors/+/temp') == 'sensors/+/temp'
+        assert strip_shared_prefix('sensors/temp') == 'sensors/temp'
+
+    def test_strip_shared_prefix_invalid(self):
+        """Test rejecting a shared subscription without a group"""
+        with pytest.raises(ValueError):
+            strip_shared_prefix('$share//sensors')
+
+    def test_shared_subscription(self):
+        """Test building shared subscriptions"""
+        assert shared_subscription('workers', 'sensors/#') == '$share/workers/sensors/#'
+        assert shared_subscription(None, 'sensors/#') == 'sensors/#'
+        assert shared_subscription('other', '$share/workers/a') == '$share/workers/a'
+        assert is_shared_subscription('$share/workers/a')
+
+    @pytest.mark.parametrize('subscription,topic,expected', [
+        ('sensors/temp', 'sensors/temp', True),
+        ('sensors/temp', 'sensors/humidity', False),
+        ('sensors/+/temp', 'sensors/kitchen/temp', True),
+        ('sensors/+/temp', 'sensors/kitchen/sink/temp', False),
+        ('sensors/#', 'sensors', True),
+        ('sensors/#', 'sensors/kitchen/temp', True),
+        ('sensors/+', 'sensors', False),
+        ('#', '$SYS/broker/load', False),
+        ('$share/workers/sensors/+', 'sensors/kitchen', True),
+        ('$share/workers/sensors/temp', 'sensors/temp', True),
+        ('$share/workers/sensors/temp', 'sensors/other', False),
+    ])
+    def test_topic_matches(self, subscription, topic, expected):
+        """Test matching topics against filters"""
+        assert topic_matches(subscription, topic) is expected
+
+
+@pytest.mark.unit
+class TestTopicAliasTable:
+    """Test cases for TopicAliasTable"""
+
+    def test_disabled_without_maximum(self):
+        """Test no aliases are assigned when the server accepts none"""
+        table = TopicAliasTable()
+
+        assert table.resolve('sensors/temp') == (None, False)
+        assert len(table) == 0
+
+    def test_assigns_and_reuses_aliases(self):
+        """Test aliases are assigned on first use and reused afterwards"""
+        table = TopicAliasTable(maximum=2)
+
+        assert table.resolve('a') == (1, False)
+        assert table.resolve('b') == (2, False)
+        assert table.resolve('a') == (1, True)
+
+    def test_reassigns_least_recently_used(self):
+        """Test the least recently used alias is reassigned when full"""
+        table = TopicAliasTable(maximum=2)
+        table.resolve('a')
+        table.resolve('b')
+        table.resolve('a')
+
+        assert table.resolve('c') == (2, False)
+        assert table.resolve('b') == (1, False)
+
+    def test_reset(self):
+        """Test resetting clears aliases and applies the new limit"""
+        table = TopicAliasTable(maximum=2)
+        table.resolve('a')
+
+        table.reset(5)
+
+        assert table.maximum == 5
+        assert len(table) == 0
+        assert table.resolve('a') == (1, False)
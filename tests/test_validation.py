@@ -0,0 +1,82 @@
+import pytest
+from fp_mqtt_broker.validation import SchemaRegistry, compile_schema
+
+
+READING_SCHEMA = {
+    'type': 'object',
+    'required': ['device', 'value'],
+    'properties': {
+        'device': {'type': 'string', 'minLength': 1, 'maxLength': 16},
+        'value': {'type': 'number', 'minimum': -40, 'maximum': 125},
+        'unit': {'enum': ['C', 'F']},
+        'samples': {'type': 'array', 'items': {'type': 'integer'}, 'maxItems': 3},
+    },
+    'additionalProperties': False,
+}
+
+
+@pytest.mark.unit
+class TestCompileSchema:
+    """Test cases for compile_schema"""
+
+    def test_valid_payload(self):
+        """Test a payload matching the schema"""
+        validate = compile_schema(READING_SCHEMA)
+
+        assert validate({'device': 'dev-1', 'value': 21.5, 'unit': 'C', 'samples': [1, 2]}) is None
+
+    @pytest.mark.parametrize('payload,message', [
+        ([], 'expected object'),
+        ({'value': 1}, "missing required property 'device'"),
+        ({'device': 'dev-1', 'value': 'hot'}, '$.value: expected number'),
+        ({'device': 'dev-1', 'value': True}, '$.value: expected number'),
+        ({'device': 'dev-1', 'value': 200}, 'above maximum'),
+        ({'device': 'dev-1', 'value': -41}, 'below minimum'),
+        ({'device': '', 'value': 1}, 'invalid string length'),
+        ({'device': 'dev-1', 'value': 1, 'unit': 'K'}, 'value not in'),
+        ({'device': 'dev-1', 'value': 1, 'samples': [1, 2, 3, 4]}, 'invalid number of items'),
+        ({'device': 'dev-1', 'value': 1, 'samples': [1.5]}, '$.samples[]: expected integer'),
+        ({'device': 'dev-1', 'value': 1, 'extra': 1}, 'unexpected properties'),
+    ])
+    def test_invalid_payload(self, payload, message):
+        """Test payloads violating the schema"""
+        error = compile_schema(READING_SCHEMA)(payload)
+
+        assert error is not None
+        assert message in error
+
+    def test_multiple_types(self):
+        """Test a list of allowed types"""
+        validate = compile_schema({'type': ['string', 'null']})
+
+        assert validate(None) is None
+        assert validate('a') is None
+        assert validate(1) == '$: expected string or null'
+
+    def test_unsupported_type(self):
+        """Test rejecting unknown types at compile time"""
+        with pytest.raises(ValueError):
+            compile_schema({'type': 'decimal'})
+
+
+@pytest.mark.unit
+class TestSchemaRegistry:
+    """Test cases for SchemaRegistry"""
+
+    def test_validates_matching_topics_only(self):
+        """Test schemas only apply to matching topics"""
+        registry = SchemaRegistry()
+        registry.add_schemas({'sensors/+/temperature': READING_SCHEMA})
+
+        assert len(registry) == 1
+        assert registry.validate('sensors/kitchen/temperature', {'value': 1}) is not None
+        assert registry.validate('sensors/kitchen/humidity', {'value': 1}) is None
+
+    def test_cache_invalidated_on_add(self):
+        """Test adding a schema applies to already seen topics"""
+        registry = SchemaRegistry()
+        assert registry.validate('a/b', {}) is None
+
+        registry.add_schema('a/#', {'required': ['x']})
+
+        assert registry.validate('a/b', {}) is not None